@@ -1,46 +1,25 @@
 from flask import Blueprint, render_template, redirect, url_for, request, session, flash, current_app
-from models import Sucursal, MenuItem, MenuItemSucursal, Extra, Administrador, Categoria, OpcionPersonalizada, ValorOpcion, HorarioSucursal, AdministradorSucursal, PedidoCliente
+from models import Sucursal, MenuItem, MenuItemSucursal, Extra, Administrador, Categoria, OpcionPersonalizada, ValorOpcion, HorarioSucursal, AdministradorSucursal, PedidoCliente, SucursalTelegramChat
 from extensions import db
+from telegram_bot import invalidar_rutas_telegram
 import os
 import re
+import logging
 from werkzeug.utils import secure_filename
+from dispositivo import plantilla
+from replica import solo_lectura
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+log = logging.getLogger(__name__)
 
 ADMIN_USER = 'summeratmars'
 ADMIN_PASS = 'Amoethan1'
 
-def is_mobile_device():
-    """Detecta si el dispositivo es móvil basándose en el User-Agent"""
-    user_agent = request.headers.get('User-Agent', '').lower()
-    mobile_patterns = [
-        'mobile', 'android', 'iphone', 'ipad', 'ipod', 'blackberry', 
-        'windows phone', 'opera mini', 'iemobile', 'wpdesktop'
-    ]
-    return any(pattern in user_agent for pattern in mobile_patterns)
-
 def admin_responsive_template(base_name: str) -> str:
     """Devuelve el nombre de template admin (desktop/mobile) si existen variantes.
-    Busca primero variante específica según dispositivo. Si no existe, cae al genérico.
+    Las variantes se resuelven desde el registro de dispositivo.py (armado al arrancar).
     """
-    # Rutas completas relativas dentro de templates
-    mobile_candidate = f'admin/{base_name}_mobile.html'
-    desktop_candidate = f'admin/{base_name}_desktop.html'
-    generic = f'admin/{base_name}.html'
-    templates_path = os.path.join(current_app.root_path, 'templates') if current_app else None
-    def exists(rel):
-        return templates_path and os.path.isfile(os.path.join(templates_path, rel.replace('/', os.sep)))
-    mobile = is_mobile_device()
-    if mobile and exists(mobile_candidate):
-        return mobile_candidate
-    if (not mobile) and exists(desktop_candidate):
-        return desktop_candidate
-    # Fallback preferencias: desktop, mobile, genérico
-    if exists(desktop_candidate):
-        return desktop_candidate
-    if exists(mobile_candidate):
-        return mobile_candidate
-    return generic
+    return plantilla(f'admin/{base_name}')
 
 ADMIN_USER = 'summeratmars'
 ADMIN_PASS = 'Amoethan1'
@@ -69,7 +48,7 @@ def login():
             flash('Administrador inicial creado, ingresa con esas credenciales.', 'info')
     except Exception as e:
         db.session.rollback()
-        print('[ADMIN][SEED] Error creando admin inicial:', e)
+        log.exception('Error creando admin inicial: %s', e)
     if request.method == 'POST':
         user = request.form['username']
         pw = request.form['password']
@@ -101,50 +80,51 @@ def logout():
 
 @admin_bp.route('/')
 @login_required
+@solo_lectura
 def dashboard():
     from models import PedidoCliente
     from datetime import datetime, date
     from sqlalchemy import func
-    
-    # Datos básicos
-    establecimientos = Sucursal.query.all()
-    menu = MenuItem.query.all()
+
+    sp = session.get('sucursales_permitidas')
+    restringido = bool(sp) and sp != 'ALL'
+
+    # Datos básicos (conteos sin cargar filas)
+    sucursales_q = Sucursal.query.filter(Sucursal.id.in_(sp)) if restringido else Sucursal.query
+    establecimientos = sucursales_q.order_by(Sucursal.id).all()
+    total_productos = db.session.query(func.count(MenuItem.id)).scalar() or 0
     total_admins = Administrador.query.count()
-    
-    # Estadísticas de pedidos
+
+    # Cifras del día desde el resumen de ventas (no recorre pedidocliente)
+    import resumen_ventas
     hoy = date.today()
-    total_pedidos_hoy = PedidoCliente.query.filter(
-        func.date(PedidoCliente.fecha) == hoy
-    ).count()
-    
-    # Ingresos del día
-    ingresos_hoy = db.session.query(func.sum(PedidoCliente.total)).filter(
-        func.date(PedidoCliente.fecha) == hoy
-    ).scalar() or 0
-    
-    # Pedidos por estado
-    pedidos_pendientes = PedidoCliente.query.filter_by(estado='Pendiente').count()
-    pedidos_en_camino = PedidoCliente.query.filter_by(estado='En camino').count()
-    pedidos_completados_hoy = PedidoCliente.query.filter(
-        func.date(PedidoCliente.fecha) == hoy,
-        PedidoCliente.estado == 'Entregado'
-    ).count()
-    
+    del_dia = resumen_ventas.totales(hoy, hoy, sp)
+    total_pedidos_hoy = del_dia['pedidos']
+    ingresos_hoy = del_dia['ingresos']
+    pedidos_completados_hoy = del_dia['pedidos_entregados']
+
+    # Estados en curso: un solo conteo agrupado sobre el índice de estado
+    en_curso = (db.session.query(PedidoCliente.estado, func.count(PedidoCliente.id))
+                .filter(PedidoCliente.estado.in_(['Pendiente', 'En camino'])))
+    if restringido:
+        en_curso = en_curso.filter(PedidoCliente.sucursal_id.in_(sp))
+    conteos = dict(en_curso.group_by(PedidoCliente.estado).all())
+    pedidos_pendientes = conteos.get('Pendiente', 0)
+    pedidos_en_camino = conteos.get('En camino', 0)
+
     # Pedidos recientes (últimos 5)
     pedidos_query = PedidoCliente.query.order_by(PedidoCliente.fecha.desc())
-    sp = session.get('sucursales_permitidas')
-    if sp and sp != 'ALL':
+    if restringido:
         pedidos_query = pedidos_query.filter(PedidoCliente.sucursal_id.in_(sp))
     pedidos_recientes = pedidos_query.limit(5).all()
-    
+
     # Fecha y hora actual
     now = datetime.now()
-    
+
     # Render unificado
     return render_template(admin_responsive_template('dashboard'), 
                          establecimientos=establecimientos, 
                          sucursales=establecimientos,  # Mantener compatibilidad con templates
-                         menu=menu,
                          now=now,
                          total_admins=total_admins,
                          total_pedidos_hoy=total_pedidos_hoy,
@@ -153,13 +133,37 @@ def dashboard():
                          pedidos_en_camino=pedidos_en_camino,
                          pedidos_completados_hoy=pedidos_completados_hoy,
                          pedidos_recientes=pedidos_recientes,
-                         total_productos=len(menu),
+                         total_productos=total_productos,
                          total_categorias=Categoria.query.count(),
                          total_establecimientos=len(establecimientos),
                          total_sucursales=len(establecimientos),  # Mantener compatibilidad
                          establecimientos_stats=establecimientos,
                          sucursales_stats=establecimientos)  # Mantener compatibilidad
 
+@admin_bp.route('/reportes')
+@login_required
+@solo_lectura
+def reportes():
+    """Reportes de ventas (por defecto, últimos 30 días) a partir de los resúmenes."""
+    from datetime import date, timedelta
+    import analitica
+    sp = session.get('sucursales_permitidas')
+    hoy = date.today()
+    try:
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else hoy
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else hasta - timedelta(days=29)
+    except ValueError:
+        flash('Fechas inválidas; se muestran los últimos 30 días.', 'warning')
+        desde, hasta = hoy - timedelta(days=29), hoy
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    datos = analitica.reporte(desde, hasta, sp)
+    if request.args.get('formato') == 'json':
+        return datos
+    maximo_calor = max((v for fila in datos['mapa_calor']['ingresos'] for v in fila), default=0) or 1
+    return render_template(admin_responsive_template('reportes'), datos=datos, desde=desde, hasta=hasta,
+                           maximo_calor=maximo_calor)
+
 # CRUD Establecimientos
 @admin_bp.route('/sucursales/nueva', methods=['GET', 'POST'])
 @login_required
@@ -210,10 +214,23 @@ def editar_sucursal(id):
         establecimiento.telefono = request.form['telefono']
         # Manejar el campo activa (checkbox)
         establecimiento.activa = 'activa' in request.form
+        # Ruteo de Telegram: se reemplazan los chats de la sucursal
+        SucursalTelegramChat.query.filter_by(sucursal_id=id).delete()
+        vistos = set()
+        for campo, rol in (('telegram_chats', 'sucursal'), ('telegram_supervisores', 'supervisor')):
+            for chat_id in (request.form.get(campo) or '').split(','):
+                chat_id = chat_id.strip()
+                if chat_id and chat_id not in vistos:
+                    vistos.add(chat_id)
+                    db.session.add(SucursalTelegramChat(sucursal_id=id, chat_id=chat_id, rol=rol))
         db.session.commit()
+        invalidar_rutas_telegram()
         flash(f'Establecimiento "{establecimiento.nombre}" actualizado exitosamente.', 'success')
         return redirect(url_for('admin.listar_sucursales'))
-    return render_template(admin_responsive_template('editar_sucursal'), sucursal=establecimiento, establecimiento=establecimiento)
+    telegram_chats = [c.chat_id for c in establecimiento.telegram_chats if c.rol != 'supervisor']
+    telegram_supervisores = [c.chat_id for c in establecimiento.telegram_chats if c.rol == 'supervisor']
+    return render_template(admin_responsive_template('editar_sucursal'), sucursal=establecimiento, establecimiento=establecimiento,
+                           telegram_chats=telegram_chats, telegram_supervisores=telegram_supervisores)
 
 @admin_bp.route('/sucursales/eliminar/<int:id>', methods=['POST'])
 @login_required
@@ -390,6 +407,101 @@ def copiar_horarios(sucursal_id):
     return redirect(url_for('admin.gestionar_horarios', sucursal_id=sucursal_id))
 
 # CRUD Menú
+@admin_bp.route('/menu/exportar')
+@login_required
+@solo_lectura
+def exportar_menu():
+    """Descarga el menú completo en JSON (formato de menu_masivo.py)."""
+    import json
+    from datetime import datetime
+    from flask import Response
+    import menu_masivo
+    datos = menu_masivo.exportar_menu()
+    nombre = f"menu_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
+    return Response(json.dumps(datos, ensure_ascii=False, indent=2), mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename={nombre}'})
+
+@admin_bp.route('/menu/importar', methods=['GET', 'POST'])
+@login_required
+def importar_menu():
+    """Carga masiva del menú desde JSON; con 'simular' solo muestra los cambios."""
+    import json
+    import menu_masivo
+    if session.get('admin_rol') != 'super':
+        flash('Solo el administrador principal puede importar el menú.', 'danger')
+        return redirect(url_for('admin.listar_menu'))
+    resumen = None
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        simular = request.form.get('simular') == 'on'
+        try:
+            if not archivo or not archivo.filename:
+                raise menu_masivo.ErrorImportacion('Selecciona un archivo JSON.')
+            try:
+                datos = json.load(archivo.stream)
+            except ValueError:
+                raise menu_masivo.ErrorImportacion('El archivo no es un JSON válido.')
+            resumen = menu_masivo.importar_menu(datos, simular=simular)
+            if resumen['aplicado']:
+                flash('Menú importado correctamente.', 'success')
+            elif not simular:
+                flash('El archivo no trae cambios respecto al menú actual.', 'info')
+        except menu_masivo.ErrorImportacion as e:
+            flash(str(e), 'danger')
+    return render_template(admin_responsive_template('importar_menu'), resumen=resumen)
+
+def _sucursales_editables(ids, sp):
+    """Filtra ids de sucursal a las que el admin tiene acceso."""
+    ids = {int(i) for i in ids}
+    if sp and sp != 'ALL':
+        ids &= {int(s) for s in sp}
+    return sorted(ids)
+
+@admin_bp.route('/disponibilidad', methods=['GET', 'POST'])
+@login_required
+def disponibilidad():
+    """Marcar productos agotados/disponibles en una o varias sucursales de una sola vez."""
+    import catalogo
+    sp = session.get('sucursales_permitidas')
+    restringido = bool(sp) and sp != 'ALL'
+    sucursales_q = Sucursal.query.filter(Sucursal.id.in_(sp)) if restringido else Sucursal.query
+    sucursales = sucursales_q.order_by(Sucursal.id).all()
+    if request.method == 'POST':
+        productos = [int(x) for x in request.form.getlist('productos') if x.isdigit()]
+        destino = _sucursales_editables(request.form.getlist('sucursales') or [request.form.get('sucursal_id', 0)], sp)
+        disponible = request.form.get('accion') == 'disponible'
+        if not productos or not destino:
+            flash('Selecciona al menos un producto y una sucursal.', 'warning')
+        else:
+            n = catalogo.cambiar_disponibilidad(productos, destino, disponible)
+            estado = 'disponibles' if disponible else 'agotados'
+            flash(f'{n} cambio(s): {len(productos)} producto(s) marcados como {estado}.', 'success')
+        return redirect(url_for('admin.disponibilidad', sucursal_id=request.form.get('sucursal_id') or None))
+    sucursal_id = request.args.get('sucursal_id', type=int)
+    if sucursal_id not in {s.id for s in sucursales}:
+        sucursal_id = sucursales[0].id if sucursales else None
+    disponibles = catalogo.disponibilidad().get(sucursal_id, frozenset())
+    productos = db.session.query(MenuItem.id, MenuItem.nombre, Categoria.nombre.label('categoria')) \
+        .outerjoin(Categoria, MenuItem.categoria_id == Categoria.id).order_by(Categoria.nombre, MenuItem.nombre).all()
+    return render_template(admin_responsive_template('disponibilidad'), sucursales=sucursales,
+                           sucursal_id=sucursal_id, productos=productos, disponibles=disponibles)
+
+@admin_bp.route('/api/disponibilidad', methods=['POST'])
+@login_required
+def api_disponibilidad():
+    """JSON: {"productos": [ids], "sucursales": [ids], "disponible": bool}."""
+    import catalogo
+    datos = request.get_json(silent=True) or {}
+    try:
+        productos = [int(x) for x in datos.get('productos') or []]
+        destino = _sucursales_editables(datos.get('sucursales') or [], session.get('sucursales_permitidas'))
+    except (TypeError, ValueError):
+        return {'ok': False, 'error': 'ids inválidos'}, 400
+    if not productos or not destino or not isinstance(datos.get('disponible'), bool):
+        return {'ok': False, 'error': 'faltan productos, sucursales o disponible'}, 400
+    n = catalogo.cambiar_disponibilidad(productos, destino, datos['disponible'])
+    return {'ok': True, 'cambios': n, 'sucursales': destino}
+
 @admin_bp.route('/menu/nuevo', methods=['GET', 'POST'])
 @login_required
 def nuevo_menuitem():
@@ -484,7 +596,8 @@ def nuevo_menuitem():
 @login_required
 def listar_menu():
     from models import MenuItem, Categoria
-    menu = MenuItem.query.all()
+    # Sucursales y opciones de todos los productos en una consulta cada una (antes: dos por producto)
+    menu = MenuItem.query.options(db.selectinload(MenuItem.sucursales), db.selectinload(MenuItem.opciones)).all()
     categorias = Categoria.query.all()
     
     # Calcular estadísticas basadas en disponibilidad en al menos una sucursal
@@ -720,31 +833,221 @@ def nuevo_pedido():
         return redirect(url_for('admin.listar_pedidos'))
     return render_template(admin_responsive_template('nuevo_pedido'), sucursales=sucursales, productos=productos)
 
+ESTADOS_PEDIDO = ['Pendiente', 'En preparación', 'En camino', 'Entregado', 'Cancelado']
+PEDIDOS_POR_PAGINA = 50
+# A partir de este tamaño (sin filtros) el total y los entregados se estiman en lugar de contarse
+PEDIDOS_CONTEO_EXACTO_MAX = int(os.getenv('PEDIDOS_CONTEO_EXACTO_MAX', '50000'))
+
+def _filtros_pedidos(args):
+    """Lee los filtros del querystring; valores inválidos se ignoran."""
+    from datetime import date
+    filtros = {'estado': '', 'sucursal_id': None, 'desde': None, 'hasta': None, 'q': ''}
+    estado = (args.get('estado') or '').strip()
+    if estado in ESTADOS_PEDIDO:
+        filtros['estado'] = estado
+    try:
+        filtros['sucursal_id'] = int(args.get('sucursal_id')) if args.get('sucursal_id') else None
+    except ValueError:
+        pass
+    for campo in ('desde', 'hasta'):
+        try:
+            filtros[campo] = date.fromisoformat(args.get(campo)) if args.get(campo) else None
+        except ValueError:
+            pass
+    filtros['q'] = (args.get('q') or '').strip()[:20]
+    return filtros
+
+def _filtrar_pedidos(query, filtros, sp, incluir_estado=True):
+    """Aplica alcance por sucursales permitidas y filtros de servidor a una consulta de PedidoCliente."""
+    from datetime import datetime, time, timedelta
+    from sqlalchemy import or_
+    if sp and sp != 'ALL':
+        query = query.filter(PedidoCliente.sucursal_id.in_(sp))
+    if filtros['sucursal_id'] is not None:
+        query = query.filter(PedidoCliente.sucursal_id == filtros['sucursal_id'])
+    if incluir_estado and filtros['estado']:
+        query = query.filter(PedidoCliente.estado == filtros['estado'])
+    # Rango semiabierto sobre la columna: aprovecha el índice de fecha
+    if filtros['desde']:
+        query = query.filter(PedidoCliente.fecha >= datetime.combine(filtros['desde'], time.min))
+    if filtros['hasta']:
+        query = query.filter(PedidoCliente.fecha < datetime.combine(filtros['hasta'] + timedelta(days=1), time.min))
+    if filtros['q']:
+        prefijo = re.sub(r'([\\%_])', r'\\\1', filtros['q']) + '%'
+        query = query.filter(or_(PedidoCliente.telefono.like(prefijo, escape='\\'),
+                                 PedidoCliente.numero_pedido.like(prefijo.upper(), escape='\\')))
+    return query
+
+def _cursor_pedido(pedido) -> str:
+    return f"{pedido.fecha.isoformat()}_{pedido.id}"
+
+def _leer_cursor(valor):
+    from datetime import datetime
+    try:
+        fecha, pid = (valor or '').rsplit('_', 1)
+        return datetime.fromisoformat(fecha), int(pid)
+    except ValueError:
+        return None
+
+def _total_aproximado_pedidos() -> int:
+    """Estimación O(1) del tamaño de la tabla (estadísticas en Postgres, max(id) en SQLite)."""
+    from sqlalchemy import func, text
+    if db.engine.dialect.name == 'postgresql':
+        valor = db.session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'pedidocliente'")).scalar()
+        if valor and valor > 0:
+            return int(valor)
+    return int(db.session.query(func.max(PedidoCliente.id)).scalar() or 0)
+
+def _conteos_por_estado(filtros, sp):
+    """Conteos por estado en una sola consulta agrupada.
+
+    Sin filtros y con tabla grande solo se cuentan exactos los estados no entregados (pocos, vía índice)
+    y 'Entregado' se deduce del total estimado. Devuelve (conteos, total, aproximado).
+    """
+    from sqlalchemy import func
+    sin_filtros = (not sp or sp == 'ALL') and not any(v for k, v in filtros.items() if k != 'estado')
+    aproximado = False
+    query = db.session.query(PedidoCliente.estado, func.count(PedidoCliente.id))
+    if sin_filtros:
+        total_aprox = _total_aproximado_pedidos()
+        if total_aprox > PEDIDOS_CONTEO_EXACTO_MAX:
+            aproximado = True
+            query = query.filter(PedidoCliente.estado.in_([e for e in ESTADOS_PEDIDO if e != 'Entregado']))
+    query = _filtrar_pedidos(query, filtros, sp, incluir_estado=False)
+    conteos = {estado: 0 for estado in ESTADOS_PEDIDO}
+    for estado, n in query.group_by(PedidoCliente.estado).all():
+        conteos[estado or 'Pendiente'] = conteos.get(estado or 'Pendiente', 0) + n
+    if aproximado:
+        conteos['Entregado'] = max(0, total_aprox - sum(conteos.values()))
+        return conteos, total_aprox, True
+    return conteos, sum(conteos.values()), False
+
 @admin_bp.route('/pedidos_clientes')
 @login_required
 def listar_pedidos_clientes():
-    from models import PedidoCliente, Sucursal
+    """Lista paginada por keyset (fecha, id) descendente con filtros de servidor."""
+    from sqlalchemy import and_, or_
     sp = session.get('sucursales_permitidas')
-    base = PedidoCliente.query.order_by(PedidoCliente.fecha.desc())
-    if sp and sp != 'ALL':
-        base = base.filter(PedidoCliente.sucursal_id.in_(sp))
-    pedidos = base.all()
+    filtros = _filtros_pedidos(request.args)
+    base = _filtrar_pedidos(PedidoCliente.query, filtros, sp)
+    cursor = _leer_cursor(request.args.get('antes'))
+    if cursor:
+        fecha_c, id_c = cursor
+        base = base.filter(or_(PedidoCliente.fecha < fecha_c,
+                               and_(PedidoCliente.fecha == fecha_c, PedidoCliente.id < id_c)))
+    filas = (base.options(db.joinedload(PedidoCliente.sucursal))
+             .order_by(PedidoCliente.fecha.desc(), PedidoCliente.id.desc())
+             .limit(PEDIDOS_POR_PAGINA + 1).all())
+    hay_siguiente = len(filas) > PEDIDOS_POR_PAGINA
+    pedidos = filas[:PEDIDOS_POR_PAGINA]
+    siguiente_cursor = _cursor_pedido(pedidos[-1]) if hay_siguiente and pedidos[-1].fecha else None
     # Limitar sucursales mostradas
     if sp == 'ALL' or not sp:
         sucursales = Sucursal.query.all()
     else:
         sucursales = Sucursal.query.filter(Sucursal.id.in_(sp)).all()
-    
-    # Calcular estadísticas
-    pedidos_pendientes = len([p for p in pedidos if p.estado == 'pendiente'])
-    pedidos_completados = len([p for p in pedidos if p.estado == 'entregado'])
-    
+
+    # Estadísticas: una consulta agrupada
+    conteos, total_pedidos, total_aproximado = _conteos_por_estado(filtros, sp)
+    filtros_url = {k: (v.isoformat() if hasattr(v, 'isoformat') else v) for k, v in filtros.items() if v not in (None, '')}
+
     # Render unificado
     return render_template(admin_responsive_template('listar_pedidos_clientes'), 
                          pedidos=pedidos, 
                          sucursales=sucursales,
-                         pedidos_pendientes=pedidos_pendientes,
-                         pedidos_completados=pedidos_completados)
+                         pedidos_pendientes=conteos['Pendiente'],
+                         pedidos_completados=conteos['Entregado'],
+                         conteos=conteos,
+                         estados=ESTADOS_PEDIDO,
+                         total_pedidos=total_pedidos,
+                         total_aproximado=total_aproximado,
+                         filtros=filtros,
+                         filtros_url=filtros_url,
+                         pagina_con_cursor=bool(cursor),
+                         siguiente_cursor=siguiente_cursor)
+
+EXPORT_COLUMNAS = ['numero_pedido', 'fecha', 'estado', 'sucursal_id', 'sucursal', 'nombre', 'telefono',
+                   'direccion', 'colonia', 'forma_pago', 'total', 'productos']
+EXPORT_LOTE = 1000
+
+def _filas_export(filtros, sp):
+    """Filas (tuplas) del export leídas por lotes con cursor de servidor; no carga entidades ORM."""
+    from sqlalchemy import select
+    consulta = (select(PedidoCliente.numero_pedido, PedidoCliente.fecha, PedidoCliente.estado,
+                       PedidoCliente.sucursal_id, Sucursal.nombre, PedidoCliente.nombre, PedidoCliente.telefono,
+                       PedidoCliente.direccion, PedidoCliente.colonia, PedidoCliente.forma_pago,
+                       PedidoCliente.total, PedidoCliente.productos)
+                .outerjoin(Sucursal, Sucursal.id == PedidoCliente.sucursal_id)
+                .order_by(PedidoCliente.fecha, PedidoCliente.id))
+    consulta = _filtrar_pedidos(consulta, filtros, sp)
+    resultado = db.session.execute(consulta.execution_options(yield_per=EXPORT_LOTE))
+    for lote in resultado.partitions():
+        yield lote
+
+def _export_csv(lotes):
+    import csv
+    import io
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(EXPORT_COLUMNAS)
+    for lote in lotes:
+        escritor.writerows((f[0], f[1].isoformat(sep=' ') if f[1] else '', *f[2:]) for f in lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _export_ndjson(lotes):
+    import json
+    for lote in lotes:
+        partes = []
+        for f in lote:
+            registro = dict(zip(EXPORT_COLUMNAS, f))
+            registro['fecha'] = f[1].isoformat() if f[1] else None
+            try:
+                registro['productos'] = json.loads(f[11]) if f[11] else []
+            except ValueError:
+                pass  # pedidos antiguos guardan texto libre
+            partes.append(json.dumps(registro, ensure_ascii=False))
+        yield '\n'.join(partes) + '\n'
+
+def _gzip_al_vuelo(trozos):
+    import zlib
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for trozo in trozos:
+        datos = compresor.compress(trozo.encode('utf-8'))
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+@admin_bp.route('/pedidos_clientes/export')
+@login_required
+@solo_lectura
+def exportar_pedidos_clientes():
+    """Exporta pedidos en CSV o NDJSON en streaming (memoria constante), opcionalmente con gzip.
+
+    Acepta los mismos filtros que la lista (estado, sucursal_id, desde, hasta, q) y respeta
+    las sucursales permitidas del admin.
+    """
+    from datetime import datetime
+    from flask import Response, stream_with_context
+    sp = session.get('sucursales_permitidas')
+    filtros = _filtros_pedidos(request.args)
+    formato = 'ndjson' if request.args.get('formato') == 'ndjson' else 'csv'
+    comprimir = request.args.get('gzip') in ('1', 'true', 'si')
+    generador = (_export_ndjson if formato == 'ndjson' else _export_csv)(_filas_export(filtros, sp))
+    nombre = f"pedidos_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+    tipo = 'application/x-ndjson' if formato == 'ndjson' else 'text/csv; charset=utf-8'
+    if comprimir:
+        generador = _gzip_al_vuelo(generador)
+        nombre += '.gz'
+        tipo = 'application/gzip'
+    return Response(stream_with_context(generador), mimetype=tipo, headers={
+        'Content-Disposition': f'attachment; filename={nombre}',
+        'X-Accel-Buffering': 'no',
+        'Cache-Control': 'no-store',
+    })
 
 @admin_bp.route('/pedidos_clientes/<int:id>')
 @login_required
@@ -756,14 +1059,7 @@ def ver_pedido_cliente(id):
         flash('No tienes permiso para ver este pedido.', 'danger')
         return redirect(url_for('admin.listar_pedidos_clientes'))
     
-    # Detectar dispositivo y usar template apropiado
-    from app import is_mobile_device
-    if is_mobile_device():
-        template_name = 'pedido_cliente_mobile.html'
-        print("📱 Sirviendo pedido cliente móvil")
-    else:
-        template_name = 'pedido_cliente_desktop.html'
-        print("💻 Sirviendo pedido cliente escritorio")
+    template_name = plantilla('pedido_cliente')
     
     return render_template(template_name, pedido=pedido)
 
@@ -776,8 +1072,10 @@ def actualizar_estado_pedido(id):
     if sp and sp != 'ALL' and pedido.sucursal_id not in sp:
         flash('No tienes permiso para modificar este pedido.', 'danger')
         return redirect(url_for('admin.listar_pedidos_clientes'))
-    pedido.estado = request.form['estado']
-    db.session.commit()
+    from resumen_ventas import cambiar_estado_pedido
+    from perfil_sqlite import escritura
+    with escritura():
+        cambiar_estado_pedido(PedidoCliente.id == pedido.id, request.form['estado'])
     return redirect(url_for('admin.listar_pedidos_clientes'))
 
 # CRUD Categorías
@@ -838,3 +1136,27 @@ def eliminar_categoria(id):
     
     flash(f'La categoría "{nombre_categoria}" ha sido eliminada exitosamente.', 'success')
     return redirect(url_for('admin.listar_categorias'))
+
+@admin_bp.route('/perfiles')
+@login_required
+def perfiles():
+    """Perfiles más lentos por endpoint que guardó este worker (ver perfilador.py), en JSON."""
+    from flask import jsonify
+    import perfilador
+    if session.get('admin_rol') != 'super':
+        return jsonify({'ok': False, 'error': 'Solo el administrador principal'}), 403
+    return jsonify({'pid': os.getpid(), 'perfiles': perfilador.guardados()})
+
+@admin_bp.route('/perfiles/<perfil_id>.folded')
+@login_required
+def descargar_perfil(perfil_id):
+    """Pilas colapsadas de un perfil guardado, para flamegraph.pl o speedscope."""
+    from flask import Response, abort
+    import perfilador
+    if session.get('admin_rol') != 'super':
+        abort(403)
+    perfil = perfilador.buscar(perfil_id)
+    if perfil is None:
+        abort(404)
+    return Response(perfilador.colapsado(perfil), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename=perfil-{perfil_id}.folded'})
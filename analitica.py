@@ -0,0 +1,178 @@
+"""Analítica de ventas para el panel de reportes.
+
+Lee los resúmenes de resumen_ventas.py (nunca pedidocliente fila por fila). La base hace un primer
+GROUP BY por la dimensión que se necesita (día-hora, producto, forma de pago) para traer pocas filas;
+el resto (hora de la semana, tickets, porcentajes) se calcula sobre arreglos columnares de numpy con
+operaciones vectorizadas. La entrada es O(días × horas), no O(pedidos).
+
+Los resultados se cachean por (rango, conjunto de sucursales).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+import metricas
+from extensions import db
+
+CACHE_TTL_SEG = int(os.getenv('ANALITICA_CACHE_TTL', '300'))
+CACHE_TTL_HOY_SEG = int(os.getenv('ANALITICA_CACHE_TTL_HOY', '60'))  # Rangos que incluyen hoy cambian más
+CACHE_MAX = int(os.getenv('ANALITICA_CACHE_MAX', '64'))
+DIAS_SEMANA = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+
+_cache = OrderedDict()  # clave -> (expira, resultado)
+_cache_lock = threading.Lock()
+
+
+def _clave(desde: date, hasta: date, sucursales):
+    if not sucursales or sucursales == 'ALL':
+        return desde, hasta, 'ALL'
+    return desde, hasta, tuple(sorted(int(s) for s in sucursales))
+
+
+def invalidar_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def reporte(desde: date, hasta: date, sucursales=None) -> dict:
+    """Reporte completo del rango [desde, hasta] para las sucursales dadas ('ALL'/None = todas)."""
+    clave = _clave(desde, hasta, sucursales)
+    ahora = time.monotonic()
+    with _cache_lock:
+        entrada = _cache.get(clave)
+        if entrada and entrada[0] > ahora:
+            _cache.move_to_end(clave)
+            metricas.cache('reportes', True)
+            return entrada[1]
+    metricas.cache('reportes', False)
+    resultado = calcular(desde, hasta, sucursales)
+    ttl = CACHE_TTL_HOY_SEG if hasta >= date.today() else CACHE_TTL_SEG
+    with _cache_lock:
+        _cache[clave] = (ahora + ttl, resultado)
+        _cache.move_to_end(clave)
+        while len(_cache) > CACHE_MAX:
+            _cache.popitem(last=False)
+    return resultado
+
+
+def _columnas(query, tipos):
+    """Ejecuta la consulta y devuelve una tupla de arreglos numpy, uno por columna."""
+    filas = query.all()
+    if not filas:
+        return tuple(np.empty(0, dtype=t) for t in tipos)
+    return tuple(np.asarray(col, dtype=t) for col, t in zip(zip(*filas), tipos))
+
+
+def _alcance(query, modelo, desde, hasta, sucursales):
+    query = query.filter(modelo.dia >= desde, modelo.dia <= hasta)
+    if sucursales and sucursales != 'ALL':
+        query = query.filter(modelo.sucursal_id.in_(sucursales))
+    return query
+
+
+def _sumar(indices, pesos, n):
+    """Suma de `pesos` agrupada por `indices` (siempre float, también con entrada vacía)."""
+    return np.bincount(indices, weights=pesos, minlength=n).astype(np.float64)
+
+
+def _redondear(valor):
+    return round(float(valor), 2)
+
+
+def calcular(desde: date, hasta: date, sucursales=None) -> dict:
+    """Calcula el reporte sin caché."""
+    from models import VentaDiaria, VentaHora, VentaProducto, VentaFormaPago, Sucursal
+
+    from sqlalchemy import func
+    suma = func.sum
+
+    # Mapa de calor hora-de-semana (7 × 24) de ingresos y pedidos
+    dias, horas, pedidos_h, ingresos_h = _columnas(
+        _alcance(db.session.query(VentaHora.dia, VentaHora.hora, suma(VentaHora.pedidos), suma(VentaHora.ingresos)),
+                 VentaHora, desde, hasta, sucursales).group_by(VentaHora.dia, VentaHora.hora),
+        (object, np.int64, np.int64, np.float64))
+    ordinales = np.fromiter((d.toordinal() for d in dias), dtype=np.int64, count=len(dias))
+    celda = ((ordinales - 1) % 7) * 24 + horas  # date.toordinal()=1 fue lunes
+    mapa_ingresos = _sumar(celda, ingresos_h, 168).reshape(7, 24)
+    mapa_pedidos = _sumar(celda, pedidos_h, 168).reshape(7, 24)
+
+    # Ticket promedio, tasa de cancelación y ventas por día desde venta_diaria
+    dias_d, sucursal_d, pedidos_d, ingresos_d, cancelados_d = _columnas(
+        _alcance(db.session.query(VentaDiaria.dia, VentaDiaria.sucursal_id, VentaDiaria.pedidos,
+                                  VentaDiaria.ingresos, VentaDiaria.pedidos_cancelados),
+                 VentaDiaria, desde, hasta, sucursales),
+        (object, np.int64, np.int64, np.float64, np.int64))
+    validos_d = pedidos_d - cancelados_d
+    sucursales_ids, inv = np.unique(sucursal_d, return_inverse=True)
+    por_suc_ingresos = _sumar(inv, ingresos_d, len(sucursales_ids))
+    por_suc_validos = _sumar(inv, validos_d, len(sucursales_ids))
+    ticket = np.divide(por_suc_ingresos, por_suc_validos, out=np.zeros_like(por_suc_ingresos),
+                       where=por_suc_validos > 0)
+    nombres = dict(db.session.query(Sucursal.id, Sucursal.nombre).filter(Sucursal.id.in_(sucursales_ids.tolist())).all()) \
+        if len(sucursales_ids) else {}
+    total_pedidos = int(pedidos_d.sum())
+    total_cancelados = int(cancelados_d.sum())
+    total_ingresos = float(ingresos_d.sum())
+    total_validos = int(validos_d.sum())
+
+    ordinales_d = np.fromiter((d.toordinal() for d in dias_d), dtype=np.int64, count=len(dias_d))
+    dias_u, inv_d = np.unique(ordinales_d, return_inverse=True)
+    ingresos_dia = _sumar(inv_d, ingresos_d, len(dias_u))
+    pedidos_dia = _sumar(inv_d, pedidos_d, len(dias_u))
+
+    # Productos más vendidos
+    nombres_p, cantidades_p, ingresos_p = _columnas(
+        _alcance(db.session.query(VentaProducto.nombre, suma(VentaProducto.cantidad), suma(VentaProducto.ingresos)),
+                 VentaProducto, desde, hasta, sucursales).group_by(VentaProducto.nombre),
+        (object, np.int64, np.float64))
+    productos_u, inv_p = np.unique(nombres_p.astype(str), return_inverse=True) if len(nombres_p) \
+        else (np.empty(0, dtype=str), np.empty(0, dtype=np.int64))
+    cantidad_prod = _sumar(inv_p, cantidades_p, len(productos_u))
+    ingresos_prod = _sumar(inv_p, ingresos_p, len(productos_u))
+    orden = np.argsort(-cantidad_prod, kind='stable')[:10]
+
+    # Mezcla de formas de pago
+    formas, pedidos_fp, ingresos_fp = _columnas(
+        _alcance(db.session.query(VentaFormaPago.forma_pago, suma(VentaFormaPago.pedidos), suma(VentaFormaPago.ingresos)),
+                 VentaFormaPago, desde, hasta, sucursales).group_by(VentaFormaPago.forma_pago),
+        (object, np.int64, np.float64))
+    formas_u, inv_fp = np.unique(formas.astype(str), return_inverse=True) if len(formas) \
+        else (np.empty(0, dtype=str), np.empty(0, dtype=np.int64))
+    pedidos_forma = _sumar(inv_fp, pedidos_fp, len(formas_u))
+    ingresos_forma = _sumar(inv_fp, ingresos_fp, len(formas_u))
+    total_fp = pedidos_forma.sum()
+
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'totales': {
+            'pedidos': total_pedidos,
+            'cancelados': total_cancelados,
+            'ingresos': _redondear(total_ingresos),
+            'ticket_promedio': _redondear(total_ingresos / total_validos) if total_validos else 0.0,
+            'tasa_cancelacion': round(total_cancelados / total_pedidos, 4) if total_pedidos else 0.0,
+        },
+        'mapa_calor': {
+            'dias': DIAS_SEMANA,
+            'ingresos': np.round(mapa_ingresos, 2).tolist(),
+            'pedidos': mapa_pedidos.astype(int).tolist(),
+        },
+        'ventas_por_dia': [
+            {'dia': date.fromordinal(int(o)).isoformat(), 'pedidos': int(p), 'ingresos': _redondear(i)}
+            for o, p, i in zip(dias_u, pedidos_dia, ingresos_dia)],
+        'por_sucursal': [
+            {'sucursal_id': int(sid), 'nombre': nombres.get(int(sid), 'Sin sucursal'),
+             'ingresos': _redondear(ing), 'pedidos': int(val), 'ticket_promedio': _redondear(t)}
+            for sid, ing, val, t in zip(sucursales_ids, por_suc_ingresos, por_suc_validos, ticket)],
+        'top_productos': [
+            {'nombre': str(productos_u[k]), 'cantidad': int(cantidad_prod[k]), 'ingresos': _redondear(ingresos_prod[k])}
+            for k in orden if cantidad_prod[k] > 0],
+        'formas_pago': [
+            {'forma_pago': str(f), 'pedidos': int(p), 'ingresos': _redondear(i),
+             'porcentaje': round(float(p) / total_fp * 100, 1) if total_fp else 0.0}
+            for f, p, i in zip(formas_u, pedidos_forma, ingresos_forma)],
+    }
@@ -1,7 +1,11 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
+import time
+T0_IMPORT = time.perf_counter()  # Antes de cualquier import pesado, para medir el arranque
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, current_app
+from flask.cli import AppGroup
 from datetime import datetime
-import os, random, string, json
-from sqlalchemy import text
+import os, random, string, json, threading, logging
+import click
 
 # Cargar variables de entorno ANTES de importar módulos que leen os.getenv
 try:
@@ -16,19 +20,51 @@ from models import (
     Sucursal, MenuItem, PedidoCliente, Extra, Categoria, HorarioSucursal,
     OpcionPersonalizada, ValorOpcion
 )
-from telegram_bot import enviar_notificacion_pedido, procesar_update, TELEGRAM_TOKEN, poll_once, iniciar_polling_background
+from telegram_bot import enviar_notificacion_pedido, procesar_update, TELEGRAM_TOKEN, API_URL as TELEGRAM_API_URL, poll_once, iniciar_polling_background
 from event_bus import sse_stream
+import resumen_ventas
+import catalogo as catalogo_cache
+import dispositivo
+import horarios
+import migraciones
+import registro
+import perfilador
+import presupuesto_sql
+from registro import volcado
+import replica
+import perfil_sqlite
+import metricas
+import metricas_db
+from perfil_sqlite import escritura
+from replica import solo_lectura
+from dispositivo import es_movil as is_mobile_device
+
+log = logging.getLogger(__name__)
+
+PEDIDOS_CREADOS = metricas.contador('pedidos_creados_total', 'Pedidos creados por sucursal', ('sucursal',))
 
 # Marca simple de versión del archivo para depuración de recargas
 CODE_VERSION = 'timeline-progreso-2025-08-27-1'
 
-app = Flask(__name__)
+# Rutas y comandos se registran aquí y create_app los monta en cada app creada
+_rutas = []
+cli = AppGroup('app')
 
-# Secret key configurable vía entorno
-app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-change-me')
+def ruta(regla, **opciones):
+    """Como @app.route, pero diferido hasta create_app (el endpoint sigue siendo el nombre de la función)."""
+    def decorador(f):
+        _rutas.append((regla, f, opciones))
+        return f
+    return decorador
 
 def _database_uri():
-    uri = os.getenv('DATABASE_URL', 'sqlite:///pozoleria_new.db')
+    return _normalizar_uri(os.getenv('DATABASE_URL', 'sqlite:///pozoleria_new.db'))
+
+def _replica_uris():
+    """Réplicas de solo lectura (opcionales): DATABASE_REPLICA_URL, varias separadas por coma."""
+    return [_normalizar_uri(u.strip()) for u in os.getenv('DATABASE_REPLICA_URL', '').split(',') if u.strip()]
+
+def _normalizar_uri(uri):
     # Normalizar URL de postgres (Render suele usar postgres:// )
     if uri.startswith('postgres://'):
         uri = uri.replace('postgres://', 'postgresql://', 1)
@@ -44,21 +80,7 @@ def _database_uri():
         uri = uri.replace('postgresql://', 'postgresql+psycopg://', 1)
     return uri
 
-app.config['SQLALCHEMY_DATABASE_URI'] = _database_uri()
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_pre_ping': True,      # Detecta conexiones muertas antes de usarlas
-    'pool_recycle': 300,        # Recicla conexiones cada 5 min para evitar cortes por inactividad
-    'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
-    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
-}
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB max
-
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Agregar filtro personalizado para convertir JSON
-@app.template_filter('fromjson')
+# Filtro personalizado para convertir JSON
 def fromjson_filter(json_str):
     """Filtro para convertir string JSON a objeto Python"""
     try:
@@ -78,15 +100,6 @@ def generar_numero_pedido():
         if not PedidoCliente.query.filter_by(numero_pedido=numero_pedido).first():
             return numero_pedido
 
-def is_mobile_device():
-    """Detecta si el request viene de un dispositivo móvil"""
-    user_agent = request.headers.get('User-Agent', '').lower()
-    mobile_patterns = [
-        'mobile', 'android', 'iphone', 'ipad', 'ipod', 'blackberry', 
-        'windows phone', 'webos', 'nokia', 'opera mini', 'palm'
-    ]
-    return any(pattern in user_agent for pattern in mobile_patterns)
-
 def get_base_template():
     """Devuelve el template base apropiado según el dispositivo"""
     if is_mobile_device():
@@ -94,37 +107,8 @@ def get_base_template():
     else:
         return 'base_desktop.html'
 
-db.init_app(app)
-app.register_blueprint(admin_bp)
-
-# Auto-migración ligera para evitar errores 'no such column' en entornos sin alembic.
-def ensure_schema():
-    """Auto-ajustes mínimos SOLO para SQLite; en otros motores solo crea tablas.
-
-    Evita ejecutar PRAGMA / ALTER inseguros en PostgreSQL.
-    """
-    with app.app_context():
-        try:
-            engine = db.engine  # evitar deprecation get_engine
-            dialect = engine.dialect.name
-            if dialect == 'sqlite':
-                try:
-                    info = db.session.execute(text("PRAGMA table_info(administrador)")).all()
-                    columnas = [row[1] for row in info]
-                    if 'rol' not in columnas:
-                        db.session.execute(text("ALTER TABLE administrador ADD COLUMN rol VARCHAR(20) DEFAULT 'empleado'"))
-                        db.session.commit()
-                except Exception as inner:
-                    print(f"[AUTO-MIGRACION][sqlite] Aviso: {inner}")
-            else:
-                # Para PostgreSQL (u otros) confiar en models + create_all inicial
-                pass
-            db.create_all()
-        except Exception as e:
-            print(f"[AUTO-MIGRACION] Advertencia: {e}")
-
-# Ejecutar verificación al cargar el módulo
-ensure_schema()
+# Tareas de una sola vez por despliegue. Corren en `flask release`, no al importar en cada worker:
+# importar app.py no hace red ni recorre tablas completas.
 
 # Seed opcional de administrador inicial (solo si variables están definidas y no existe)
 def ensure_seed_admin():
@@ -137,82 +121,61 @@ def ensure_seed_admin():
             if not Administrador.query.filter_by(usuario=user).first():
                 db.session.add(Administrador(usuario=user, password=pwd, nombre=nombre, rol='super'))
                 db.session.commit()
-                print(f"[SEED] Administrador creado: {user}")
+                log.info('Administrador inicial creado: %s', user)
             else:
-                print('[SEED] Admin inicial ya existe, no se crea otro.')
+                log.info('Admin inicial ya existe, no se crea otro')
     except Exception as e:
-        print('[SEED] Error creando admin inicial:', e)
+        log.exception('Error creando admin inicial: %s', e)
 
-with app.app_context():
-    ensure_seed_admin()
-    # Normalizar imágenes antiguas que guardaron ruta completa
+def normalizar_imagenes():
+    """Deja solo el nombre de archivo en imágenes antiguas que guardaron la ruta completa."""
+    cambios = 0
+    for mi in MenuItem.query.filter(MenuItem.imagen.like('%/static/uploads/%')):
+        nuevo = os.path.basename(mi.imagen)
+        if nuevo != mi.imagen:
+            mi.imagen = nuevo
+            cambios += 1
+    if cambios:
+        db.session.commit()
+    return cambios
+
+def registrar_webhook_auto():
+    """setWebhook con la URL pública (TELEGRAM_WEBHOOK_BASE, PUBLIC_BASE_URL o RENDER_EXTERNAL_URL)."""
+    # Condiciones: tener TOKEN, no usar polling explícito y bandera TELEGRAM_AUTO_WEBHOOK=1
+    if not TELEGRAM_TOKEN or os.getenv('TELEGRAM_USE_POLLING', '0') == '1' or os.getenv('TELEGRAM_AUTO_WEBHOOK', '1') != '1':
+        return
+    public_base = os.getenv('TELEGRAM_WEBHOOK_BASE') or os.getenv('PUBLIC_BASE_URL') or os.getenv('RENDER_EXTERNAL_URL')
+    if not public_base:
+        log.warning('No se pudo registrar el webhook de Telegram: falta TELEGRAM_WEBHOOK_BASE o RENDER_EXTERNAL_URL')
+        return
+    webhook_url = f"{public_base.rstrip('/')}/telegram/webhook"
+    import requests as _r
     try:
-        from models import MenuItem
-        cambios = 0
-        for mi in MenuItem.query.all():
-            if mi.imagen and '/static/uploads/' in mi.imagen:
-                import os as _os
-                nuevo = _os.path.basename(mi.imagen)
-                if nuevo != mi.imagen:
-                    mi.imagen = nuevo
-                    cambios += 1
-        if cambios:
-            db.session.commit()
-            print(f"[NORMALIZACION] Imágenes ajustadas: {cambios}")
-    except Exception as _e_norm:
-        print('[NORMALIZACION] Aviso al limpiar imágenes:', _e_norm)
-
-    # Registro automático de webhook (solo una vez al arrancar el proceso principal)
+        resp = _r.get(f'{TELEGRAM_API_URL}/setWebhook', params={'url': webhook_url, 'max_connections': 40}, timeout=15)
+    except Exception as e:
+        log.error('Error registrando webhook de Telegram: %s', e)
+        return
+    j = {}
     try:
-        # Condiciones: tener TOKEN, no usar polling explícito y bandera TELEGRAM_AUTO_WEBHOOK=1
-        if TELEGRAM_TOKEN and os.getenv('TELEGRAM_USE_POLLING', '0') != '1' and os.getenv('TELEGRAM_AUTO_WEBHOOK', '1') == '1':
-            # Base pública: prioridad a TELEGRAM_WEBHOOK_BASE, luego RENDER_EXTERNAL_URL, luego PUBLIC_BASE_URL
-            public_base = os.getenv('TELEGRAM_WEBHOOK_BASE') or os.getenv('PUBLIC_BASE_URL') or os.getenv('RENDER_EXTERNAL_URL')
-            if public_base:
-                public_base = public_base.rstrip('/')
-                webhook_url = f"{public_base}/telegram/webhook"
-                import requests as _r
-                resp = _r.get(f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/setWebhook', params={'url': webhook_url, 'max_connections': 40})
-                j = {}
-                try:
-                    j = resp.json()
-                except Exception:
-                    pass
-                if j.get('ok'):
-                    print(f"[TELEGRAM] Webhook registrado auto -> {webhook_url}")
-                else:
-                    print(f"[TELEGRAM] Falló auto setWebhook status={resp.status_code} body={resp.text[:200]}")
-            else:
-                print('[TELEGRAM] No se pudo registrar webhook automáticamente: falta TELEGRAM_WEBHOOK_BASE o RENDER_EXTERNAL_URL')
-    except Exception as _e_auto_wh:
-        print('[TELEGRAM] Error registrando webhook auto:', _e_auto_wh)
-
-# Iniciar polling en desarrollo (solo si no hay variable que indique producción)
-try:
-    # En producción (Render) se recomienda usar webhook; desactivar polling por defecto (valor '0').
-    if os.environ.get('TELEGRAM_USE_POLLING', '0') == '1':
-        # Evitar doble arranque en recarga debug
-        if TELEGRAM_TOKEN and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-            iniciar_polling_background(app)
-            print('[TELEGRAM] Polling background iniciado (main)')
-        elif not TELEGRAM_TOKEN:
-            print('[TELEGRAM] Polling no iniciado: falta TELEGRAM_TOKEN')
-        else:
-            print('[TELEGRAM] Polling omitido (proceso secundario reloader)')
-except Exception as _e:
-    print('[TELEGRAM] No se pudo iniciar polling background:', _e)
+        j = resp.json()
+    except Exception:
+        pass
+    if j.get('ok'):
+        log.info('Webhook de Telegram registrado -> %s', webhook_url)
+    else:
+        log.error('Falló setWebhook status=%s body=%s', resp.status_code, resp.text[:200])
 
-@app.route('/telegram/webhook', methods=['POST'])
+@ruta('/telegram/webhook', methods=['POST'])
 def telegram_webhook():
     try:
         update = request.get_json(force=True, silent=True) or {}
-        print('[TELEGRAM] Update recibido:', update)
+        volcado(log, 'Update de Telegram recibido', update)
         procesar_update(update)
     except Exception as e:
-        print('[TELEGRAM] Error webhook:', e)
+        log.exception('Error en webhook de Telegram: %s', e)
     return jsonify({'ok': True})
 
-@app.route('/telegram/set_webhook')
+@ruta('/telegram/set_webhook')
 def set_webhook():
     """Helper rápido para registrar el webhook (usar temporalmente)."""
     # URL pública donde está accesible tu servidor (reemplazar)
@@ -220,29 +183,29 @@ def set_webhook():
     if not public_url:
         return 'Proporciona ?url=https://tu-dominio', 400
     import requests as _r
-    resp = _r.get(f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/setWebhook', params={'url': f'{public_url}/telegram/webhook'})
+    resp = _r.get(f'{TELEGRAM_API_URL}/setWebhook', params={'url': f'{public_url}/telegram/webhook'})
     return resp.text, resp.status_code
 
-@app.route('/telegram/delete_webhook')
+@ruta('/telegram/delete_webhook')
 def delete_webhook():
     import requests as _r
-    resp = _r.get(f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/deleteWebhook')
+    resp = _r.get(f'{TELEGRAM_API_URL}/deleteWebhook')
     return resp.text, resp.status_code
 
-@app.route('/telegram/webhook_info')
+@ruta('/telegram/webhook_info')
 def webhook_info():
     """Devuelve info del webhook actual para debugging."""
     if not TELEGRAM_TOKEN:
         return jsonify({'ok': False, 'error': 'Sin TELEGRAM_TOKEN'}), 400
     import requests as _r
-    r = _r.get(f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/getWebhookInfo', timeout=10)
+    r = _r.get(f'{TELEGRAM_API_URL}/getWebhookInfo', timeout=10)
     try:
         data = r.json()
     except Exception:
         data = {'ok': False, 'error': 'Respuesta no JSON', 'raw': r.text[:200]}
     return jsonify(data), 200 if data.get('ok') else 500
 
-@app.route('/telegram/force_webhook')
+@ruta('/telegram/force_webhook')
 def force_webhook():
     """Fuerza setWebhook usando base de env. Protegido opcionalmente por TELEGRAM_WEBHOOK_SECRET."""
     secret_cfg = os.getenv('TELEGRAM_WEBHOOK_SECRET')
@@ -257,16 +220,16 @@ def force_webhook():
     base = base.rstrip('/')
     full_url = f"{base}/telegram/webhook"
     import requests as _r
-    r = _r.get(f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/setWebhook', params={'url': full_url})
+    r = _r.get(f'{TELEGRAM_API_URL}/setWebhook', params={'url': full_url})
     return r.text, r.status_code
 
-@app.route('/telegram/poll')
+@ruta('/telegram/poll')
 def telegram_poll():
     """Procesa manualmente updates (usar si no configuraste webhook)."""
     res = poll_once()
     return jsonify(res)
 
-@app.route('/pedido', methods=['GET', 'POST'])
+@ruta('/pedido', methods=['GET', 'POST'])
 def pedido_cliente():
     establecimientos = Sucursal.query.all()
     productos = MenuItem.query.all()
@@ -277,14 +240,8 @@ def pedido_cliente():
         # Verificar si está abierto ahora
         abierta_ahora = HorarioSucursal.sucursal_abierta_ahora(establecimiento.id)
         
-        # Obtener horarios para mostrar
-        horarios_info = []
-        for horario in establecimiento.horarios:
-            dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-            if horario.cerrado:
-                horarios_info.append(f"{dias[horario.dia_semana]}: Cerrado")
-            else:
-                horarios_info.append(f"{dias[horario.dia_semana]}: {horario.hora_apertura.strftime('%H:%M')} - {horario.hora_cierre.strftime('%H:%M')}")
+        # Horarios para mostrar (del índice en memoria: sin una consulta por sucursal)
+        horarios_info = horarios.textos(establecimiento.id)
         
         establecimientos_data.append({
             'id': establecimiento.id,
@@ -308,35 +265,40 @@ def pedido_cliente():
         establecimiento = Sucursal.query.get(establecimiento_id)
         if not establecimiento or not establecimiento.activa:
             flash('El establecimiento seleccionado no está disponible.', 'danger')
-            template_name = 'pedido_cliente_mobile.html' if is_mobile_device() else 'pedido_cliente_desktop.html'
+            template_name = dispositivo.plantilla('pedido_cliente')
             return render_template(template_name, sucursales=establecimientos_data, productos=productos)
         
         abierta_ahora = HorarioSucursal.sucursal_abierta_ahora(establecimiento_id)
         if not abierta_ahora:
             flash('El establecimiento seleccionado está cerrado en este momento. Por favor verifica los horarios de atención.', 'warning')
-            template_name = 'pedido_cliente_mobile.html' if is_mobile_device() else 'pedido_cliente_desktop.html'
+            template_name = dispositivo.plantilla('pedido_cliente')
             return render_template(template_name, sucursales=establecimientos_data, productos=productos)
         
         productos_str = ', '.join(productos_seleccionados)
-        pedido = PedidoCliente(
-            nombre=nombre,
-            telefono=telefono,
-            direccion=direccion,
-            sucursal_id=establecimiento_id,  # Mantenemos el nombre del campo DB por compatibilidad
-            productos=productos_str,
-            total=total,
-            fecha=datetime.now(),
-            estado='Pendiente'
-        )
-        db.session.add(pedido)
-        db.session.commit()
+        with escritura():
+            pedido = PedidoCliente(
+                nombre=nombre,
+                telefono=telefono,
+                direccion=direccion,
+                sucursal_id=establecimiento_id,  # Mantenemos el nombre del campo DB por compatibilidad
+                productos=productos_str,
+                total=total,
+                fecha=datetime.now(),
+                estado='Pendiente'
+            )
+            db.session.add(pedido)
+            db.session.flush()
+            # En la misma transacción: el pedido y sus resúmenes se guardan juntos o ninguno
+            resumen_ventas.registrar_pedido(pedido)
+        PEDIDOS_CREADOS.inc(sucursal=establecimiento_id)
         flash('¡Pedido realizado correctamente! Pronto nos pondremos en contacto.', 'success')
         return redirect(url_for('pedido_cliente'))
     
-    template_name = 'pedido_cliente_mobile.html' if is_mobile_device() else 'pedido_cliente_desktop.html'
+    template_name = dispositivo.plantilla('pedido_cliente')
     return render_template(template_name, sucursales=establecimientos_data, productos=productos)
 
-@app.route('/')
+@ruta('/')
+@solo_lectura
 def index():
     """Página de inicio profesional con categorías"""
     categorias = Categoria.query.all()
@@ -349,14 +311,8 @@ def index():
         # Verificar si está abierto ahora
         abierta_ahora = HorarioSucursal.sucursal_abierta_ahora(establecimiento.id)
         
-        # Obtener horarios para mostrar
-        horarios_info = []
-        for horario in establecimiento.horarios:
-            dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-            if horario.cerrado:
-                horarios_info.append(f"{dias[horario.dia_semana]}: Cerrado")
-            else:
-                horarios_info.append(f"{dias[horario.dia_semana]}: {horario.hora_apertura.strftime('%H:%M')} - {horario.hora_cierre.strftime('%H:%M')}")
+        # Horarios para mostrar (del índice en memoria: sin una consulta por sucursal)
+        horarios_info = horarios.textos(establecimiento.id)
         
         establecimientos_data.append({
             'id': establecimiento.id,
@@ -368,24 +324,17 @@ def index():
             'horarios': horarios_info
         })
     
-    # Determinar template según dispositivo
-    if is_mobile_device():
-        template_name = 'index_mobile.html'
-        print("📱 Sirviendo índice móvil")
-    else:
-        template_name = 'index_desktop.html'
-        print("💻 Sirviendo índice escritorio")
+    template_name = dispositivo.plantilla('index')
     
     return render_template(template_name, 
                          categorias=categorias, 
                          establecimientos=establecimientos_data,
                          productos_destacados=productos_destacados)
 
-@app.route('/catalogo')
+@ruta('/catalogo')
+@solo_lectura
 def catalogo():
     establecimientos = Sucursal.query.all()
-    categorias = Categoria.query.all()
-    productos = MenuItem.query.all()
     
     # Añadir información de horarios a los establecimientos
     establecimientos_data = []
@@ -393,14 +342,8 @@ def catalogo():
         # Verificar si está abierto ahora
         abierta_ahora = HorarioSucursal.sucursal_abierta_ahora(establecimiento.id)
         
-        # Obtener horarios para mostrar
-        horarios_info = []
-        for horario in establecimiento.horarios:
-            dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-            if horario.cerrado:
-                horarios_info.append(f"{dias[horario.dia_semana]}: Cerrado")
-            else:
-                horarios_info.append(f"{dias[horario.dia_semana]}: {horario.hora_apertura.strftime('%H:%M')} - {horario.hora_cierre.strftime('%H:%M')}")
+        # Horarios para mostrar (del índice en memoria: sin una consulta por sucursal)
+        horarios_info = horarios.textos(establecimiento.id)
         
         establecimientos_data.append({
             'id': establecimiento.id,
@@ -412,85 +355,20 @@ def catalogo():
             'horarios': horarios_info
         })
 
-    # Procesar categorías con conteos
-    categorias_data = []
-    for cat in categorias:
-        productos_count = len([p for p in productos if p.categoria_id == cat.id])
-        categorias_data.append({
-            'id': cat.id,
-            'nombre': cat.nombre,
-            'icono': '🍽️',  # Icono por defecto
-            'productos_count': productos_count
-        })
+    # Menú cacheado por versión; la disponibilidad se recarga solo para sucursales que cambiaron
+    productos_data, categorias_data = catalogo_cache.catalogo()
     
-    productos_data = []
-    for p in productos:
-        sucursales_ids = [str(rel.sucursal_id) for rel in p.sucursales if rel.disponible]
-        
-        # Procesar opciones personalizadas
-        opciones = []
-        for op in p.opciones:
-            valores = []
-            for val in op.valores:
-                valores.append({
-                    "id": val.id,
-                    "nombre": val.texto,
-                    "precio_adicional": val.precio or 0
-                })
-            opciones.append({
-                "id": op.id,
-                "nombre": op.titulo,
-                "descripcion": "",  # No hay descripción en el modelo
-                "es_obligatoria": op.obligatorio,
-                "tipo": op.tipo,
-                "valores": valores
-            })
-        
-        # Generar imagen URL si existe
-        imagen_url = None
-        if p.imagen:
-            # Si ya es URL absoluta (http/https) la usamos tal cual
-            if isinstance(p.imagen, str) and (p.imagen.startswith('http://') or p.imagen.startswith('https://')):
-                imagen_url = p.imagen
-            else:
-                # p.imagen debe ser un filename limpio (normalizado). Si accidentalmente contiene '/static/uploads/', lo limpiamos.
-                filename = p.imagen.split('/static/uploads/')[-1]
-                filename = filename.replace('uploads/','')  # por si ya incluye prefijo
-                imagen_url = url_for('static', filename=f'uploads/{filename}')
-        
-        productos_data.append({
-            "id": p.id,
-            "nombre": p.nombre,
-            "imagen_url": imagen_url,
-            "descripcion": p.descripcion,
-            "precio": p.precio,  # Usar el precio real de la base de datos
-            "categoria_id": p.categoria_id,
-            "categoria_nombre": p.categoria.nombre if p.categoria else "Sin categoría",
-            "opciones": opciones,
-            "sucursales": sucursales_ids
-        })
-
-    print("PRODUCTOS:", productos_data)  # Para verificar que ya tienen precio
-    
-    # Determinar template según dispositivo
-    if is_mobile_device():
-        template_name = 'catalogo_mobile.html'
-        print("📱 Sirviendo catálogo móvil")
-    else:
-        template_name = 'catalogo_desktop.html'
-        print("💻 Sirviendo catálogo escritorio")
+    template_name = dispositivo.plantilla('catalogo')
     
     return render_template(template_name, productos=productos_data, sucursales=establecimientos_data, categorias=categorias_data)
 
-@app.route('/agregar_carrito', methods=['POST'])
+@ruta('/agregar_carrito', methods=['POST'])
 def agregar_carrito():
-    print("=== AGREGAR CARRITO DEBUG ===")
-    
     # Verificar si es un request JSON (móvil) o form data (escritorio)
     if request.is_json:
         data = request.get_json()
         es_desktop_json = request.headers.get('X-Desktop') == '1'
-        print("🛎️ Request JSON recibido (desktop_json=", es_desktop_json, "):", data)
+        volcado(log, 'agregar_carrito JSON (escritorio=%s)', data, es_desktop_json)
 
         producto_id = data.get('producto_id')
         cantidad = data.get('cantidad', 1)
@@ -533,7 +411,7 @@ def agregar_carrito():
                 'precio': float(producto.precio)
             })
             session['carrito'] = carrito
-            print("💻 Carrito actualizado (JSON escritorio)", carrito)
+            volcado(log, 'Carrito actualizado (JSON escritorio)', carrito)
             return jsonify({'success': True, 'carrito_cantidad': len(carrito)})
         else:
             # Móvil: no persiste en backend
@@ -547,24 +425,18 @@ def agregar_carrito():
     
     else:
         # Request form data desde escritorio
-        print("💻 Request form escritorio")
-        print("Form data:", dict(request.form))
-        print("Form data completo (con listas):", request.form.to_dict(flat=False))
+        volcado(log, 'agregar_carrito formulario', lambda: request.form.to_dict(flat=False))
         
         producto_id = request.form['producto_id']
         cantidad = int(request.form.get('cantidad', 1))
         
-        print(f"Producto ID: {producto_id}, Cantidad: {cantidad}")
-        
-        # Obtener el producto
-        producto = MenuItem.query.get(int(producto_id))
+        # Obtener el producto con sus opciones y valores (el for de abajo recorre ambos)
+        producto = db.session.get(MenuItem, int(producto_id), options=[
+            db.selectinload(MenuItem.opciones).selectinload(OpcionPersonalizada.valores)])
         if not producto:
-            print("❌ Producto no encontrado")
+            log.warning('agregar_carrito: producto %s no encontrado', producto_id)
             return redirect(url_for('catalogo'))
         
-        print(f"✅ Producto encontrado: {producto.nombre}")
-        print(f"📋 Opciones del producto: {len(producto.opciones)} opciones")
-        
         # Procesar opciones personalizadas para escritorio
         opciones_seleccionadas = []
         precio_extra_total = 0
@@ -573,23 +445,16 @@ def agregar_carrito():
         for opcion in producto.opciones:
             nombre_campo = f"opcion_{opcion.id}"
             nombre_campo_checkbox = f"opcion_{opcion.id}[]"
-            print(f"🔍 Buscando campo: {nombre_campo} (tipo: {opcion.tipo})")
-            
             if opcion.tipo == "checkbox":
-                print(f"🔍 También buscando: {nombre_campo_checkbox} para checkboxes")
                 valores_seleccionados = request.form.getlist(nombre_campo_checkbox)
                 if not valores_seleccionados:
                     # Fallback: buscar sin []
                     valores_seleccionados = request.form.getlist(nombre_campo)
-                    print(f"📝 Fallback - valores sin []: {valores_seleccionados}")
             else:
                 valores_seleccionados = [request.form.get(nombre_campo)]
             
-            print(f"📝 Valores encontrados: {valores_seleccionados}")
-            
             for valor_seleccionado in valores_seleccionados:
                 if valor_seleccionado:
-                    print(f"✅ Procesando valor: {valor_seleccionado}")
                     # Buscar el valor de opción correspondiente
                     for valor_opcion in opcion.valores:
                         # Comparar con el ID del valor
@@ -602,12 +467,8 @@ def agregar_carrito():
                                 'valor_precio': valor_opcion.precio or 0
                             })
                             precio_extra_total += (valor_opcion.precio or 0)
-                            print(f"✅ Opción agregada: {valor_opcion.texto} (+${valor_opcion.precio or 0})")
                             break
         
-        print(f"💰 Precio extra total: ${precio_extra_total}")
-        print(f"📦 Opciones seleccionadas: {len(opciones_seleccionadas)}")
-        
         # Procesar extras (sistema anterior)
         extras = request.form.getlist('extras')
         
@@ -624,9 +485,7 @@ def agregar_carrito():
         carrito.append(item_carrito)
         session['carrito'] = carrito
         
-        print(f"🛒 Item agregado al carrito: {item_carrito}")
-        print(f"🛒 Total items en carrito: {len(carrito)}")
-        print("=== FIN DEBUG ===")
+        volcado(log, 'Item agregado al carrito (%d items)', item_carrito, len(carrito))
         
         # Guardar información del producto agregado para el toast
         session['producto_agregado'] = {
@@ -638,7 +497,7 @@ def agregar_carrito():
         
         return redirect(url_for('catalogo', agregado=1))
 
-@app.route('/get_producto_agregado')
+@ruta('/get_producto_agregado')
 def get_producto_agregado():
     """Obtener información del último producto agregado para el toast"""
     producto_info = session.get('producto_agregado', {})
@@ -649,11 +508,11 @@ def get_producto_agregado():
     
     return jsonify(producto_info)
 
-@app.route('/get_carrito_estado')
+@ruta('/get_carrito_estado')
 def get_carrito_estado():
     """Obtener el estado actual del carrito (cantidad y total) para actualizar el header"""
     carrito = session.get('carrito', [])
-    print('🔎 DEBUG get_carrito_estado - contenido carrito:', carrito)
+    volcado(log, 'get_carrito_estado', carrito)
     
     total_cantidad = 0
     total_precio = 0.0
@@ -693,9 +552,23 @@ def get_carrito_estado():
         'total_formateado': f'${total_precio:.2f}'
     })
 
-@app.route('/carrito')
+def _por_id(modelo, ids):
+    """{id: objeto} en una sola consulta, en lugar de un .get() por renglón del carrito (N+1)."""
+    validos = set()
+    for i in ids:
+        try:
+            validos.add(int(i))
+        except (TypeError, ValueError):
+            pass
+    if not validos:
+        return {}
+    return {o.id: o for o in modelo.query.filter(modelo.id.in_(validos))}
+
+@ruta('/carrito')
 def carrito():
     carrito = session.get('carrito', [])
+    menu = _por_id(MenuItem, (item.get('producto_id') for item in carrito))
+    extras = _por_id(Extra, (eid for item in carrito for eid in item.get('extras', [])))
     productos = []
     total = 0
     indices_invalidos = []
@@ -705,12 +578,12 @@ def carrito():
         except Exception:
             indices_invalidos.append(idx)
             continue
-        producto = MenuItem.query.get(prod_id)
+        producto = menu.get(prod_id)
         if not producto:
             # Registrar para limpieza; probablemente el producto fue eliminado de la base de datos
             indices_invalidos.append(idx)
             continue
-        extras_objs = [Extra.query.get(int(eid)) for eid in item.get('extras', [])]
+        extras_objs = [extras.get(int(eid)) for eid in item.get('extras', [])]
         # Calcular precio base (precio vigente en DB * cantidad guardada)
         try:
             cantidad = int(item.get('cantidad', 1))
@@ -750,23 +623,17 @@ def carrito():
         if not productos:
             flash('Algunos productos ya no están disponibles y fueron removidos del carrito.', 'warning')
     
-    # Determinar template según dispositivo
-    if is_mobile_device():
-        template_name = 'carrito_mobile.html'
-        print("📱 Sirviendo carrito móvil")
-    else:
-        template_name = 'carrito_desktop.html'
-        print("💻 Sirviendo carrito escritorio")
+    template_name = dispositivo.plantilla('carrito')
     
     return render_template(template_name, productos=productos, total=total)
 
-@app.route('/limpiar_carrito', methods=['POST'])
+@ruta('/limpiar_carrito', methods=['POST'])
 def limpiar_carrito():
     """Limpiar todo el carrito"""
     session['carrito'] = []
     return redirect(url_for('carrito'))
 
-@app.route('/sincronizar_carrito', methods=['POST'])
+@ruta('/sincronizar_carrito', methods=['POST'])
 def sincronizar_carrito():
     """Sincroniza el carrito enviado desde móvil (localStorage) al backend para reutilizar vistas server-side."""
     try:
@@ -808,13 +675,13 @@ def sincronizar_carrito():
             })
         session['carrito'] = carrito_convertido
         session.modified = True
-        print('🔄 Sincronización carrito móvil -> sesión:', carrito_convertido)
+        volcado(log, 'Carrito móvil sincronizado a la sesión', carrito_convertido)
         return jsonify({'success': True, 'items': len(carrito_convertido)})
     except Exception as e:
-        print('❌ Error sincronizando carrito móvil:', e)
+        log.warning('Error sincronizando carrito móvil: %s', e)
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@app.route('/cambiar_cantidad_item', methods=['POST'])
+@ruta('/cambiar_cantidad_item', methods=['POST'])
 def cambiar_cantidad_item():
     """Cambiar cantidad de un item específico en el carrito"""
     indice = int(request.form.get('indice'))
@@ -829,7 +696,7 @@ def cambiar_cantidad_item():
     
     return redirect(url_for('carrito'))
 
-@app.route('/eliminar_item', methods=['POST'])
+@ruta('/eliminar_item', methods=['POST'])
 def eliminar_item():
     """Eliminar un item específico del carrito"""
     indice = int(request.form.get('indice'))
@@ -842,10 +709,8 @@ def eliminar_item():
     
     return redirect(url_for('carrito'))
 
-@app.route('/checkout', methods=['GET', 'POST'])
+@ruta('/checkout', methods=['GET', 'POST'])
 def checkout():
-    # Log de versión para confirmar que esta versión del código está activa
-    print(f"[CHECKOUT] Versión código: {CODE_VERSION}")
     if request.method == 'POST':
         # Verificar si es una confirmación de pedido (tiene datos del formulario)
         if 'nombre' in request.form:
@@ -918,8 +783,9 @@ def checkout():
                 # Viene del carrito de localStorage con JSON
                 try:
                     carrito_data = json.loads(request.form['carrito_data'])
+                    menu = _por_id(MenuItem, (item['id'] for item in carrito_data))
                     for item in carrito_data:
-                        producto = MenuItem.query.get(int(item['id']))
+                        producto = menu.get(int(item['id']))
                         if producto:
                             cantidad = int(item.get('cantidad', 1))
                             opciones_raw = item.get('opciones_personalizadas') or item.get('opciones') or []
@@ -971,13 +837,14 @@ def checkout():
             # Fallback adicional: reconstruir desde carrito de sesión si sigue vacío
             if not productos_detallados:
                 carrito_session = session.get('carrito', [])
+                menu = _por_id(MenuItem, (item.get('producto_id') for item in carrito_session))
                 reconstruidos = []
                 for item in carrito_session:
                     try:
                         prod_id = int(item.get('producto_id') or 0)
                     except (TypeError, ValueError):
                         continue
-                    prod = MenuItem.query.get(prod_id)
+                    prod = menu.get(prod_id)
                     if not prod:
                         continue
                     cantidad = int(item.get('cantidad', 1) or 1)
@@ -1019,42 +886,46 @@ def checkout():
                     })
                 if reconstruidos:
                     productos_detallados = reconstruidos
-                    print('[CHECKOUT] Fallback productos desde sesión aplicado:', productos_detallados)
+                    log.info('Checkout: productos reconstruidos desde la sesión (%d)', len(productos_detallados))
                 else:
-                    print('[CHECKOUT] Advertencia: productos_detallados vacío; se guardará lista vacía.')
+                    log.warning('Checkout sin productos detallados; se guarda lista vacía')
             
-            # Generar número de pedido único
-            numero_pedido = generar_numero_pedido()
+            # Escritura corta por el camino único (perfil_sqlite.escritura): número único, INSERT y resúmenes de ventas
+            with escritura():
+                # Generar número de pedido único
+                numero_pedido = generar_numero_pedido()
             
-            pedido = PedidoCliente(
-                numero_pedido=numero_pedido,
-                nombre=nombre,
-                telefono=telefono,
-                direccion=direccion,
-                calle=calle,
-                numero=numero,
-                colonia=colonia,
-                entre_calles=entre_calles,
-                referencia=referencia,
-                sucursal_id=sucursal_id,
-                productos=json.dumps(productos_detallados),  # Guardar como JSON detallado
-                total=total,
-                fecha=datetime.now(),
-                estado='Pendiente',
-                forma_pago=forma_pago,
-                cambio_para=cambio_para_float,
-                comprobante_transferencia=confirmo_transferencia
-            )
-            db.session.add(pedido)
-            db.session.commit()
-            print('[CHECKOUT] Pedido guardado con productos JSON len=', len(productos_detallados))
+                pedido = PedidoCliente(
+                    numero_pedido=numero_pedido,
+                    nombre=nombre,
+                    telefono=telefono,
+                    direccion=direccion,
+                    calle=calle,
+                    numero=numero,
+                    colonia=colonia,
+                    entre_calles=entre_calles,
+                    referencia=referencia,
+                    sucursal_id=sucursal_id,
+                    productos=json.dumps(productos_detallados),  # Guardar como JSON detallado
+                    total=total,
+                    fecha=datetime.now(),
+                    estado='Pendiente',
+                    forma_pago=forma_pago,
+                    cambio_para=cambio_para_float,
+                    comprobante_transferencia=confirmo_transferencia
+                )
+                db.session.add(pedido)
+                db.session.flush()
+                # En la misma transacción: el pedido y sus resúmenes se guardan juntos o ninguno
+                resumen_ventas.registrar_pedido(pedido)
+            PEDIDOS_CREADOS.inc(sucursal=sucursal_id)
+            log.info('Pedido %s guardado (sucursal %s, %d productos)', numero_pedido, sucursal_id, len(productos_detallados))
             
             # Enviar notificación de Telegram al admin
             try:
                 enviar_notificacion_pedido(pedido)
-                print(f"✅ Notificación enviada para pedido {numero_pedido}")
             except Exception as e:
-                print(f"❌ Error al enviar notificación de Telegram: {e}")
+                log.exception('Error al enviar notificación de Telegram del pedido %s: %s', numero_pedido, e)
                 # No fallar el pedido si Telegram falla
             
             # Guardar el número de pedido en la sesión para mostrarlo en la confirmación
@@ -1072,8 +943,7 @@ def checkout():
             carrito_data = json.loads(request.form['carrito_data'])
             sucursal_id = request.form['sucursal_id']
             
-            # Debug: Imprimir estructura de datos
-            print("DEBUG - Carrito data:", carrito_data)
+            volcado(log, 'Checkout con carrito_data', carrito_data)
             
             # Procesar el carrito del localStorage
             productos = []
@@ -1084,12 +954,13 @@ def checkout():
             #  - {'valor_texto': 'Grande', 'precio': 15}
             #  - {'nombre': 'Extra queso', 'precio_adicional': 10}
             # Siempre usaremos 'texto' interno y recalcularemos el costo con precio de DB del producto base.
+            menu = _por_id(MenuItem, (item.get('id') or item.get('producto_id') for item in carrito_data))
             for item in carrito_data:
                 try:
                     prod_id = int(item.get('id') or item.get('producto_id'))
                 except (TypeError, ValueError):
                     continue
-                producto = MenuItem.query.get(prod_id)
+                producto = menu.get(prod_id)
                 if not producto:
                     continue
                 cantidad_item = int(item.get('cantidad', 1))
@@ -1098,7 +969,6 @@ def checkout():
                 opciones_costo = 0.0
                 opciones_info = []
                 opciones_raw = item.get('opciones_personalizadas') or item.get('opciones') or []
-                print(f"DEBUG - Opciones para {producto.nombre} (normalizadas):", opciones_raw)
                 for opcion in opciones_raw:
                     # Extraer texto y precio unitario tolerando múltiples esquemas
                     texto = opcion.get('texto') or opcion.get('valor_texto') or opcion.get('nombre') or 'Opción'
@@ -1115,7 +985,6 @@ def checkout():
                     else:
                         opciones_info.append(texto)
                 subtotal = subtotal_base + opciones_costo
-                print(f"DEBUG - {producto.nombre}: base=${producto.precio:.2f} x{cantidad_item}, opciones=${opciones_costo:.2f}, subtotal=${subtotal:.2f}")
                 productos.append({
                     'producto': producto,
                     'cantidad': cantidad_item,
@@ -1124,7 +993,7 @@ def checkout():
                 })
                 total += subtotal
             
-            print(f"DEBUG - Total calculado: ${total:.2f}")
+            log.debug('Checkout: total calculado %.2f', total)
             
             sucursales = Sucursal.query.all()
             # Añadir información de horarios a las sucursales
@@ -1133,14 +1002,8 @@ def checkout():
                 # Verificar si está abierta ahora
                 abierta_ahora = HorarioSucursal.sucursal_abierta_ahora(sucursal.id)
                 
-                # Obtener horarios para mostrar
-                horarios_info = []
-                for horario in sucursal.horarios:
-                    dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-                    if horario.cerrado:
-                        horarios_info.append(f"{dias[horario.dia_semana]}: Cerrado")
-                    else:
-                        horarios_info.append(f"{dias[horario.dia_semana]}: {horario.hora_apertura.strftime('%H:%M')} - {horario.hora_cierre.strftime('%H:%M')}")
+                # Horarios para mostrar (del índice en memoria: sin una consulta por sucursal)
+                horarios_info = horarios.textos(sucursal.id)
                 
                 sucursales_data.append({
                     'id': sucursal.id,
@@ -1154,13 +1017,7 @@ def checkout():
             
             sucursal_actual = Sucursal.query.get(int(sucursal_id)) if sucursal_id else None
             
-            # Determinar template según dispositivo
-            if is_mobile_device():
-                template_name = 'checkout_mobile.html'
-                print("📱 Sirviendo checkout móvil")
-            else:
-                template_name = 'checkout_desktop.html'
-                print("💻 Sirviendo checkout escritorio")
+            template_name = dispositivo.plantilla('checkout')
             
             return render_template(template_name, productos=productos, total=total, sucursales=sucursales_data, sucursal_actual=sucursal_actual)
     
@@ -1177,14 +1034,8 @@ def checkout():
         # Verificar si está abierta ahora
         abierta_ahora = HorarioSucursal.sucursal_abierta_ahora(sucursal.id)
         
-        # Obtener horarios para mostrar
-        horarios_info = []
-        for horario in sucursal.horarios:
-            dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-            if horario.cerrado:
-                horarios_info.append(f"{dias[horario.dia_semana]}: Cerrado")
-            else:
-                horarios_info.append(f"{dias[horario.dia_semana]}: {horario.hora_apertura.strftime('%H:%M')} - {horario.hora_cierre.strftime('%H:%M')}")
+        # Horarios para mostrar (del índice en memoria: sin una consulta por sucursal)
+        horarios_info = horarios.textos(sucursal.id)
         
         sucursales_data.append({
             'id': sucursal.id,
@@ -1196,13 +1047,15 @@ def checkout():
             'horarios': horarios_info
         })
     
+    menu = _por_id(MenuItem, (item['producto_id'] for item in carrito))
+    extras = _por_id(Extra, (eid for item in carrito for eid in item.get('extras', [])))
     productos = []
     total = 0
     for item in carrito:
-        producto = MenuItem.query.get(int(item['producto_id']))
+        producto = menu.get(int(item['producto_id']))
         if not producto:
             continue
-        extras_objs = [Extra.query.get(int(eid)) for eid in item.get('extras', [])]
+        extras_objs = [extras.get(int(eid)) for eid in item.get('extras', [])]
         cantidad = int(item.get('cantidad', 1))
         precio_base = float(producto.precio) * cantidad
         precio_extras = sum([e.precio for e in extras_objs if e]) * 1  # extras ya son por unidad histórica
@@ -1233,32 +1086,20 @@ def checkout():
         })
         total += subtotal
     
-    # Determinar template según dispositivo
-    if is_mobile_device():
-        template_name = 'checkout_mobile.html'
-        print("📱 Sirviendo checkout móvil")
-    else:
-        template_name = 'checkout_desktop.html'
-        print("💻 Sirviendo checkout escritorio")
+    template_name = dispositivo.plantilla('checkout')
     
     return render_template(template_name, productos=productos, total=total, sucursales=sucursales_data)
 
-@app.route('/confirmacion')
+@ruta('/confirmacion')
 def confirmacion():
     numero_pedido = session.get('ultimo_numero_pedido')
     sucursal_confirmada = session.pop('ultima_sucursal_pedido', None)
     
-    # Detectar dispositivo y usar template apropiado
-    if is_mobile_device():
-        template_name = 'confirmacion_mobile.html'
-        print("📱 Sirviendo confirmación móvil")
-    else:
-        template_name = 'confirmacion_desktop.html'
-        print("💻 Sirviendo confirmación escritorio")
+    template_name = dispositivo.plantilla('confirmacion')
     
     return render_template(template_name, numero_pedido=numero_pedido, sucursal_confirmada=sucursal_confirmada)
 
-@app.route('/consultar-pedido', methods=['GET', 'POST'])
+@ruta('/consultar-pedido', methods=['GET', 'POST'])
 def consultar_pedido():
     pedido = None
     error = None
@@ -1275,18 +1116,13 @@ def consultar_pedido():
         else:
             error = "Por favor, ingresa el número de pedido."
     
-    # Detectar dispositivo y usar template apropiado
-    if is_mobile_device():
-        template_name = 'consultar_pedido_mobile.html'
-        print("📱 Sirviendo consultar pedido móvil")
-    else:
-        template_name = 'consultar_pedido_desktop.html'
-        print("💻 Sirviendo consultar pedido escritorio")
+    template_name = dispositivo.plantilla('consultar_pedido')
     
     return render_template(template_name, pedido=pedido, error=error)
 
 # API sucursales (para selector móvil)
-@app.route('/api/sucursales')
+@ruta('/api/sucursales')
+@solo_lectura
 def api_sucursales():
     sucursales = Sucursal.query.filter_by(activa=True).all()
     data = []
@@ -1304,7 +1140,7 @@ def api_sucursales():
         })
     return jsonify({'sucursales': data})
 
-@app.route('/api/pedido_estado')
+@ruta('/api/pedido_estado')
 def api_pedido_estado():
     """Devuelve estado actual de un pedido por numero ?numero=ABC12345"""
     numero = request.args.get('numero','').strip().upper()
@@ -1323,7 +1159,7 @@ def api_pedido_estado():
         'timestamp': datetime.utcnow().isoformat() + 'Z'
     })
 
-@app.route('/sse/pedido/<numero>')
+@ruta('/sse/pedido/<numero>')
 def sse_pedido(numero):
     numero = (numero or '').upper()
     # Cabeceras para SSE
@@ -1335,7 +1171,29 @@ def sse_pedido(numero):
     }
     return Response(sse_stream(numero), headers=headers)
 
-@app.route('/health')
+@ruta('/catalogo/disponibilidad')
+@solo_lectura
+def catalogo_disponibilidad():
+    """Productos disponibles por sucursal (para refrescar un catálogo abierto sin recargar la página).
+
+    Los catálogos abiertos lo consultan cada CATALOGO_REFRESCO_SEG con If-None-Match. Mientras no
+    cambie la versión de la partición la respuesta es un 304 sin cuerpo: no se queda ningún worker
+    ocupado como con una conexión abierta.
+    """
+    _, versiones = catalogo_cache.leer_versiones()
+    sucursal = request.args.get('sucursal', type=int)
+    etag = catalogo_cache.etag_disponibilidad(versiones, sucursal)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+    disp = catalogo_cache.disponibilidad(versiones)
+    if sucursal is not None:
+        disp = {sucursal: disp.get(sucursal, frozenset())}
+    respuesta = jsonify({str(sid): sorted(ids) for sid, ids in disp.items()})
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+@ruta('/health')
 def health():
     """Healthcheck básico y verificación de DB."""
     from sqlalchemy import text as _text
@@ -1348,11 +1206,232 @@ def health():
         status['database'] = f'down: {e.__class__.__name__}'
     return jsonify(status), (200 if status['ok'] else 500)
 
+@ruta('/metrics')
+def metrics():
+    """Métricas de todos los workers en formato de texto de Prometheus."""
+    if not metricas.autorizado(request):
+        return Response('No autorizado\n', status=401, mimetype='text/plain')
+    return Response(metricas.texto_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@ruta('/health/metricas')
+def health_metricas():
+    """Métricas de este worker (pool, consultas por endpoint y sentencias más lentas) en JSON."""
+    if not metricas.autorizado(request):
+        return jsonify({'ok': False, 'error': 'No autorizado'}), 401
+    datos = metricas.instantanea()
+    datos['db_sentencias_lentas'] = metricas_db.lentas()
+    return jsonify(datos)
+
+@cli.command('perfil-firma')
+@click.option('--minutos', default=15, show_default=True, help='Vigencia del header')
+def perfil_firma(minutos):
+    """Imprime un valor de X-Perfil para perfilar requests sin sesión de admin (ver perfilador.py)."""
+    click.echo(perfilador.firmar(int(time.time()) + minutos * 60, current_app.config['SECRET_KEY']))
+
+@cli.command('migrar')
+def migrar():
+    """Aplica las migraciones de esquema pendientes (paso de release, antes de levantar gunicorn)."""
+    aplicadas = migraciones.migrar()
+    for nombre in aplicadas:
+        click.echo(f'[MIGRACION] Aplicada {nombre}')
+    click.echo(f'[MIGRACION] Esquema en versión {migraciones.VERSION_ACTUAL}'
+               + ('' if aplicadas else ' (sin cambios)'))
+
+@cli.command('release')
+def release():
+    """Tareas de despliegue (una vez, antes de levantar gunicorn): migraciones, admin inicial, imágenes y webhook."""
+    for nombre in migraciones.migrar():
+        click.echo(f'[MIGRACION] Aplicada {nombre}')
+    ensure_seed_admin()
+    cambios = normalizar_imagenes()
+    if cambios:
+        click.echo(f'[NORMALIZACION] Imágenes ajustadas: {cambios}')
+    registrar_webhook_auto()
+
+@cli.command('telegram-webhook')
+def telegram_webhook_cli():
+    """Registra el webhook de Telegram con la URL pública configurada."""
+    registrar_webhook_auto()
+
+@cli.command('reconstruir-resumenes')
+@click.option('--desde', help='Fecha inicial YYYY-MM-DD (por defecto, el primer pedido)')
+@click.option('--hasta', help='Fecha final YYYY-MM-DD inclusive (por defecto, hoy)')
+def reconstruir_resumenes(desde, hasta):
+    """Recalcula las tablas de resumen de ventas para un rango de fechas."""
+    from datetime import date
+    from sqlalchemy import func
+    if desde:
+        inicio = date.fromisoformat(desde)
+    else:
+        primera = db.session.query(func.min(PedidoCliente.fecha)).scalar()
+        inicio = primera.date() if primera else date.today()
+    fin = date.fromisoformat(hasta) if hasta else date.today()
+    n = resumen_ventas.reconstruir(inicio, fin)
+    click.echo(f'[RESUMEN] {n} pedidos resumidos entre {inicio} y {fin}')
+
+@cli.command('menu-exportar')
+@click.argument('archivo', type=click.File('w', encoding='utf-8'), default='-')
+def menu_exportar(archivo):
+    """Escribe el menú completo en JSON (por defecto a stdout)."""
+    import menu_masivo
+    json.dump(menu_masivo.exportar_menu(), archivo, ensure_ascii=False, indent=2)
+
+@cli.command('menu-importar')
+@click.argument('archivo', type=click.File('r', encoding='utf-8'))
+@click.option('--simular', is_flag=True, help='Solo mostrar los cambios, sin guardar')
+def menu_importar(archivo, simular):
+    """Carga masiva del menú desde un JSON exportado."""
+    import menu_masivo
+    try:
+        resumen = menu_masivo.importar_menu(json.load(archivo), simular=simular)
+    except menu_masivo.ErrorImportacion as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(resumen, ensure_ascii=False, indent=2))
+
 # ...importar modelos y rutas...
 
+# --- Fábrica de la aplicación -------------------------------------------------------------
+
+def create_app(config=None):
+    """Crea la app Flask. ``config`` sobreescribe valores (p. ej. SQLALCHEMY_DATABASE_URI en pruebas).
+
+    No hace red ni recorre tablas: solo verifica la versión del esquema (migraciones.py).
+    """
+    app = Flask(__name__)
+
+    # Secret key configurable vía entorno
+    app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-change-me')
+    app.config['SQLALCHEMY_DATABASE_URI'] = _database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_pre_ping': True,      # Detecta conexiones muertas antes de usarlas
+        'pool_recycle': 300,        # Recicla conexiones cada 5 min para evitar cortes por inactividad
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
+        'poolclass': metricas_db.PoolMedido,  # mide la espera de checkout (ver /health/metricas)
+    }
+    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
+    app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB max
+    # gunicorn.conf.py lo pone en 0: con --preload los hilos se arrancan en cada worker (post_fork)
+    app.config['INICIAR_HILOS'] = os.getenv('APP_INICIAR_HILOS', '1') == '1'
+    # WAL, busy_timeout y escrituras con BEGIN IMMEDIATE cuando la base es un archivo SQLite
+    app.config['SQLITE_PERFIL'] = os.getenv('SQLITE_PERFIL', '1') == '1'
+    # Header X-DB-Sentencias en cada respuesta (benchmarks, ver bench/rutas.py)
+    app.config['DB_SENTENCIAS_HEADER'] = os.getenv('DB_SENTENCIAS_HEADER', '0') == '1'
+    # Cada cuánto un catálogo abierto pregunta si cambió la disponibilidad (0 = nunca)
+    app.config['CATALOGO_REFRESCO_SEG'] = int(os.getenv('CATALOGO_REFRESCO_SEG', '30'))
+    # Límite de sentencias SQL por endpoint: 0, aviso (warning en el log) o error (pruebas)
+    app.config['SQL_PRESUPUESTO'] = os.getenv('SQL_PRESUPUESTO', '0')
+    replica.configurar(app, _replica_uris())
+    if config:
+        app.config.update(config)
+
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    app.add_template_filter(fromjson_filter, 'fromjson')
+
+    registro.init_app(app)
+    perfilador.init_app(app)
+    db.init_app(app)
+    perfil_sqlite.init_app(app)
+    metricas_db.init_app(app)
+    presupuesto_sql.init_app(app)
+    metricas.init_app(app)
+    app.register_blueprint(admin_bp)
+    for regla, vista, opciones in _rutas:
+        app.add_url_rule(regla, view_func=vista, **opciones)
+    for comando in cli.commands.values():
+        app.cli.add_command(comando)
+    app.before_request(_medir_primer_request)
+    dispositivo.init_app(app)
+    replica.init_app(app)
+
+    # Esquema: las migraciones corren una vez en el release (flask release); aquí solo se verifica la versión
+    migraciones.verificar(app)
+
+    if app.config['INICIAR_HILOS']:
+        iniciar_hilos(app)
+    # Tiempo de arranque: desde el import del módulo hasta la app lista (ver test_arranque.py)
+    app.config['ARRANQUE_IMPORT_SEG'] = round(time.perf_counter() - T0_IMPORT, 3)
+    return app
+
+def iniciar_hilos(app):
+    """Hilos de fondo del proceso (no sobreviven a un fork: con --preload se llama en post_fork)."""
+    # Iniciar polling en desarrollo (solo si no hay variable que indique producción)
+    try:
+        # En producción (Render) se recomienda usar webhook; desactivar polling por defecto (valor '0').
+        if os.environ.get('TELEGRAM_USE_POLLING', '0') == '1':
+            # Cada worker arranca el hilo; el lease en DB garantiza que solo uno hace getUpdates
+            if TELEGRAM_TOKEN:
+                iniciar_polling_background(app)
+                log.info('Polling de Telegram iniciado (long poll con lease en DB)')
+            else:
+                log.warning('Polling de Telegram no iniciado: falta TELEGRAM_TOKEN')
+    except Exception as _e:
+        log.exception('No se pudo iniciar el polling de Telegram: %s', _e)
+    # Con METRICAS_DIR (gunicorn) cada worker vuelca sus métricas para que /metrics sume todos
+    metricas.iniciar_volcado()
+
+def precalentar(app):
+    """Estado inmutable listo antes del fork (gunicorn --preload): los workers lo comparten copy-on-write.
+
+    Compila todos los templates, arma el snapshot del catálogo y el índice de horarios, cierra las
+    conexiones del master (cada worker abre las suyas) y congela el GC para que recorrer estos
+    objetos no ensucie las páginas compartidas.
+    """
+    import gc
+    t0 = time.perf_counter()
+    for nombre in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(nombre)
+    with app.test_request_context('/'):
+        try:
+            catalogo_cache.catalogo()
+            horarios.indice()
+        except Exception as e:
+            # Base no disponible todavía: cada worker llenará sus cachés al primer request
+            log.warning('Precalentado parcial: %s', e)
+        finally:
+            db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    gc.collect()
+    gc.freeze()
+    log.info('Precalentado en %.3fs', time.perf_counter() - t0)
+
+def al_iniciar_worker(app):
+    """post_fork: pools propios del worker (sin sockets heredados) y sus hilos de fondo."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    metricas.reiniciar()
+    iniciar_hilos(app)
+
+_primer_request = []
+
+def _medir_primer_request():
+    if not _primer_request:
+        _primer_request.append(round(time.perf_counter() - T0_IMPORT, 3))
+        current_app.config['ARRANQUE_PRIMER_REQUEST_SEG'] = _primer_request[0]
+        log.info('App lista a los %ss, primer request a los %ss', current_app.config['ARRANQUE_IMPORT_SEG'], _primer_request[0])
+
+_app = None
+_app_lock = threading.Lock()
+
+def __getattr__(nombre):
+    # `app` se crea al primer acceso (gunicorn app:app, from app import app) y no al importar el módulo
+    global _app
+    if nombre == 'app':
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 if __name__ == '__main__':
     # Nota: Render usará gunicorn, este bloque es solo para desarrollo local
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        migraciones.migrar()
+        ensure_seed_admin()
+        normalizar_imagenes()
     debug_mode = os.getenv('FLASK_DEBUG', '1') == '1'
     app.run(debug=debug_mode, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,4 @@
+"""Herramientas de carga y medición (no se cargan en producción).
+
+Ejecutar desde la raíz del repo, p. ej. ``python -m bench.telegram_carga``.
+"""
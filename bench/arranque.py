@@ -0,0 +1,169 @@
+"""Arranque y memoria por worker de gunicorn, con y sin --preload.
+
+Crea una base SQLite temporal con un menú de prueba y levanta ``gunicorn app:app -c gunicorn.conf.py``
+en cada modo. Mide cuánto tarda hasta que todos los workers existen y /health responde. Después
+pide /catalogo varias veces (cada worker llena sus cachés) y lee /proc/<pid>/smaps_rollup de cada
+worker:
+
+* RSS: memoria residente (cuenta las páginas compartidas completas en cada worker).
+* PSS: páginas compartidas repartidas entre quienes las usan; la suma es la memoria real.
+* USS: privada del worker (lo que se libera si muere).
+
+Solo Linux. Ejemplo::
+
+    python -m bench.arranque --workers 3 --productos 300 --json arranque.json
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def sembrar(database_url, n_productos, n_sucursales=5, entorno=None):
+    """Menú con opciones, disponibilidad y horarios (en un proceso aparte para no heredar nada)."""
+    codigo = f'''
+from datetime import time as dtime
+from app import create_app
+import migraciones
+from extensions import db
+from models import Sucursal, HorarioSucursal, Categoria, MenuItem, MenuItemSucursal, OpcionPersonalizada, ValorOpcion
+app = create_app()
+with app.app_context():
+    migraciones.migrar()
+    sucursales = [Sucursal(nombre=f'Sucursal {{i}}', direccion='-', telefono='0', activa=True) for i in range({n_sucursales})]
+    categorias = [Categoria(nombre=f'Categoría {{i}}') for i in range(8)]
+    db.session.add_all(sucursales + categorias)
+    db.session.flush()
+    for s in sucursales:
+        for dia in range(7):
+            db.session.add(HorarioSucursal(sucursal_id=s.id, dia_semana=dia, cerrado=False,
+                                           hora_apertura=dtime(9, 0), hora_cierre=dtime(22, 0)))
+    for i in range({n_productos}):
+        p = MenuItem(nombre=f'Producto {{i}}', descripcion='Descripción de prueba ' * 3, precio=100 + i % 50,
+                     categoria_id=categorias[i % 8].id, imagen=f'producto_{{i}}.jpg')
+        db.session.add(p)
+        db.session.flush()
+        for s in sucursales:
+            db.session.add(MenuItemSucursal(menuitem_id=p.id, sucursal_id=s.id, disponible=True))
+        op = OpcionPersonalizada(menuitem_id=p.id, titulo='Tamaño', tipo='radio', obligatorio=True)
+        db.session.add(op)
+        db.session.flush()
+        for texto, precio in (('Chico', 0), ('Mediano', 20), ('Grande', 40)):
+            db.session.add(ValorOpcion(opcion_id=op.id, texto=texto, precio=precio))
+    db.session.commit()
+'''
+    env = dict(os.environ, DATABASE_URL=database_url, TELEGRAM_AUTO_WEBHOOK='0', **(entorno or {}))
+    subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=env, check=True, capture_output=True)
+
+
+def hijos(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(x) for x in f.read().split()]
+    except OSError:
+        return []
+
+
+def memoria_kb(pid):
+    campos = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) >= 3 and partes[-1] == 'kB':
+                campos[partes[0].rstrip(':')] = int(partes[1])
+    return {'rss': campos.get('Rss', 0), 'pss': campos.get('Pss', 0),
+            'uss': campos.get('Private_Clean', 0) + campos.get('Private_Dirty', 0)}
+
+
+def get(url, timeout=2):
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        r.read()
+        return r.status
+
+
+def medir(modo, database_url, workers, peticiones):
+    puerto = puerto_libre()
+    env = dict(os.environ, DATABASE_URL=database_url, PORT=str(puerto), WEB_CONCURRENCY=str(workers),
+               GUNICORN_PRELOAD='1' if modo == 'preload' else '0', TELEGRAM_AUTO_WEBHOOK='0')
+    t0 = time.monotonic()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py'],
+                            cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{puerto}'
+    try:
+        arranque = None
+        while time.monotonic() - t0 < 60:
+            if len(hijos(proc.pid)) >= workers:
+                try:
+                    if get(f'{base}/health') == 200:
+                        arranque = time.monotonic() - t0
+                        break
+                except OSError:
+                    pass
+            time.sleep(0.02)
+        if arranque is None:
+            raise RuntimeError(f'gunicorn ({modo}) no respondió a tiempo')
+        # Cada worker debe atender requests para construir (o no) sus cachés
+        t1 = time.monotonic()
+        get(f'{base}/catalogo', timeout=30)
+        primer_catalogo = time.monotonic() - t1
+        for _ in range(peticiones - 1):
+            get(f'{base}/catalogo', timeout=30)
+        listo = time.monotonic() - t0
+        por_worker = [memoria_kb(pid) for pid in hijos(proc.pid)]
+        master = memoria_kb(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    prom = lambda k: round(sum(w[k] for w in por_worker) / len(por_worker) / 1024, 1)
+    return {
+        'modo': modo,
+        'arranque_seg': round(arranque, 3),
+        'primer_catalogo_ms': round(primer_catalogo * 1000, 1),
+        'arranque_mas_peticiones_seg': round(listo, 3),
+        'worker_rss_mb': prom('rss'),
+        'worker_pss_mb': prom('pss'),
+        'worker_uss_mb': prom('uss'),
+        'total_pss_mb': round((sum(w['pss'] for w in por_worker) + master['pss']) / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Arranque y memoria de gunicorn con/sin --preload')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--productos', type=int, default=300)
+    parser.add_argument('--peticiones', type=int, default=30, help='GET /catalogo tras el arranque')
+    parser.add_argument('--modos', default='sin-preload,preload')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args(argv)
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_arranque_'), 'bench.db')
+    sembrar(database_url, args.productos)
+    resultados = [medir(m.strip(), database_url, args.workers, args.peticiones)
+                  for m in args.modos.split(',') if m.strip()]
+    for r in resultados:
+        print(f"{r['modo']:<12} arranque={r['arranque_seg']}s primer /catalogo={r['primer_catalogo_ms']}ms "
+              f"con {args.peticiones} peticiones={r['arranque_mas_peticiones_seg']}s  por worker: rss={r['worker_rss_mb']}MB "
+              f"pss={r['worker_pss_mb']}MB uss={r['worker_uss_mb']}MB  total pss={r['total_pss_mb']}MB")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k != 'json'}, 'resultados': resultados},
+                      f, ensure_ascii=False, indent=2)
+    return resultados
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Checkout sobre SQLite con varios workers de gunicorn, con y sin el perfil (perfil_sqlite.py).
+
+Siembra una base (la misma copia para cada modo, en modo journal clásico) con la sucursal abierta
+todo el día y levanta ``gunicorn app:app -c gunicorn.conf.py`` con ``SQLITE_PERFIL=1`` o ``0``. Luego
+dispara POST /checkout a una tasa fija (bucle abierto, como una hora pico) mientras ``--lectores``
+hilos piden /catalogo y /api/sucursales sin pausa. Un checkout cuenta como exitoso si responde 302 a
+/confirmacion; el resto son errores ("database is locked" sale como 500).
+
+Ejemplo::
+
+    python -m bench.checkout_sqlite --workers 3 --pedidos 600 --tasa 150 --json checkout.json
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import time as dtime
+from urllib.parse import urlencode
+
+from bench.arranque import RAIZ, hijos, puerto_libre, sembrar
+from bench.telegram_carga import disparar, resumir
+
+
+def abrir_todo_el_dia(ruta_db):
+    from sqlalchemy import create_engine, update
+    from models import HorarioSucursal
+    engine = create_engine(f'sqlite:///{ruta_db}')
+    with engine.begin() as conexion:
+        conexion.execute(update(HorarioSucursal.__table__).values(hora_apertura=dtime(0, 0),
+                                                                   hora_cierre=dtime(23, 59, 59)))
+    engine.dispose()
+
+
+def _post_checkout(puerto, i, producto_id):
+    cuerpo = urlencode({
+        'nombre': f'Bench {i}', 'telefono': '5550000000', 'calle': 'Calle', 'numero': '1',
+        'colonia': 'Centro', 'entre_calles': 'A y B', 'referencia': '-', 'forma_pago': 'efectivo',
+        'sucursal_id': str(1 + i % 5), 'total': '120',
+        'carrito_data': json.dumps([{'id': producto_id, 'cantidad': 1}]),
+    })
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+    try:
+        conexion.request('POST', '/checkout', body=cuerpo,
+                         headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        resp = conexion.getresponse()
+        resp.read()
+        return resp.status, resp.getheader('Location') or ''
+    finally:
+        conexion.close()
+
+
+def _leer_sin_pausa(puerto, alto, contador):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+    rutas = ('/catalogo', '/api/sucursales')
+    i = 0
+    while not alto.is_set():
+        try:
+            conexion.request('GET', rutas[i % 2])
+            resp = conexion.getresponse()
+            resp.read()
+            contador[resp.status == 200] += 1
+        except (OSError, http.client.HTTPException):
+            contador[False] += 1
+            conexion.close()
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=60)
+        i += 1
+    conexion.close()
+
+
+def medir(modo, ruta_db, args):
+    puerto = puerto_libre()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{ruta_db}', PORT=str(puerto), WEB_CONCURRENCY=str(args.workers),
+               SQLITE_PERFIL='1' if modo == 'perfil' else '0', TELEGRAM_AUTO_WEBHOOK='0', TELEGRAM_TOKEN='')
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py'],
+                            cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < 60:
+            if len(hijos(proc.pid)) >= args.workers:
+                try:
+                    _leer = http.client.HTTPConnection('127.0.0.1', puerto, timeout=2)
+                    _leer.request('GET', '/health')
+                    if _leer.getresponse().status == 200:
+                        break
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        else:
+            raise RuntimeError(f'gunicorn ({modo}) no respondió a tiempo')
+
+        alto, lecturas = threading.Event(), {True: 0, False: 0}
+        lectores = [threading.Thread(target=_leer_sin_pausa, args=(puerto, alto, lecturas), daemon=True)
+                    for _ in range(args.lectores)]
+        for hilo in lectores:
+            hilo.start()
+        estados = {}
+
+        def checkout(i, objetivo):
+            status, destino = _post_checkout(puerto, i, 1 + i % args.productos)
+            clave = 'ok' if status == 302 and destino.endswith('/confirmacion') else str(status)
+            estados[clave] = estados.get(clave, 0) + 1
+            return time.monotonic() - objetivo if clave == 'ok' else None
+
+        latencias, errores, duracion = disparar(args.pedidos, args.tasa, args.concurrencia, checkout)
+        alto.set()
+        for hilo in lectores:
+            hilo.join(timeout=60)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    resultado = resumir(f'checkout ({modo})', latencias, errores, duracion)
+    resultado.update(respuestas=estados, lecturas_ok=lecturas[True], lecturas_error=lecturas[False])
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Checkout concurrente sobre SQLite con y sin perfil')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--pedidos', type=int, default=600)
+    parser.add_argument('--tasa', type=float, default=150.0, help='checkouts por segundo (objetivo)')
+    parser.add_argument('--concurrencia', type=int, default=32)
+    parser.add_argument('--lectores', type=int, default=4, help='hilos leyendo catálogo durante la prueba')
+    parser.add_argument('--productos', type=int, default=50)
+    parser.add_argument('--modos', default='sin-perfil,perfil')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args(argv)
+
+    directorio = tempfile.mkdtemp(prefix='bench_checkout_')
+    base = os.path.join(directorio, 'base.db')
+    sembrar(f'sqlite:///{base}', args.productos, entorno={'SQLITE_PERFIL': '0'})
+    abrir_todo_el_dia(base)
+    resultados = []
+    for modo in [m.strip() for m in args.modos.split(',') if m.strip()]:
+        copia = os.path.join(directorio, f'{modo}.db')
+        shutil.copyfile(base, copia)
+        resultados.append(medir(modo, copia, args))
+    for r in resultados:
+        print(f"{r['flujo']:<22} ok={r['n'] - r['errores']}/{r['n']} {r['throughput_rps']} pedidos/s "
+              f"p50={r['p50_ms']}ms p99={r['p99_ms']}ms respuestas={r['respuestas']} "
+              f"lecturas ok={r['lecturas_ok']} error={r['lecturas_error']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k != 'json'}, 'resultados': resultados},
+                      f, ensure_ascii=False, indent=2)
+    shutil.rmtree(directorio, ignore_errors=True)
+    return resultados
+
+
+if __name__ == '__main__':
+    main()
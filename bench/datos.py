@@ -0,0 +1,286 @@
+"""Generador de datos a escala (reproducible) para pruebas de carga y de planes de consulta.
+
+Llena una base vacía con:
+
+* sucursales con horarios variados (algunas cierran un día, los domingos cierran antes);
+* categorías y miles de productos con opciones (tamaño, extras) y disponibilidad por sucursal;
+* un admin super y un empleado por sucursal;
+* pedidos repartidos en los últimos ``--dias``. Hay más pedidos el fin de semana, con picos de
+  comida y de cena, y sucursales grandes y chicas. El estado depende de la antigüedad: los
+  recientes siguen en curso, los viejos casi todos están entregados y algunos cancelados.
+
+Las fechas y los estados se calculan hacia atrás desde ``--hasta`` (por omisión, ahora). El valor
+usado queda en el resumen JSON: la misma ``--semilla`` con el mismo ``--hasta`` da los mismos
+datos, byte por byte. Los pedidos se insertan por lotes: con COPY en Postgres
+y con executemany en los demás motores. Al final se reconstruyen los resúmenes de ventas
+(``--sin-resumenes`` lo salta), se sube la versión del catálogo y se corre ANALYZE.
+
+Ejemplo::
+
+    python -m bench.datos --database-url sqlite:////tmp/grande.db --pedidos 5000000
+    python -m bench.rutas --base /tmp/grande.db
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timedelta, time as dtime
+
+CATEGORIAS = (
+    ('Pozoles', 110, 190), ('Tostadas', 25, 45), ('Tacos', 20, 40), ('Antojitos', 35, 90),
+    ('Sopas', 60, 110), ('Platos fuertes', 120, 240), ('Ensaladas', 70, 120), ('Infantil', 60, 95),
+    ('Bebidas', 20, 55), ('Postres', 35, 70), ('Extras', 10, 30), ('Promociones', 150, 320),
+)
+# Peso relativo de cada hora del día (picos de comida 13-15 h y de cena 19-21 h)
+PESO_HORA = (0, 0, 0, 0, 0, 0, 0, 0.2, 0.5, 0.8, 1, 1.5, 3, 4.5, 4, 2.5, 1.5, 1.5, 2.5, 4, 4.5, 3.5, 2, 0.5)
+PESO_DIA_SEMANA = (0.8, 0.85, 0.9, 0.95, 1.2, 1.45, 1.3)  # lunes a domingo
+_ESPACIO_NUMEROS = 26 * 26 * 10 ** 6
+_MULTIPLICADOR = 3 ** 18  # coprimo con _ESPACIO_NUMEROS: i -> número es una biyección
+COLUMNAS_PEDIDO = ('numero_pedido', 'nombre', 'telefono', 'direccion', 'calle', 'numero', 'colonia',
+                   'entre_calles', 'referencia', 'sucursal_id', 'productos', 'total', 'fecha', 'estado',
+                   'forma_pago', 'cambio_para', 'comprobante_transferencia')
+
+
+def numero_pedido(i: int) -> str:
+    """Número con el formato de generar_numero_pedido (2 letras + 6 dígitos), único y desordenado."""
+    x = (i * _MULTIPLICADOR + 104729) % _ESPACIO_NUMEROS
+    letras, digitos = divmod(x, 10 ** 6)
+    return f'{chr(65 + letras // 26)}{chr(65 + letras % 26)}{digitos:06d}'
+
+
+def _acumulados(pesos):
+    return list(itertools.accumulate(pesos))
+
+
+def _elegir(azar, acumulados):
+    return bisect.bisect(acumulados, azar.random() * acumulados[-1])
+
+
+def _horarios(azar, sucursal_id):
+    dia_cerrado = azar.choice((0, 0, 1, None, None, None, None))  # algunas cierran lunes o martes
+    apertura = azar.choice((dtime(8), dtime(9), dtime(9), dtime(10), dtime(11)))
+    cierre = azar.choice((dtime(21), dtime(22), dtime(22), dtime(23)))
+    filas = []
+    for dia in range(7):
+        cerrado = dia == dia_cerrado
+        fin = dtime(18) if dia == 6 and azar.random() < 0.5 else cierre
+        filas.append({'sucursal_id': sucursal_id, 'dia_semana': dia, 'cerrado': cerrado,
+                      'hora_apertura': None if cerrado else apertura, 'hora_cierre': None if cerrado else fin})
+    return filas
+
+
+def _menu(azar, n_productos, n_sucursales):
+    """Filas de categorías, productos, opciones, valores y disponibilidad; precios base por producto."""
+    categorias = [{'id': i, 'nombre': nombre} for i, (nombre, _, _) in enumerate(CATEGORIAS, start=1)]
+    productos, opciones, valores, disponibilidad, precios = [], [], [], [], {}
+    opcion_id = 0
+    for pid in range(1, n_productos + 1):
+        cat_id = 1 + (pid - 1) % len(CATEGORIAS)
+        nombre_cat, minimo, maximo = CATEGORIAS[cat_id - 1]
+        precio = float(round(azar.uniform(minimo, maximo)))
+        precios[pid] = precio
+        productos.append({'id': pid, 'nombre': f'{nombre_cat} {pid}', 'precio': precio, 'categoria_id': cat_id,
+                          'descripcion': f'{nombre_cat} de la casa, receta {pid % 37}', 'imagen': f'producto_{pid}.jpg'})
+        if azar.random() < 0.7:
+            opcion_id += 1
+            opciones.append({'id': opcion_id, 'menuitem_id': pid, 'titulo': 'Tamaño', 'tipo': 'radio', 'obligatorio': True})
+            valores += [{'opcion_id': opcion_id, 'texto': t, 'precio': p} for t, p in (('Chico', 0), ('Mediano', 20), ('Grande', 40))]
+        if azar.random() < 0.4:
+            opcion_id += 1
+            opciones.append({'id': opcion_id, 'menuitem_id': pid, 'titulo': 'Extras', 'tipo': 'checkbox', 'obligatorio': False})
+            valores += [{'opcion_id': opcion_id, 'texto': f'Extra {k}', 'precio': float(azar.choice((10, 15, 20, 25, 35)))}
+                        for k in range(1, azar.randint(2, 6) + 1)]
+        disponibilidad += [{'menuitem_id': pid, 'sucursal_id': s, 'disponible': azar.random() < 0.93}
+                           for s in range(1, n_sucursales + 1)]
+    return categorias, productos, opciones, valores, disponibilidad, precios
+
+
+def _estado(azar, antiguedad: timedelta) -> str:
+    minutos = antiguedad.total_seconds() / 60
+    r = azar.random()
+    if minutos < 20:
+        return 'Pendiente' if r < 0.6 else 'En preparación'
+    if minutos < 60:
+        return 'En preparación' if r < 0.3 else 'En camino' if r < 0.8 else 'Entregado' if r < 0.95 else 'Cancelado'
+    return 'Entregado' if r < 0.91 else 'Cancelado' if r < 0.98 else 'Pendiente' if r < 0.99 else 'En camino'
+
+
+def pedidos(azar, n, n_sucursales, precios, dias, ahora):
+    """Genera n filas (tuplas en el orden de COLUMNAS_PEDIDO) en orden cronológico, como en producción."""
+    hoy = datetime.combine(ahora.date(), dtime())
+    fechas_dia = [hoy - timedelta(days=dias - 1 - d) for d in range(dias)]
+    # Pedidos por día según el día de la semana, con una demanda que crece ~40% en el periodo
+    dia_acum = _acumulados(PESO_DIA_SEMANA[f.weekday()] * (0.7 + 0.3 * d / max(dias - 1, 1))
+                           for d, f in enumerate(fechas_dia))
+    cortes = [0] + [int(n * a / dia_acum[-1]) for a in dia_acum]
+    cortes[-1] = n
+    hora_acum = _acumulados(PESO_HORA)
+    sucursal_acum = _acumulados(1 / (s ** 0.8) for s in range(1, n_sucursales + 1))
+    ids = sorted(precios)
+    producto_acum = _acumulados(1 / (k ** 0.6) for k in range(1, len(ids) + 1))
+    azar.shuffle(ids)  # los más vendidos no son siempre los primeros ids
+    nombres = {pid: f'{CATEGORIAS[(pid - 1) % len(CATEGORIAS)][0]} {pid}' for pid in ids}
+    i = 0
+    for d, inicio_dia in enumerate(fechas_dia):
+        momentos = sorted(timedelta(hours=_elegir(azar, hora_acum), seconds=azar.randrange(3600))
+                          for _ in range(cortes[d + 1] - cortes[d]))
+        # Hoy solo hasta ahora: el día se comprime para que ningún pedido quede en el futuro
+        escala = min((ahora - inicio_dia) / timedelta(days=1), 1.0)
+        for momento in momentos:
+            yield _pedido(azar, i, (inicio_dia + momento * escala).replace(microsecond=0), ahora, ids, producto_acum, precios,
+                          nombres, sucursal_acum)
+            i += 1
+
+
+def _pedido(azar, i, fecha, ahora, ids, producto_acum, precios, nombres, sucursal_acum):
+    items, total = [], 0.0
+    for _ in range(1 if azar.random() < 0.55 else 2 if azar.random() < 0.67 else 3):
+        pid = ids[_elegir(azar, producto_acum)]
+        cantidad = 1 if azar.random() < 0.8 else azar.choice((2, 2, 3))
+        unitario = precios[pid]
+        subtotal = unitario * cantidad + (20.0 if azar.random() < 0.3 else 0.0)
+        total += subtotal
+        items.append({'id': pid, 'nombre': nombres[pid], 'cantidad': cantidad, 'precio_unitario': unitario,
+                      'precio_total': subtotal, 'opciones_personalizadas': []})
+    efectivo = azar.random() < 0.65
+    colonia = f'Colonia {azar.randrange(1, 400)}'
+    calle, num = f'Calle {azar.randrange(1, 900)}', str(azar.randrange(1, 3000))
+    return (
+        numero_pedido(i), f'Cliente {azar.randrange(1, 10 ** 6)}', f'55{azar.randrange(10 ** 8):08d}',
+        f'Calle: {calle}, Número: {num}, Colonia: {colonia}, Entre: -, Referencia: -',
+        calle, num, colonia, '-', '-',
+        1 + _elegir(azar, sucursal_acum), json.dumps(items, ensure_ascii=False, separators=(',', ':')),
+        total, fecha, _estado(azar, ahora - fecha),
+        'efectivo' if efectivo else 'transferencia',
+        (float(-(-total // 100) * 100) if efectivo and azar.random() < 0.4 else None),
+        (not efectivo and azar.random() < 0.8),
+    )
+
+
+def _insertar_lote(conexion, tabla, columnas, filas):
+    """COPY en Postgres; executemany en otros motores."""
+    if conexion.dialect.name == 'postgresql':
+        cursor = conexion.connection.driver_connection.cursor()
+        with cursor.copy(f"COPY {tabla.name} ({', '.join(columnas)}) FROM STDIN") as copia:
+            for fila in filas:
+                copia.write_row(fila)
+        return
+    conexion.execute(tabla.insert(), [dict(zip(columnas, fila)) for fila in filas])
+
+
+def _ajustar_secuencias(conexion, tablas):
+    # En Postgres los ids explícitos no avanzan la secuencia: la app chocaría al insertar
+    if conexion.dialect.name != 'postgresql':
+        return
+    from sqlalchemy import text
+    for tabla in tablas:
+        conexion.execute(text(f"SELECT setval(pg_get_serial_sequence('{tabla.name}', 'id'), "
+                              f"(SELECT coalesce(max(id), 1) FROM {tabla.name}))"))
+
+
+def generar(app, sucursales=20, productos=2000, n_pedidos=200000, dias=365, semilla=1, lote=50000,
+            resumenes=True, admin_password='admin', salida=print, hasta=None):
+    """Llena la base de ``app`` (debe estar vacía). Devuelve un resumen con conteos y tiempos.
+
+    ``hasta`` es el "ahora" de los datos; si falta se usa la hora actual (al minuto).
+    """
+    from sqlalchemy import func, select, text
+    import catalogo
+    import migraciones
+    import resumen_ventas
+    from extensions import db
+    from models import (Administrador, AdministradorSucursal, Categoria, HorarioSucursal, MenuItem,
+                        MenuItemSucursal, OpcionPersonalizada, PedidoCliente, Sucursal, ValorOpcion)
+
+    azar = random.Random(semilla)
+    ahora = hasta or datetime.now().replace(second=0, microsecond=0)
+    t0 = time.perf_counter()
+    with app.app_context():
+        migraciones.migrar()
+        engine = db.engine
+        with engine.begin() as conexion:
+            if conexion.execute(select(func.count()).select_from(Sucursal.__table__)).scalar():
+                raise SystemExit('La base ya tiene sucursales: el generador necesita una base vacía.')
+            def insertar(modelo, filas):
+                if filas:
+                    conexion.execute(modelo.__table__.insert(), filas)
+
+            insertar(Sucursal, [{'id': s, 'nombre': f'Sucursal {s}', 'direccion': f'Av. Principal {s * 10}',
+                                 'telefono': f'55{s:08d}', 'activa': s == 1 or azar.random() < 0.95}
+                                for s in range(1, sucursales + 1)])
+            insertar(HorarioSucursal, [f for s in range(1, sucursales + 1) for f in _horarios(azar, s)])
+            categorias, items, opciones, valores, disponibilidad, precios = _menu(azar, productos, sucursales)
+            for modelo, filas in ((Categoria, categorias), (MenuItem, items), (OpcionPersonalizada, opciones),
+                                  (ValorOpcion, valores), (MenuItemSucursal, disponibilidad)):
+                insertar(modelo, filas)
+            insertar(Administrador, [{'id': 1, 'usuario': 'admin', 'password': admin_password, 'nombre': 'Administrador',
+                                      'rol': 'super'}] +
+                     [{'id': 1 + s, 'usuario': f'sucursal{s}', 'password': admin_password, 'nombre': f'Encargado {s}',
+                       'rol': 'empleado'} for s in range(1, sucursales + 1)])
+            insertar(AdministradorSucursal, [{'administrador_id': 1 + s, 'sucursal_id': s} for s in range(1, sucursales + 1)])
+            _ajustar_secuencias(conexion, [Sucursal.__table__, Categoria.__table__, MenuItem.__table__,
+                                           OpcionPersonalizada.__table__, Administrador.__table__])
+        salida(f'[DATOS] {sucursales} sucursales, {productos} productos, {len(opciones)} opciones, '
+               f'{len(disponibilidad)} filas de disponibilidad ({time.perf_counter() - t0:.1f}s)')
+
+        t1 = time.perf_counter()
+        filas = pedidos(azar, n_pedidos, sucursales, precios, dias, ahora)
+        hechos = 0
+        while hechos < n_pedidos:
+            bloque = list(itertools.islice(filas, lote))
+            with engine.begin() as conexion:
+                _insertar_lote(conexion, PedidoCliente.__table__, COLUMNAS_PEDIDO, bloque)
+            hechos += len(bloque)
+            transcurrido = time.perf_counter() - t1
+            salida(f'[DATOS] pedidos {hechos:,}/{n_pedidos:,} ({hechos / transcurrido:,.0f}/s)')
+        t_pedidos = time.perf_counter() - t1
+
+        t2 = time.perf_counter()
+        if resumenes and n_pedidos:
+            desde = (ahora - timedelta(days=dias)).date()
+            n = resumen_ventas.reconstruir(desde, ahora.date())
+            salida(f'[DATOS] resúmenes de ventas: {n:,} pedidos ({time.perf_counter() - t2:.1f}s)')
+        # La inserción directa no pasa por los eventos del ORM: avisar a las cachés del catálogo
+        catalogo.incrementar_version()
+        catalogo.incrementar_particiones(range(1, sucursales + 1))
+        db.session.commit()
+        with engine.begin() as conexion:
+            conexion.execute(text('ANALYZE'))
+    return {
+        'semilla': semilla, 'hasta': ahora.isoformat(), 'sucursales': sucursales, 'productos': productos,
+        'pedidos': n_pedidos, 'dias': dias,
+        'pedidos_por_seg': round(n_pedidos / t_pedidos) if t_pedidos else None,
+        'total_seg': round(time.perf_counter() - t0, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera un conjunto de datos grande y reproducible')
+    parser.add_argument('--database-url', required=True, help='base vacía (sqlite:///... o postgresql://...)')
+    parser.add_argument('--sucursales', type=int, default=20)
+    parser.add_argument('--productos', type=int, default=2000)
+    parser.add_argument('--pedidos', type=int, default=200000)
+    parser.add_argument('--dias', type=int, default=365, help='los pedidos cubren los últimos N días')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--hasta', type=datetime.fromisoformat,
+                        help='fin del periodo, p. ej. 2026-10-19T20:00 (por omisión ahora; queda en el resumen)')
+    parser.add_argument('--lote', type=int, default=50000, help='pedidos por transacción')
+    parser.add_argument('--admin-password', default='admin', help='contraseña de "admin" y de los encargados')
+    parser.add_argument('--sin-resumenes', action='store_true', help='no reconstruir los resúmenes de ventas')
+    args = parser.parse_args(argv)
+
+    import os
+    os.environ.setdefault('TELEGRAM_TOKEN', '')
+    os.environ.setdefault('LOG_NIVEL', 'WARNING')
+    from app import _normalizar_uri, create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': _normalizar_uri(args.database_url), 'INICIAR_HILOS': False})
+    resumen = generar(app, args.sucursales, args.productos, args.pedidos, args.dias, args.semilla, args.lote,
+                      not args.sin_resumenes, args.admin_password, hasta=args.hasta)
+    print(json.dumps(resumen, ensure_ascii=False))
+    return resumen
+
+
+if __name__ == '__main__':
+    main()
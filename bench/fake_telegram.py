@@ -0,0 +1,220 @@
+"""Servidor local que imita la Bot API de Telegram para pruebas de carga.
+
+Implementa sendMessage, editMessageText, editMessageReplyMarkup, answerCallbackQuery,
+getUpdates (con long polling) y setWebhook/deleteWebhook/getWebhookInfo/getMe.
+Permite inyectar latencia, errores 5xx y respuestas 429 (rate limit) con ``retry_after``.
+
+Uso independiente::
+
+    python -m bench.fake_telegram --port 8081 --latencia-ms 300 --prob-429 0.1
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 TELEGRAM_TOKEN=x python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+METODOS = {
+    'sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'answerCallbackQuery',
+    'getUpdates', 'setWebhook', 'deleteWebhook', 'getWebhookInfo', 'getMe',
+}
+
+
+class FakeTelegram:
+    """Estado del servidor falso: configuración de fallos, llamadas registradas y cola de updates."""
+
+    def __init__(self, latencia_ms=0.0, jitter_ms=0.0, prob_error=0.0, prob_429=0.0, retry_after=1, semilla=None):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.prob_error = prob_error
+        self.prob_429 = prob_429
+        self.retry_after = retry_after
+        self._rand = random.Random(semilla)
+        self._lock = threading.Condition()
+        self._llamadas = []  # (t_monotonic, metodo, payload, status)
+        self._updates = []
+        self._siguiente_update_id = 1
+        self._siguiente_message_id = 1
+        self.webhook_url = ''
+        self.httpd = None
+
+    # --- Inyección de fallos -------------------------------------------------
+    def _esperar_latencia(self):
+        if self.latencia_ms or self.jitter_ms:
+            extra = self._rand.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+            time.sleep((self.latencia_ms + extra) / 1000.0)
+
+    def _fallo(self):
+        r = self._rand.random()
+        if r < self.prob_429:
+            return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry later',
+                         'parameters': {'retry_after': self.retry_after}}
+        if r < self.prob_429 + self.prob_error:
+            return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error (inyectado)'}
+        return None
+
+    # --- Métodos de la API -----------------------------------------------------
+    def atender(self, metodo: str, payload: dict):
+        if metodo not in METODOS:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+        if metodo == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(payload)}
+        self._esperar_latencia()
+        fallo = self._fallo()
+        if fallo:
+            self._registrar(metodo, payload, fallo[0])
+            return fallo
+        if metodo == 'sendMessage':
+            with self._lock:
+                message_id = self._siguiente_message_id
+                self._siguiente_message_id += 1
+            resultado = {'message_id': message_id, 'date': int(time.time()),
+                         'chat': {'id': payload.get('chat_id')}, 'text': payload.get('text', '')}
+        elif metodo in ('editMessageText', 'editMessageReplyMarkup'):
+            resultado = {'message_id': payload.get('message_id'), 'chat': {'id': payload.get('chat_id')},
+                         'text': payload.get('text', '')}
+        elif metodo == 'setWebhook':
+            self.webhook_url = payload.get('url', '')
+            resultado = True
+        elif metodo == 'deleteWebhook':
+            self.webhook_url = ''
+            resultado = True
+        elif metodo == 'getWebhookInfo':
+            resultado = {'url': self.webhook_url, 'pending_update_count': len(self._updates)}
+        elif metodo == 'getMe':
+            resultado = {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+        else:  # answerCallbackQuery
+            resultado = True
+        self._registrar(metodo, payload, 200)
+        return 200, {'ok': True, 'result': resultado}
+
+    def _registrar(self, metodo, payload, status):
+        with self._lock:
+            self._llamadas.append((time.monotonic(), metodo, payload, status))
+            self._lock.notify_all()
+
+    def _get_updates(self, payload):
+        offset = int(payload.get('offset') or 0)
+        timeout = float(payload.get('timeout') or 0)
+        limite = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                # Como en Telegram: pedir con offset confirma (descarta) los anteriores
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+                if self._updates or time.monotonic() >= limite:
+                    return list(self._updates)
+                self._lock.wait(timeout=max(0.0, limite - time.monotonic()))
+
+    # --- Utilidades para el harness ------------------------------------------
+    def encolar_update(self, update: dict) -> dict:
+        with self._lock:
+            update = dict(update, update_id=self._siguiente_update_id)
+            self._siguiente_update_id += 1
+            self._updates.append(update)
+            self._lock.notify_all()
+        return update
+
+    def llamadas(self, metodo=None):
+        with self._lock:
+            return [c for c in self._llamadas if metodo is None or c[1] == metodo]
+
+    def esperar_llamada(self, predicado, timeout=10.0):
+        """Bloquea hasta que alguna llamada cumpla `predicado(metodo, payload, status)`; devuelve su instante."""
+        limite = time.monotonic() + timeout
+        visto = 0
+        with self._lock:
+            while True:
+                for t, metodo, payload, status in self._llamadas[visto:]:
+                    if predicado(metodo, payload, status):
+                        return t
+                visto = len(self._llamadas)
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return None
+                self._lock.wait(timeout=restante)
+
+    def resumen(self) -> dict:
+        por_metodo = {}
+        for _, metodo, _, status in self.llamadas():
+            d = por_metodo.setdefault(metodo, {'total': 0, '429': 0, '5xx': 0})
+            d['total'] += 1
+            if status == 429:
+                d['429'] += 1
+            elif status >= 500:
+                d['5xx'] += 1
+        return por_metodo
+
+    # --- Servidor HTTP ---------------------------------------------------------
+    def iniciar(self, host='127.0.0.1', port=0) -> str:
+        """Arranca el servidor en un hilo y devuelve la URL base (para TELEGRAM_API_BASE)."""
+        fake = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _responder(self, payload):
+                # Ruta esperada: /bot<TOKEN>/<metodo>
+                partes = urlparse(self.path).path.strip('/').split('/')
+                metodo = partes[1] if len(partes) == 2 and partes[0].startswith('bot') else ''
+                status, cuerpo = fake.atender(metodo, payload)
+                data = json.dumps(cuerpo).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._responder(dict(parse_qsl(urlparse(self.path).query)))
+
+            def do_POST(self):
+                largo = int(self.headers.get('Content-Length') or 0)
+                crudo = self.rfile.read(largo) if largo else b''
+                try:
+                    payload = json.loads(crudo) if crudo else {}
+                except ValueError:
+                    payload = dict(parse_qsl(crudo.decode('utf-8', 'replace')))
+                payload.update(parse_qsl(urlparse(self.path).query))
+                self._responder(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name='FakeTelegram', daemon=True).start()
+        h, p = self.httpd.server_address[:2]
+        return f'http://{h}:{p}'
+
+    def detener(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bot API de Telegram falsa para pruebas locales')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latencia-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--prob-error', type=float, default=0.0, help='probabilidad de responder 500')
+    parser.add_argument('--prob-429', type=float, default=0.0, help='probabilidad de responder 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+    fake = FakeTelegram(args.latencia_ms, args.jitter_ms, args.prob_error, args.prob_429, args.retry_after)
+    base = fake.iniciar(args.host, args.port)
+    print(f'[FAKE-TELEGRAM] Escuchando en {base} (TELEGRAM_API_BASE={base})')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.detener()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+"""Benchmark HTTP de las rutas principales: tienda, carrito, checkout y admin.
+
+Siembra una base SQLite temporal con menú, horarios abiertos todo el día y pedidos, y recorre cada
+ruta en uno o dos modos:
+
+* ``cliente``: el test client de Flask en este mismo proceso. No hay red: mide solo la app.
+* ``gunicorn``: ``gunicorn app:app -c gunicorn.conf.py`` real, con ``--concurrencia`` clientes
+  HTTP en paralelo (cada uno con su cookie de sesión).
+
+Las rutas que necesitan sesión se preparan antes de medir: ``/carrito`` y ``GET /checkout`` con
+tres productos en el carrito, y las de admin con un login. ``POST /agregar_carrito`` y
+``POST /checkout`` van sin sesión, como un cliente nuevo.
+
+Por ruta reporta throughput, p50/p95/p99 y sentencias SQL por request. Las sentencias salen del
+header X-DB-Sentencias, que la app agrega con DB_SENTENCIAS_HEADER=1. ``--json`` guarda el
+resultado con el commit actual. ``--comparar`` muestra la diferencia contra otra corrida, p. ej.
+para comparar ramas::
+
+    python -m bench.rutas --peticiones 300 --json main.json
+    git switch mi-rama && python -m bench.rutas --peticiones 300 --comparar main.json
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from bench.arranque import RAIZ, hijos, puerto_libre, sembrar
+from bench.checkout_sqlite import abrir_todo_el_dia
+from bench.telegram_carga import percentil
+
+ADMIN = ('bench', 'bench')
+ESTADOS = ('Pendiente', 'En preparación', 'En camino', 'Entregado', 'Cancelado')
+
+# (nombre, método, ruta, preparación de la sesión: None, 'carrito' o 'admin')
+RUTAS = (
+    ('inicio', 'GET', '/', None),
+    ('catalogo', 'GET', '/catalogo', None),
+    ('agregar_carrito', 'POST', '/agregar_carrito', None),
+    ('carrito', 'GET', '/carrito', 'carrito'),
+    ('checkout_get', 'GET', '/checkout', 'carrito'),
+    ('checkout_post', 'POST', '/checkout', None),
+    ('api_sucursales', 'GET', '/api/sucursales', None),
+    ('api_pedido_estado', 'GET', '/api/pedido_estado', None),
+    ('admin_dashboard', 'GET', '/admin/', 'admin'),
+    ('admin_pedidos', 'GET', '/admin/pedidos_clientes', 'admin'),
+)
+_FORM = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def sembrar_operacion(database_url, n, n_sucursales=5):
+    """Un admin super (ADMIN) y n pedidos de los últimos días (para /api/pedido_estado y el admin)."""
+    from sqlalchemy import create_engine, insert
+    from models import Administrador, PedidoCliente
+    ahora = datetime.now()
+    filas = [{
+        'numero_pedido': f'B{i:07d}', 'nombre': f'Cliente {i}', 'telefono': '5550000000',
+        'direccion': 'Calle: Calle, Número: 1', 'calle': 'Calle', 'numero': '1', 'colonia': 'Centro',
+        'entre_calles': '-', 'referencia': '-', 'sucursal_id': 1 + i % n_sucursales,
+        'productos': json.dumps([{'nombre': 'Producto 1', 'cantidad': 1, 'precio': 120}]),
+        'total': 120.0, 'fecha': ahora - timedelta(minutes=17 * i), 'estado': ESTADOS[i % len(ESTADOS)],
+        'forma_pago': 'efectivo',
+    } for i in range(n)]
+    engine = create_engine(database_url)
+    with engine.begin() as conexion:
+        conexion.execute(insert(Administrador.__table__).values(usuario=ADMIN[0], password=ADMIN[1],
+                                                                nombre='Bench', rol='super'))
+        if filas:
+            conexion.execute(insert(PedidoCliente.__table__), filas)
+    engine.dispose()
+    return [f['numero_pedido'] for f in filas]
+
+
+def datos_existentes(database_url, muestra=1000):
+    """(cantidad de productos, números de pedido) de una base ya llena, p. ej. por bench.datos."""
+    from sqlalchemy import create_engine, func, select
+    from models import MenuItem, PedidoCliente
+    engine = create_engine(database_url)
+    with engine.connect() as conexion:
+        n_productos = conexion.execute(select(func.count()).select_from(MenuItem)).scalar()
+        numeros = conexion.scalars(select(PedidoCliente.numero_pedido)
+                                   .order_by(PedidoCliente.id.desc()).limit(muestra)).all()
+    engine.dispose()
+    return n_productos, numeros
+
+
+def opciones_por_producto(database_url):
+    """{menuitem_id: (opcion_id, valor_id)} con el primer valor de la primera opción de cada producto."""
+    from sqlalchemy import create_engine, func, select
+    from models import OpcionPersonalizada, ValorOpcion
+    consulta = (select(OpcionPersonalizada.menuitem_id, OpcionPersonalizada.id, func.min(ValorOpcion.id))
+                .join(ValorOpcion, ValorOpcion.opcion_id == OpcionPersonalizada.id)
+                .group_by(OpcionPersonalizada.menuitem_id, OpcionPersonalizada.id))
+    engine = create_engine(database_url)
+    with engine.connect() as conexion:
+        filas = conexion.execute(consulta).all()
+    engine.dispose()
+    return {menuitem: (opcion, valor) for menuitem, opcion, valor in filas}
+
+
+class Escenario:
+    """Datos sembrados y armado de cada petición (ruta, cuerpo, headers y si cuenta como éxito)."""
+
+    def __init__(self, n_productos, numeros, opciones):
+        self.n_productos = n_productos
+        self.numeros = numeros
+        self.opciones = opciones
+
+    def _producto(self, i):
+        return 1 + i % self.n_productos
+
+    def form_agregar(self, i):
+        producto = self._producto(i)
+        datos = {'producto_id': producto, 'cantidad': 1}
+        if producto in self.opciones:
+            opcion, valor = self.opciones[producto]
+            datos[f'opcion_{opcion}'] = valor
+        return urlencode(datos)
+
+    def peticion(self, nombre, ruta, i):
+        if nombre == 'agregar_carrito':
+            return ruta, self.form_agregar(i), _FORM, (302,)
+        if nombre == 'checkout_post':
+            cuerpo = urlencode({
+                'nombre': f'Bench {i}', 'telefono': '5550000000', 'calle': 'Calle', 'numero': '1',
+                'colonia': 'Centro', 'entre_calles': 'A y B', 'referencia': '-', 'forma_pago': 'efectivo',
+                'sucursal_id': str(1 + i % 5), 'total': '120',
+                'carrito_data': json.dumps([{'id': self._producto(i), 'cantidad': 1}]),
+            })
+            return ruta, cuerpo, _FORM, (302,)
+        if nombre == 'api_pedido_estado':
+            return f'{ruta}?numero={self.numeros[i % len(self.numeros)]}', None, {}, (200,)
+        return ruta, None, {}, (200,)
+
+    def preparar(self, cliente, preparacion, k):
+        """Deja la sesión del cliente lista para rutas con carrito o de admin."""
+        if preparacion == 'carrito':
+            for j in range(3):
+                cliente.pedir('POST', '/agregar_carrito', self.form_agregar(k * 3 + j), _FORM)
+        elif preparacion == 'admin':
+            status, _ = cliente.pedir('POST', '/admin/login', urlencode(dict(zip(('username', 'password'), ADMIN))), _FORM)
+            if status != 302:
+                raise RuntimeError(f'login de admin falló ({status})')
+
+
+class ClienteFlask:
+    """Test client de Flask (guarda la cookie de sesión)."""
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def pedir(self, metodo, ruta, cuerpo=None, headers=None):
+        respuesta = self._cliente.open(ruta, method=metodo, data=cuerpo, headers=headers or {})
+        respuesta.close()
+        return respuesta.status_code, respuesta.headers.get('X-DB-Sentencias')
+
+
+class ClienteHTTP:
+    """Cliente HTTP mínimo con la cookie de sesión de Flask (gunicorn sync cierra cada conexión)."""
+
+    def __init__(self, puerto):
+        self.puerto = puerto
+        self.cookie = None
+
+    def pedir(self, metodo, ruta, cuerpo=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        conexion = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=60)
+        try:
+            conexion.request(metodo, ruta, body=cuerpo, headers=headers)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+        finally:
+            conexion.close()
+        for valor in respuesta.headers.get_all('Set-Cookie') or []:
+            if valor.startswith('session='):
+                self.cookie = valor.split(';', 1)[0]
+        return respuesta.status, respuesta.getheader('X-DB-Sentencias')
+
+
+def medir_ruta(escenario, nueva_sesion, nombre, metodo, ruta, preparacion, n, concurrencia, calentamiento):
+    """Bucle cerrado: ``concurrencia`` clientes reparten n peticiones. Devuelve el resumen de la ruta."""
+    latencias, sentencias, errores = [], [], []
+    lock = threading.Lock()
+
+    def usuario(k, indices):
+        cliente = nueva_sesion()
+        escenario.preparar(cliente, preparacion, k)
+        for i in indices:
+            camino, cuerpo, headers, esperado = escenario.peticion(nombre, ruta, i)
+            if preparacion is None:
+                cliente = nueva_sesion()  # sin sesión: cada petición es un cliente nuevo
+            t0 = time.perf_counter()
+            try:
+                status, n_sql = cliente.pedir(metodo, camino, cuerpo, headers)
+            except (OSError, http.client.HTTPException) as e:
+                status, n_sql = type(e).__name__, None
+            duracion = time.perf_counter() - t0
+            if i < 0:
+                continue  # calentamiento
+            with lock:
+                if status in esperado:
+                    latencias.append(duracion)
+                    if n_sql is not None:
+                        sentencias.append(int(n_sql))
+                else:
+                    errores.append(status)
+
+    repartos = [[-1 - j for j in range(calentamiento)] + list(range(k, n, concurrencia)) for k in range(concurrencia)]
+    t0 = time.perf_counter()
+    if concurrencia == 1:
+        usuario(0, repartos[0])
+    else:
+        hilos = [threading.Thread(target=usuario, args=(k, r)) for k, r in enumerate(repartos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+    duracion = time.perf_counter() - t0
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        'ruta': nombre, 'metodo': metodo, 'camino': ruta, 'n': len(latencias) + len(errores),
+        'errores': len(errores), 'status_errores': sorted({str(s) for s in errores}),
+        'throughput_rps': round(len(latencias) / duracion, 1) if duracion else None,
+        'p50_ms': ms(percentil(latencias, 50)), 'p95_ms': ms(percentil(latencias, 95)),
+        'p99_ms': ms(percentil(latencias, 99)),
+        'sql_por_request': round(sum(sentencias) / len(sentencias), 2) if sentencias else None,
+        'sql_max': max(sentencias) if sentencias else None,
+    }
+
+
+def _rutas(filtro):
+    if not filtro:
+        return RUTAS
+    nombres = {n.strip() for n in filtro.split(',')}
+    return tuple(r for r in RUTAS if r[0] in nombres)
+
+
+def medir_cliente(database_url, escenario, args):
+    # Se leen al importar la app: sin Telegram real y sin un log por request en la salida del bench
+    os.environ.setdefault('TELEGRAM_TOKEN', '')
+    os.environ.setdefault('LOG_NIVEL', 'WARNING')
+    import app as modulo
+    app = modulo.create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'INICIAR_HILOS': False,
+                             'DB_SENTENCIAS_HEADER': True})
+    try:
+        return [medir_ruta(escenario, lambda: ClienteFlask(app), *r, args.peticiones, 1, args.calentamiento)
+                for r in _rutas(args.rutas)]
+    finally:
+        from extensions import db
+        with app.app_context():
+            db.engine.dispose()
+
+
+def medir_gunicorn(database_url, escenario, args):
+    puerto = puerto_libre()
+    env = dict(os.environ, DATABASE_URL=database_url, PORT=str(puerto), WEB_CONCURRENCY=str(args.workers),
+               DB_SENTENCIAS_HEADER='1', TELEGRAM_AUTO_WEBHOOK='0', TELEGRAM_TOKEN='', LOG_NIVEL='WARNING')
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py'],
+                            cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < 60:
+            if len(hijos(proc.pid)) >= args.workers:
+                try:
+                    if ClienteHTTP(puerto).pedir('GET', '/health')[0] == 200:
+                        break
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        else:
+            raise RuntimeError('gunicorn no respondió a tiempo')
+        return [medir_ruta(escenario, lambda: ClienteHTTP(puerto), *r, args.peticiones, args.concurrencia,
+                           args.calentamiento)
+                for r in _rutas(args.rutas)]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def _commit():
+    try:
+        salida = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=RAIZ,
+                                capture_output=True, text=True, timeout=10)
+        rama = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, timeout=10)
+        return {'commit': salida.stdout.strip() or None, 'rama': rama.stdout.strip() or None}
+    except OSError:
+        return {'commit': None, 'rama': None}
+
+
+def _porcentaje(nuevo, viejo):
+    if nuevo is None or not viejo:
+        return '    -'
+    return f'{(nuevo - viejo) / viejo * 100:+5.0f}%'
+
+
+def imprimir(resultados, base=None):
+    for modo, filas in resultados.items():
+        anteriores = {r['ruta']: r for r in (base or {}).get(modo, [])}
+        print(f'== {modo}')
+        print(f"{'ruta':<18}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'sql':>7}{'err':>5}"
+              + ('   Δreq/s   Δp50   Δsql' if base else ''))
+        for r in filas:
+            linea = (f"{r['ruta']:<18}{r['throughput_rps'] or 0:>9}{r['p50_ms'] or 0:>9}{r['p95_ms'] or 0:>9}"
+                     f"{r['p99_ms'] or 0:>9}{r['sql_por_request'] if r['sql_por_request'] is not None else '-':>7}"
+                     f"{r['errores']:>5}")
+            if base and r['ruta'] in anteriores:
+                a = anteriores[r['ruta']]
+                linea += (f"   {_porcentaje(r['throughput_rps'], a['throughput_rps'])}"
+                          f" {_porcentaje(r['p50_ms'], a['p50_ms'])} {_porcentaje(r['sql_por_request'], a['sql_por_request'])}")
+            print(linea)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Throughput, latencia y SQL por request de las rutas principales')
+    parser.add_argument('--modos', default='cliente,gunicorn', help='cliente (test client) y/o gunicorn')
+    parser.add_argument('--peticiones', type=int, default=200, help='peticiones medidas por ruta')
+    parser.add_argument('--calentamiento', type=int, default=5, help='peticiones previas sin medir (por cliente)')
+    parser.add_argument('--concurrencia', type=int, default=8, help='clientes en paralelo (modo gunicorn)')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--productos', type=int, default=200)
+    parser.add_argument('--pedidos', type=int, default=2000, help='pedidos sembrados')
+    parser.add_argument('--base', help='SQLite generada con bench.datos (se usa una copia; ignora --productos/--pedidos)')
+    parser.add_argument('--rutas', help='solo estas rutas (nombres separados por coma)')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para mostrar diferencias')
+    args = parser.parse_args(argv)
+
+    directorio = tempfile.mkdtemp(prefix='bench_rutas_')
+    base = os.path.join(directorio, 'base.db')
+    if args.base:
+        shutil.copyfile(args.base, base)
+        abrir_todo_el_dia(base)
+        sembrar_operacion(f'sqlite:///{base}', 0)
+        n_productos, numeros = datos_existentes(f'sqlite:///{base}')
+    else:
+        sembrar(f'sqlite:///{base}', args.productos)
+        abrir_todo_el_dia(base)
+        n_productos, numeros = args.productos, sembrar_operacion(f'sqlite:///{base}', args.pedidos)
+    escenario = Escenario(n_productos, numeros, opciones_por_producto(f'sqlite:///{base}'))
+    medidores = {'cliente': medir_cliente, 'gunicorn': medir_gunicorn}
+    resultados = {}
+    try:
+        for modo in [m.strip() for m in args.modos.split(',') if m.strip()]:
+            # Cada modo parte de la misma base (los checkouts de un modo no engordan la del otro)
+            copia = os.path.join(directorio, f'{modo}.db')
+            shutil.copyfile(base, copia)
+            resultados[modo] = medidores[modo](f'sqlite:///{copia}', escenario, args)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        print(f"Comparando contra {anterior.get('git', {}).get('commit')} ({args.comparar})")
+    imprimir(resultados, anterior and anterior['resultados'])
+    salida = {'git': _commit(), 'fecha': datetime.now().isoformat(timespec='seconds'),
+              'config': {k: v for k, v in vars(args).items() if k not in ('json', 'comparar')},
+              'resultados': resultados}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(salida, f, ensure_ascii=False, indent=2)
+    return salida
+
+
+if __name__ == '__main__':
+    main()
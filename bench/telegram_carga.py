@@ -0,0 +1,198 @@
+"""Harness de carga del pipeline del bot contra la Bot API falsa (bench/fake_telegram.py).
+
+Levanta el servidor falso, importa la app apuntando a él (TELEGRAM_API_BASE) sobre una base SQLite
+temporal y reproduce dos flujos a una tasa objetivo (bucle abierto: la latencia se mide desde el
+instante programado, así los retrasos acumulados no se esconden):
+
+* ``notificar``: POST /checkout que crea el pedido y envía sendMessage (latencia del checkout).
+* ``estado``: callback de botón "En camino" vía webhook (o getUpdates con ``--entrada polling``);
+  se mide hasta que el servidor falso recibe el editMessageText del mensaje.
+
+Ejemplo::
+
+    python -m bench.telegram_carga --pedidos 200 --tasa 20 --latencia-ms 250 --prob-429 0.05 --json out.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dtime
+
+from bench.fake_telegram import FakeTelegram
+
+CHAT_ID = '1000'
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores en segundos)."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    k = max(0, min(len(ordenados) - 1, int(round(p / 100.0 * len(ordenados) + 0.5)) - 1))
+    return ordenados[k]
+
+
+def resumir(nombre, latencias, errores, duracion):
+    ms = lambda v: round(v * 1000, 1) if v is not None else None
+    return {
+        'flujo': nombre,
+        'n': len(latencias) + errores,
+        'errores': errores,
+        'throughput_rps': round(len(latencias) / duracion, 2) if duracion else None,
+        'p50_ms': ms(percentil(latencias, 50)),
+        'p99_ms': ms(percentil(latencias, 99)),
+        'max_ms': ms(max(latencias) if latencias else None),
+    }
+
+
+def disparar(n, tasa, concurrencia, fn):
+    """Ejecuta fn(i, t_programado) n veces a `tasa` por segundo. Devuelve (latencias, errores, duración)."""
+    latencias, errores = [], 0
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        futuros = []
+        for i in range(n):
+            objetivo = t0 + i / tasa
+            espera = objetivo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            futuros.append(pool.submit(fn, i, objetivo))
+        for f in futuros:
+            try:
+                lat = f.result()
+            except Exception as e:
+                print('[BENCH] Error:', e, file=sys.stderr)
+                lat = None
+            if lat is None:
+                errores += 1
+            else:
+                latencias.append(lat)
+    return latencias, errores, time.monotonic() - t0
+
+
+def preparar_entorno(args, base_url):
+    os.environ['TELEGRAM_TOKEN'] = 'bench-token'
+    os.environ['TELEGRAM_API_BASE'] = base_url
+    os.environ['TELEGRAM_ADMIN_CHAT_ID'] = CHAT_ID
+    os.environ['TELEGRAM_AUTO_WEBHOOK'] = '0'
+    os.environ['TELEGRAM_USE_POLLING'] = '0'
+    if args.debounce is not None:
+        os.environ['TELEGRAM_EDIT_DEBOUNCE'] = str(args.debounce)
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_tg_'), 'bench.db')
+
+
+def sembrar(app, n_pedidos):
+    """Sucursal abierta toda la semana, un producto y n pedidos pendientes para el flujo de estado."""
+    from extensions import db
+    from models import Sucursal, HorarioSucursal, MenuItem, PedidoCliente
+    with app.app_context():
+        db.create_all()
+        sucursal = Sucursal(nombre='Bench', direccion='Local', telefono='0', activa=True)
+        db.session.add(sucursal)
+        db.session.flush()
+        for dia in range(7):
+            db.session.add(HorarioSucursal(sucursal_id=sucursal.id, dia_semana=dia, cerrado=False,
+                                           hora_apertura=dtime(0, 0), hora_cierre=dtime(23, 59, 59)))
+        producto = MenuItem(nombre='Pozole rojo', descripcion='Bench', precio=120.0)
+        db.session.add(producto)
+        db.session.flush()
+        numeros = []
+        for i in range(n_pedidos):
+            numero = f'BE{i:06d}'
+            numeros.append(numero)
+            db.session.add(PedidoCliente(
+                numero_pedido=numero, nombre='Cliente', telefono='555', calle='Calle', numero='1',
+                colonia='Centro', entre_calles='A y B', referencia='-', sucursal_id=sucursal.id,
+                productos=json.dumps([{'nombre': 'Pozole rojo', 'cantidad': 1, 'precio_total': 120.0,
+                                       'opciones_personalizadas': []}]),
+                total=120.0, fecha=datetime.now(), estado='Pendiente', forma_pago='efectivo'))
+        db.session.commit()
+        return sucursal.id, producto.id, numeros
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Carga del pipeline del bot de Telegram')
+    parser.add_argument('--pedidos', type=int, default=100, help='operaciones por flujo')
+    parser.add_argument('--tasa', type=float, default=10.0, help='operaciones por segundo')
+    parser.add_argument('--concurrencia', type=int, default=16)
+    parser.add_argument('--flujos', default='notificar,estado')
+    parser.add_argument('--entrada', choices=['webhook', 'polling'], default='webhook')
+    parser.add_argument('--latencia-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--prob-error', type=float, default=0.0)
+    parser.add_argument('--prob-429', type=float, default=0.0)
+    parser.add_argument('--debounce', type=float, default=None, help='TELEGRAM_EDIT_DEBOUNCE para la corrida')
+    parser.add_argument('--timeout', type=float, default=15.0, help='espera máxima por la edición (s)')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args(argv)
+
+    fake = FakeTelegram(args.latencia_ms, args.jitter_ms, args.prob_error, args.prob_429, semilla=42)
+    base_url = fake.iniciar()
+    preparar_entorno(args, base_url)
+
+    from app import app  # importar después de configurar el entorno
+    import telegram_bot
+
+    sucursal_id, producto_id, numeros = sembrar(app, args.pedidos)
+    flujos = [f.strip() for f in args.flujos.split(',') if f.strip()]
+    resultados = []
+
+    if 'notificar' in flujos:
+        def notificar(i, objetivo):
+            with app.test_client() as client:
+                resp = client.post('/checkout', data={
+                    'nombre': f'Bench {i}', 'telefono': '5550000000', 'calle': 'Calle', 'numero': '1',
+                    'colonia': 'Centro', 'entre_calles': 'A y B', 'referencia': '-', 'forma_pago': 'efectivo',
+                    'sucursal_id': str(sucursal_id), 'total': '120',
+                    'carrito_data': json.dumps([{'id': producto_id, 'cantidad': 1}]),
+                })
+            if resp.status_code != 302:
+                return None
+            return time.monotonic() - objetivo
+        resultados.append(resumir('notificar (checkout)', *disparar(args.pedidos, args.tasa, args.concurrencia, notificar)))
+
+    if 'estado' in flujos:
+        if args.entrada == 'polling':
+            telegram_bot.iniciar_polling_background(app, intervalo=1)
+
+        def cambiar_estado(i, objetivo):
+            numero, message_id = numeros[i], 100000 + i
+            update = {'callback_query': {
+                'id': f'cb{i}', 'data': f'update_status|{numero}|en_camino',
+                'message': {'message_id': message_id, 'chat': {'id': int(CHAT_ID)}},
+            }}
+            if args.entrada == 'polling':
+                fake.encolar_update(update)
+            else:
+                with app.test_client() as client:
+                    client.post('/telegram/webhook', json=dict(update, update_id=i + 1))
+            t = fake.esperar_llamada(
+                lambda m, p, s: m == 'editMessageText' and p.get('message_id') == message_id and s == 200,
+                timeout=args.timeout)
+            return None if t is None else t - objetivo
+        resultados.append(resumir(f'estado ({args.entrada})', *disparar(args.pedidos, args.tasa, args.concurrencia, cambiar_estado)))
+        if args.entrada == 'polling':
+            telegram_bot.detener_polling_background()
+
+    salida = {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'resultados': resultados,
+        'telegram': fake.resumen(),
+    }
+    for r in resultados:
+        print(f"{r['flujo']:<24} n={r['n']:<5} err={r['errores']:<4} rps={r['throughput_rps']} "
+              f"p50={r['p50_ms']}ms p99={r['p99_ms']}ms max={r['max_ms']}ms")
+    print('Llamadas a la API falsa:', json.dumps(salida['telegram'], ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(salida, f, ensure_ascii=False, indent=2)
+    fake.detener()
+    return salida
+
+
+if __name__ == '__main__':
+    main()
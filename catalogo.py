@@ -0,0 +1,259 @@
+"""Versión y caché del catálogo (menú, categorías, opciones y disponibilidad por sucursal).
+
+El catálogo se cachea en memoria en dos partes:
+
+* Menú base (productos, opciones, categorías): se invalida con ``catalogo_version``.
+* Disponibilidad por sucursal: una partición por sucursal con su propia versión en
+  ``catalogo_particion``; marcar algo agotado en una sucursal solo recarga esa partición.
+
+Las versiones viven en la base, así que todos los workers ven el cambio. Se suben solas al hacer
+flush de cambios ORM en los modelos del menú (listener al final) y explícitamente en las
+operaciones masivas (menu_masivo.py, ``cambiar_disponibilidad``). Los catálogos abiertos
+preguntan por /catalogo/disponibilidad cada CATALOGO_REFRESCO_SEG con el ETag de las versiones.
+"""
+import hashlib
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+import metricas
+import presupuesto_sql
+from extensions import db, insert_con_conflicto
+
+_lock = threading.Lock()
+_menu = {'version': None, 'productos': [], 'categorias': []}
+_particiones = {}  # sucursal_id -> (version, frozenset(menuitem_ids disponibles))
+
+
+# --- Versiones ----------------------------------------------------------------
+
+def _incrementar(conexion, modelo, claves: dict, extra: dict | None = None):
+    """version += 1 (creando la fila si falta) con SQL directo; se puede usar dentro de un flush."""
+    tabla = modelo.__table__
+    extra = extra or {}
+    insert = insert_con_conflicto()
+    if insert is not None:
+        stmt = insert(tabla).values(**claves, version=1, **extra)
+        stmt = stmt.on_conflict_do_update(index_elements=list(claves),
+                                          set_={'version': tabla.c.version + 1, **extra})
+        conexion.execute(stmt)
+        return
+    condicion = [tabla.c[k] == v for k, v in claves.items()]
+    res = conexion.execute(tabla.update().where(*condicion).values(version=tabla.c.version + 1, **extra))
+    if res.rowcount == 0:
+        conexion.execute(tabla.insert().values(**claves, version=1, **extra))
+
+
+def version_actual() -> int:
+    from models import CatalogoVersion
+    fila = db.session.get(CatalogoVersion, 1)
+    return fila.version if fila else 0
+
+
+def incrementar_version() -> None:
+    """Sube la versión del menú base en la transacción en curso (no hace commit)."""
+    from models import CatalogoVersion
+    _incrementar(db.session.connection(), CatalogoVersion, {'id': 1}, {'actualizado': datetime.utcnow()})
+
+
+def incrementar_particiones(sucursal_ids) -> None:
+    """Sube la versión de disponibilidad de las sucursales dadas (no hace commit)."""
+    from models import CatalogoParticion
+    conexion = db.session.connection()
+    for sucursal_id in sorted(set(sucursal_ids)):
+        _incrementar(conexion, CatalogoParticion, {'sucursal_id': sucursal_id})
+
+
+def leer_versiones():
+    """(versión del menú, {sucursal_id: versión de su partición})."""
+    from models import CatalogoVersion, CatalogoParticion
+    fila = db.session.get(CatalogoVersion, 1)
+    particiones = dict(db.session.query(CatalogoParticion.sucursal_id, CatalogoParticion.version).all())
+    return (fila.version if fila else 0), particiones
+
+
+def etag_disponibilidad(versiones_particion, sucursal_id=None) -> str:
+    """Cambia solo cuando cambia la versión de alguna partición (o la de ``sucursal_id``)."""
+    if sucursal_id is not None:
+        return f'{sucursal_id}-{versiones_particion.get(sucursal_id, 0)}'
+    firma = ','.join(f'{s}:{v}' for s, v in sorted(versiones_particion.items()))
+    return hashlib.sha1(firma.encode()).hexdigest()[:16]
+
+
+# --- Caché --------------------------------------------------------------------
+
+def _imagen_url(imagen):
+    from flask import url_for
+    if not imagen:
+        return None
+    # Si ya es URL absoluta (http/https) la usamos tal cual
+    if imagen.startswith('http://') or imagen.startswith('https://'):
+        return imagen
+    filename = imagen.split('/static/uploads/')[-1].replace('uploads/', '')
+    return url_for('static', filename=f'uploads/{filename}')
+
+
+def _cargar_menu():
+    """Productos y categorías del catálogo con cuatro consultas (sin N+1)."""
+    from models import Categoria, MenuItem, OpcionPersonalizada, ValorOpcion
+    categorias = db.session.query(Categoria.id, Categoria.nombre).all()
+    nombres_cat = dict(categorias)
+    valores = {}
+    for v in db.session.query(ValorOpcion.id, ValorOpcion.opcion_id, ValorOpcion.texto, ValorOpcion.precio).order_by(ValorOpcion.id):
+        valores.setdefault(v.opcion_id, []).append({'id': v.id, 'nombre': v.texto, 'precio_adicional': v.precio or 0})
+    opciones = {}
+    for op in db.session.query(OpcionPersonalizada).order_by(OpcionPersonalizada.id):
+        opciones.setdefault(op.menuitem_id, []).append({
+            'id': op.id, 'nombre': op.titulo, 'descripcion': '', 'es_obligatoria': op.obligatorio,
+            'tipo': op.tipo, 'valores': valores.get(op.id, [])})
+    productos = []
+    conteo = {}
+    for p in db.session.query(MenuItem.id, MenuItem.nombre, MenuItem.imagen, MenuItem.descripcion,
+                              MenuItem.precio, MenuItem.categoria_id).order_by(MenuItem.id):
+        conteo[p.categoria_id] = conteo.get(p.categoria_id, 0) + 1
+        productos.append({
+            'id': p.id, 'nombre': p.nombre, 'imagen_url': _imagen_url(p.imagen), 'descripcion': p.descripcion,
+            'precio': p.precio, 'categoria_id': p.categoria_id,
+            'categoria_nombre': nombres_cat.get(p.categoria_id) or 'Sin categoría',
+            'opciones': opciones.get(p.id, []),
+        })
+    categorias_data = [{'id': cid, 'nombre': nombre, 'icono': '🍽️', 'productos_count': conteo.get(cid, 0)}
+                       for cid, nombre in categorias]
+    return productos, categorias_data
+
+
+def _cargar_particiones(sucursal_ids) -> dict:
+    """{sucursal_id: frozenset(ids disponibles)} de varias sucursales en una sola consulta."""
+    from models import MenuItemSucursal
+    ids = {s: set() for s in sucursal_ids}
+    for sucursal_id, menuitem_id in (db.session.query(MenuItemSucursal.sucursal_id, MenuItemSucursal.menuitem_id)
+                                     .filter(MenuItemSucursal.sucursal_id.in_(ids),
+                                             MenuItemSucursal.disponible.is_(True))):
+        ids[sucursal_id].add(menuitem_id)
+    return {s: frozenset(m) for s, m in ids.items()}
+
+
+def _sucursales_con_menu():
+    from models import MenuItemSucursal
+    return [s for (s,) in db.session.query(MenuItemSucursal.sucursal_id).distinct()]
+
+
+def disponibilidad(versiones=None) -> dict:
+    """{sucursal_id: frozenset(ids disponibles)}; solo recarga las particiones cuya versión cambió."""
+    if versiones is None:
+        _, versiones = leer_versiones()
+    with _lock:
+        conocidas = set(_particiones)
+    # Sucursales sin fila de versión todavía (datos previos a esta tabla) cuentan como versión 0
+    sucursales = set(versiones) | conocidas
+    if not conocidas:
+        with presupuesto_sql.recarga():
+            sucursales |= set(_sucursales_con_menu())
+    resultado, vencidas = {}, []
+    for sucursal_id in sucursales:
+        version = versiones.get(sucursal_id, 0)
+        with _lock:
+            entrada = _particiones.get(sucursal_id)
+        vigente = entrada is not None and entrada[0] == version
+        metricas.cache('catalogo_disponibilidad', vigente)
+        if vigente:
+            resultado[sucursal_id] = entrada[1]
+        else:
+            vencidas.append(sucursal_id)
+    # Las vencidas se recargan juntas: en frío serían una consulta por sucursal
+    if vencidas:
+        with presupuesto_sql.recarga():
+            cargadas = _cargar_particiones(vencidas)
+        with _lock:
+            for sucursal_id, ids in cargadas.items():
+                _particiones[sucursal_id] = (versiones.get(sucursal_id, 0), ids)
+        resultado.update(cargadas)
+    return resultado
+
+
+def catalogo() -> tuple:
+    """(productos, categorias) para la página de catálogo. Cada producto trae 'sucursales' (ids como str)."""
+    version, versiones = leer_versiones()
+    with _lock:
+        vigente = _menu['version'] == version
+        productos, categorias = _menu['productos'], _menu['categorias']
+    metricas.cache('catalogo_menu', vigente)
+    if not vigente:
+        with presupuesto_sql.recarga():
+            productos, categorias = _cargar_menu()
+        with _lock:
+            _menu.update(version=version, productos=productos, categorias=categorias)
+    disp = sorted(disponibilidad(versiones).items())
+    productos = [dict(p, sucursales=[str(sid) for sid, ids in disp if p['id'] in ids]) for p in productos]
+    return productos, categorias
+
+
+def limpiar_cache():
+    with _lock:
+        _menu.update(version=None, productos=[], categorias=[])
+        _particiones.clear()
+
+
+# --- Disponibilidad masiva ----------------------------------------------------
+
+def cambiar_disponibilidad(menuitem_ids, sucursal_ids, disponible: bool) -> int:
+    """Marca ``disponible`` para todos los pares (producto, sucursal) con un UPDATE por conjuntos.
+
+    Solo toca filas cuyo valor cambia; crea las que falten. Sube la versión de las particiones
+    afectadas y hace commit; los catálogos abiertos lo ven en su próxima consulta a
+    /catalogo/disponibilidad. Devuelve el número de pares cambiados.
+    """
+    from sqlalchemy import and_
+    from models import MenuItemSucursal
+    menuitem_ids, sucursal_ids = sorted(set(menuitem_ids)), sorted(set(sucursal_ids))
+    if not menuitem_ids or not sucursal_ids:
+        return 0
+    en_pares = and_(MenuItemSucursal.menuitem_id.in_(menuitem_ids), MenuItemSucursal.sucursal_id.in_(sucursal_ids))
+    distinto = MenuItemSucursal.disponible.isnot(disponible)
+    afectadas = {s for (s,) in db.session.query(MenuItemSucursal.sucursal_id).filter(en_pares, distinto).distinct()}
+    res = db.session.execute(
+        update(MenuItemSucursal).where(en_pares, distinto).values(disponible=disponible)
+        .execution_options(synchronize_session=False)
+    )
+    cambiados = res.rowcount or 0
+    existentes = set(db.session.query(MenuItemSucursal.menuitem_id, MenuItemSucursal.sucursal_id).filter(en_pares))
+    faltantes = [{'menuitem_id': m, 'sucursal_id': s, 'disponible': disponible}
+                 for m in menuitem_ids for s in sucursal_ids if (m, s) not in existentes]
+    if faltantes:
+        db.session.execute(MenuItemSucursal.__table__.insert(), faltantes)
+        cambiados += len(faltantes)
+        afectadas |= {f['sucursal_id'] for f in faltantes}
+    if afectadas:
+        incrementar_particiones(afectadas)
+    db.session.commit()
+    return cambiados
+
+
+
+# --- Invalidación automática en cambios ORM ---------------------------------------
+
+_MODELOS_MENU = ('MenuItem', 'Categoria', 'OpcionPersonalizada', 'ValorOpcion')
+
+
+@event.listens_for(Session, 'after_flush')
+def _versionar_cambios(session, flush_context):
+    menu = False
+    sucursales = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        nombre = type(obj).__name__
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        if nombre in _MODELOS_MENU:
+            menu = True
+        elif nombre == 'MenuItemSucursal' and obj.sucursal_id is not None:
+            sucursales.add(obj.sucursal_id)
+    if not menu and not sucursales:
+        return
+    from models import CatalogoVersion, CatalogoParticion
+    conexion = session.connection()
+    if menu:
+        _incrementar(conexion, CatalogoVersion, {'id': 1}, {'actualizado': datetime.utcnow()})
+    for sucursal_id in sorted(sucursales):
+        _incrementar(conexion, CatalogoParticion, {'sucursal_id': sucursal_id})
@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+import pytest
+
+# Base de datos aislada para las pruebas: debe definirse antes de importar app
+_tmp_dir = tempfile.mkdtemp(prefix='pozoleria_test_')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_tmp_dir, 'test.db'))
+os.environ.setdefault('TELEGRAM_AUTO_WEBHOOK', '0')
+# Una ruta que se pase de su presupuesto de sentencias SQL hace fallar la prueba (presupuesto_sql.py)
+os.environ.setdefault('SQL_PRESUPUESTO', 'error')
+
+
+@pytest.fixture(scope='session')
+def crear_app(tmp_path_factory):
+    """Fábrica de apps con base propia: SQLite temporal nueva (o ``uri``) más ``config``.
+
+    Los pools se cierran al final de la sesión; sirve también a fixtures de módulo.
+    """
+    creadas = []
+
+    def crear(uri=None, **config):
+        import app as modulo
+        uri = uri or f"sqlite:///{tmp_path_factory.mktemp('app') / 'app.db'}"
+        nueva = modulo.create_app({'SQLALCHEMY_DATABASE_URI': uri, 'INICIAR_HILOS': False, **config})
+        creadas.append(nueva)
+        return nueva
+
+    yield crear
+    from extensions import db
+    for nueva in creadas:
+        with nueva.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def config_app():
+    """Config extra de la fixture ``app``; un módulo la redefine si necesita otra."""
+    return {}
+
+
+@pytest.fixture
+def app(crear_app, config_app):
+    """App de la fábrica con base vacía (migrada), una por prueba."""
+    return crear_app(**config_app)
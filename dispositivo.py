@@ -0,0 +1,85 @@
+"""Clasificación de dispositivo (móvil/escritorio) y registro de variantes de templates.
+
+* ``clase_dispositivo(user_agent)``: una sola expresión regular, con caché LRU por User-Agent
+  (los navegadores reales repiten pocos UA distintos).
+* Las respuestas que dependen del dispositivo llevan ``Vary: User-Agent`` para que ningún proxy/CDN
+  sirva la versión móvil a escritorio o al revés.
+* ``plantilla(base)``: resuelve ``base_mobile.html`` / ``base_desktop.html`` / ``base.html`` desde un
+  registro armado al arrancar (sin ``os.path.isfile`` por request).
+"""
+import os
+import re
+from functools import lru_cache
+
+from flask import current_app, g, request
+
+CACHE_MAX = int(os.getenv('DISPOSITIVO_CACHE_MAX', '2048'))
+UA_MAX = 512  # Más allá no aporta para clasificar y evita llaves enormes en la caché
+
+MOVIL = 'mobile'
+ESCRITORIO = 'desktop'
+
+_PATRON_MOVIL = re.compile(
+    r'mobile|android|iphone|ipad|ipod|blackberry|windows phone|webos|nokia|opera mini|palm|iemobile|wpdesktop')
+
+
+@lru_cache(maxsize=CACHE_MAX)
+def _clasificar(user_agent: str) -> str:
+    return MOVIL if _PATRON_MOVIL.search(user_agent.lower()) else ESCRITORIO
+
+
+def clase_dispositivo(user_agent: str | None) -> str:
+    return _clasificar((user_agent or '')[:UA_MAX])
+
+
+def dispositivo_actual() -> str:
+    """Clase del request en curso; marca la respuesta para llevar ``Vary: User-Agent``."""
+    g._varia_por_dispositivo = True
+    return clase_dispositivo(request.headers.get('User-Agent'))
+
+
+def es_movil() -> bool:
+    return dispositivo_actual() == MOVIL
+
+
+# --- Registro de variantes ----------------------------------------------------------
+
+def _registrar_variantes(app) -> dict:
+    """{base: {'mobile': nombre, 'desktop': nombre, 'generic': nombre}} para todos los templates."""
+    registro = {}
+    for nombre in app.jinja_env.list_templates(extensions=['html']):
+        raiz = nombre[:-len('.html')]
+        for sufijo, clase in (('_mobile', MOVIL), ('_desktop', ESCRITORIO)):
+            if raiz.endswith(sufijo):
+                registro.setdefault(raiz[:-len(sufijo)], {})[clase] = nombre
+                break
+        else:
+            registro.setdefault(raiz, {})['generic'] = nombre
+    return registro
+
+
+def _registro():
+    app = current_app._get_current_object()
+    registro = app.extensions.get('dispositivo')
+    if registro is None or app.debug:  # En desarrollo se releen los templates nuevos
+        registro = app.extensions['dispositivo'] = _registrar_variantes(app)
+    return registro
+
+
+def plantilla(base: str) -> str:
+    """Template para el dispositivo del request: variante propia, luego escritorio, móvil y genérico."""
+    variantes = _registro().get(base, {})
+    clase = dispositivo_actual()
+    otra = ESCRITORIO if clase == MOVIL else MOVIL
+    return variantes.get(clase) or variantes.get(ESCRITORIO) or variantes.get(otra) \
+        or variantes.get('generic') or f'{base}.html'
+
+
+def init_app(app):
+    app.extensions['dispositivo'] = _registrar_variantes(app)
+
+    @app.after_request
+    def _vary_user_agent(response):
+        if g.get('_varia_por_dispositivo'):
+            response.vary.add('User-Agent')
+        return response
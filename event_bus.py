@@ -1,14 +1,19 @@
 import time
 import json
+import logging
 from queue import Queue, Empty
 from threading import Lock
 
+import metricas
+
 # Diccionario: numero_pedido -> set/list de colas de subscriptores
 _subs = {}
 _lock = Lock()
 
 HEARTBEAT_INTERVAL = 25  # segundos
 
+log = logging.getLogger(__name__)
+
 
 def subscribe_pedido(numero_pedido: str) -> Queue:
     q = Queue()
@@ -38,10 +43,8 @@ def broadcast_pedido_estado(numero_pedido: str, estado: str, extra: dict | None
             except Exception:
                 # Si la cola está llena o error, ignorar y continuar
                 pass
-    try:
-        print(f"[SSE] Broadcast -> Pedido {numero_pedido} Estado {estado} Subs={len(_subs.get(numero_pedido, []))}")
-    except Exception:
-        pass
+        subs = len(_subs.get(numero_pedido, []))
+    log.debug('Broadcast pedido %s estado %s a %d suscriptores', numero_pedido, estado, subs)
 
 
 def sse_stream(numero_pedido: str):
@@ -61,3 +64,16 @@ def sse_stream(numero_pedido: str):
             yield f'data: {msg}\n\n'
     finally:
         unsubscribe_pedido(numero_pedido, q)
+
+
+SUSCRIPTORES = metricas.medidor('sse_suscriptores', 'Conexiones SSE abiertas', ('tipo',))
+EN_COLA = metricas.medidor('sse_mensajes_en_cola', 'Mensajes esperando en colas SSE', ('tipo',))
+
+
+@metricas.al_leer
+def _medir_colas():
+    with _lock:
+        suscriptores = sum(len(colas) for colas in _subs.values())
+        en_cola = sum(q.qsize() for colas in _subs.values() for q in colas)
+    SUSCRIPTORES.set(suscriptores, tipo='pedido')
+    EN_COLA.set(en_cola, tipo='pedido')
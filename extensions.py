@@ -1,3 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from replica import SesionRuteada
+
+# Las lecturas de vistas @solo_lectura pueden ir a una réplica (replica.py)
+db = SQLAlchemy(session_options={'class_': SesionRuteada})
+
+
+def insert_con_conflicto():
+    """Construct `insert` del dialecto activo con soporte ON CONFLICT (SQLite/Postgres) o None si no lo hay."""
+    nombre = db.engine.dialect.name
+    if nombre == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif nombre == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
@@ -0,0 +1,36 @@
+"""Configuración de gunicorn (Procfile / render.yaml).
+
+Con preload la app se crea una sola vez en el master. Ahí se precalienta el estado inmutable:
+templates compilados, snapshot del catálogo e índice de horarios. Los workers lo heredan por
+copy-on-write. Cada worker rehace su pool de conexiones y sus hilos en post_fork.
+GUNICORN_PRELOAD=0 vuelve al modo anterior (cada worker importa la app).
+"""
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '3'))
+timeout = 120
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Los hilos de fondo (polling de Telegram) no sobreviven al fork: se arrancan en post_fork
+os.environ['APP_INICIAR_HILOS'] = '0'
+
+# Directorio donde cada worker vuelca sus métricas; /metrics suma todos (ver metricas.py)
+os.environ.setdefault('METRICAS_DIR', os.path.join(tempfile.gettempdir(), f'pozoleria_metricas_{os.getpid()}'))
+
+
+def on_starting(server):
+    import metricas
+    metricas.limpiar_directorio(os.environ['METRICAS_DIR'])
+
+
+def when_ready(server):
+    if preload_app:
+        import app as modulo
+        modulo.precalentar(modulo.app)
+
+
+def post_fork(server, worker):
+    import app as modulo
+    modulo.al_iniciar_worker(modulo.app)
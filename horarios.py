@@ -0,0 +1,98 @@
+"""Índice en memoria de horarios: {sucursal_id: {dia_semana: (apertura, cierre, cerrado)}}.
+
+Se arma con una sola consulta y reemplaza la consulta por sucursal de
+``HorarioSucursal.sucursal_abierta_ahora``. Se renueva cada HORARIOS_TTL_SEG (cambios hechos en
+otros workers) y al instante cuando este proceso guarda horarios. Con gunicorn --preload se
+construye en el master y los workers lo heredan.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import metricas
+import presupuesto_sql
+from extensions import db
+
+TTL_SEG = float(os.getenv('HORARIOS_TTL_SEG', '60'))
+ZONA = 'America/Mexico_City'
+
+_lock = threading.Lock()
+_estado = {'expira': 0.0, 'indice': None}
+
+
+def indice() -> dict:
+    ahora = time.monotonic()
+    with _lock:
+        vigente = _estado['indice'] is not None and _estado['expira'] > ahora
+        indice_actual = _estado['indice']
+    metricas.cache('horarios', vigente)
+    if vigente:
+        return indice_actual
+    from models import HorarioSucursal
+    nuevo = {}
+    with presupuesto_sql.recarga():
+        filas = db.session.query(HorarioSucursal.sucursal_id, HorarioSucursal.dia_semana, HorarioSucursal.hora_apertura,
+                                 HorarioSucursal.hora_cierre, HorarioSucursal.cerrado).order_by(HorarioSucursal.id).all()
+    for h in filas:
+        # Igual que el .first() anterior: si hay duplicados del mismo día gana el primero
+        nuevo.setdefault(h.sucursal_id, {}).setdefault(h.dia_semana, (h.hora_apertura, h.hora_cierre, bool(h.cerrado)))
+    with _lock:
+        _estado.update(expira=ahora + TTL_SEG, indice=nuevo)
+    return nuevo
+
+
+DIAS = ('Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo')
+
+
+def textos(sucursal_id) -> list:
+    """Horarios de la sucursal para mostrar (``Lunes: 09:00 - 18:00``), del índice y sin consultar la base."""
+    lineas = []
+    for dia, (apertura, cierre, cerrado) in sorted(indice().get(sucursal_id, {}).items()):
+        if cerrado:
+            lineas.append(f'{DIAS[dia]}: Cerrado')
+        else:
+            lineas.append(f"{DIAS[dia]}: {apertura.strftime('%H:%M')} - {cierre.strftime('%H:%M')}")
+    return lineas
+
+
+def invalidar():
+    with _lock:
+        _estado.update(expira=0.0, indice=None)
+
+
+def abierta_ahora(sucursal_id, ahora=None) -> bool:
+    """True si la sucursal está abierta en este momento (hora de Ciudad de México)."""
+    if ahora is None:
+        from datetime import datetime
+        import pytz
+        ahora = datetime.now(pytz.timezone(ZONA))
+    horario = indice().get(sucursal_id, {}).get(ahora.weekday())
+    if not horario:
+        return False
+    apertura, cierre, cerrado = horario
+    if cerrado or not apertura or not cierre:
+        return False
+    return apertura <= ahora.time() <= cierre
+
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_cambios(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(obj).__name__ == 'HorarioSucursal':
+            session.info['horarios_cambiaron'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_tras_commit(session):
+    # Tras el commit: si se invalidara en el flush, otro request podría releer los datos viejos
+    if session.info.pop('horarios_cambiaron', False):
+        invalidar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca(session):
+    session.info.pop('horarios_cambiaron', None)
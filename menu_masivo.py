@@ -0,0 +1,326 @@
+"""Importación y exportación masiva del menú en JSON.
+
+Formato (``formato`` = 1)::
+
+    {
+      "formato": 1,
+      "categorias": ["Pozoles", "Bebidas"],
+      "productos": [
+        {"nombre": "Pozole rojo", "descripcion": "...", "precio": 120.0, "imagen": "rojo.jpg",
+         "categoria": "Pozoles",
+         "sucursales": {"Centro": true, "Norte": false},
+         "opciones": [{"titulo": "Tamaño", "tipo": "radio", "obligatorio": true,
+                       "valores": [{"texto": "Chico", "precio": 0}, {"texto": "Grande", "precio": 30}]}]}
+      ]
+    }
+
+Productos, categorías y sucursales se identifican por nombre. Lo que no viene en el archivo no se
+borra. Si un producto trae ``opciones`` se reemplazan completas cuando difieren; si no trae
+``sucursales`` su disponibilidad no se toca (los productos nuevos quedan disponibles en todas).
+
+La importación calcula primero el diff (sirve como simulación) y luego aplica todo con sentencias
+por conjuntos (INSERT/UPDATE/UPSERT de muchas filas) en una sola transacción, con un único
+incremento de la versión del catálogo al final.
+"""
+import math
+
+from extensions import db, insert_con_conflicto
+
+FORMATO = 1
+CAMPOS_PRODUCTO = ('descripcion', 'precio', 'imagen', 'categoria')
+
+
+class ErrorImportacion(ValueError):
+    """El archivo de menú no es válido; el mensaje es apto para mostrar al admin."""
+
+
+# --- Exportación --------------------------------------------------------------
+
+def exportar_menu() -> dict:
+    """Menú completo en el formato de importación (cinco consultas, sin N+1)."""
+    from models import Categoria, Sucursal, MenuItem, MenuItemSucursal, OpcionPersonalizada, ValorOpcion
+    categorias = dict(db.session.query(Categoria.id, Categoria.nombre).order_by(Categoria.nombre).all())
+    sucursales = dict(db.session.query(Sucursal.id, Sucursal.nombre).all())
+
+    disponibilidad = {}
+    for menuitem_id, sucursal_id, disponible in db.session.query(
+            MenuItemSucursal.menuitem_id, MenuItemSucursal.sucursal_id, MenuItemSucursal.disponible):
+        if sucursal_id in sucursales:
+            disponibilidad.setdefault(menuitem_id, {})[sucursales[sucursal_id]] = bool(disponible)
+
+    valores = {}
+    for opcion_id, texto, precio in db.session.query(
+            ValorOpcion.opcion_id, ValorOpcion.texto, ValorOpcion.precio).order_by(ValorOpcion.id):
+        valores.setdefault(opcion_id, []).append({'texto': texto, 'precio': float(precio or 0)})
+    opciones = {}
+    for op in db.session.query(OpcionPersonalizada.id, OpcionPersonalizada.menuitem_id, OpcionPersonalizada.titulo,
+                               OpcionPersonalizada.tipo, OpcionPersonalizada.obligatorio).order_by(OpcionPersonalizada.id):
+        opciones.setdefault(op.menuitem_id, []).append({
+            'titulo': op.titulo, 'tipo': op.tipo or 'radio', 'obligatorio': bool(op.obligatorio),
+            'valores': valores.get(op.id, [])})
+
+    productos = []
+    for p in db.session.query(MenuItem.id, MenuItem.nombre, MenuItem.descripcion, MenuItem.precio,
+                              MenuItem.imagen, MenuItem.categoria_id).order_by(MenuItem.id):
+        productos.append({
+            'nombre': p.nombre, 'descripcion': p.descripcion or '', 'precio': float(p.precio or 0),
+            'imagen': p.imagen or '', 'categoria': categorias.get(p.categoria_id),
+            'sucursales': disponibilidad.get(p.id, {}), 'opciones': opciones.get(p.id, []),
+        })
+    return {'formato': FORMATO, 'categorias': sorted(categorias.values()), 'productos': productos}
+
+
+# --- Validación ---------------------------------------------------------------
+
+def _lista(valor, donde):
+    if valor is None:
+        return []
+    if not isinstance(valor, list):
+        raise ErrorImportacion(f'{donde}: se esperaba una lista')
+    return valor
+
+
+def _objeto(valor, donde):
+    if not isinstance(valor, dict):
+        raise ErrorImportacion(f'{donde}: se esperaba un objeto')
+    return valor
+
+
+def _precio(valor, donde):
+    try:
+        precio = round(float(valor), 2)
+    except (TypeError, ValueError):
+        precio = None
+    if precio is None or not math.isfinite(precio):  # json.load acepta NaN e Infinity
+        raise ErrorImportacion(f'{donde}: precio inválido')
+    return precio
+
+
+def _normalizar_opciones(opciones, nombre):
+    salida = []
+    for op in _lista(opciones, f'Producto "{nombre}", opciones'):
+        op = _objeto(op, f'Producto "{nombre}", opción')
+        titulo = str(op.get('titulo') or '').strip()
+        if not titulo:
+            raise ErrorImportacion(f'Producto "{nombre}": opción sin título')
+        tipo = op.get('tipo') or 'radio'
+        if tipo not in ('radio', 'checkbox'):
+            raise ErrorImportacion(f'Producto "{nombre}": tipo de opción inválido "{tipo}"')
+        valores = []
+        for v in _lista(op.get('valores'), f'Producto "{nombre}", opción "{titulo}"'):
+            v = _objeto(v, f'Producto "{nombre}", opción "{titulo}"')
+            texto = str(v.get('texto') or '').strip()
+            if texto:
+                valores.append((texto[:100], _precio(v.get('precio') or 0, f'Producto "{nombre}", valor "{texto}"')))
+        salida.append((titulo[:100], tipo, bool(op.get('obligatorio')), tuple(valores)))
+    return tuple(salida)
+
+
+def _normalizar(datos, sucursales_por_nombre):
+    if not isinstance(datos, dict) or datos.get('formato', FORMATO) != FORMATO:
+        raise ErrorImportacion('Formato de menú no reconocido')
+    productos = {}
+    for i, p in enumerate(_lista(datos.get('productos'), 'productos'), start=1):
+        p = _objeto(p, f'Producto #{i}')
+        nombre = str(p.get('nombre') or '').strip()[:100]
+        if not nombre:
+            raise ErrorImportacion(f'Producto #{i} sin nombre')
+        if nombre in productos:
+            raise ErrorImportacion(f'Producto "{nombre}" repetido en el archivo')
+        precio = _precio(p.get('precio'), f'Producto "{nombre}"')
+        disponibilidad = None
+        if 'sucursales' in p:
+            disponibilidad = {}
+            for suc, disponible in _objeto(p.get('sucursales') or {}, f'Producto "{nombre}", sucursales').items():
+                if suc not in sucursales_por_nombre:
+                    raise ErrorImportacion(f'Producto "{nombre}": sucursal desconocida "{suc}"')
+                disponibilidad[sucursales_por_nombre[suc]] = bool(disponible)
+        productos[nombre] = {
+            'descripcion': str(p.get('descripcion') or '')[:200],
+            'precio': precio,
+            'imagen': str(p.get('imagen') or '')[:200],
+            'categoria': (str(p['categoria']).strip()[:100] or None) if p.get('categoria') else None,
+            'sucursales': disponibilidad,
+            'opciones': _normalizar_opciones(p.get('opciones'), nombre) if 'opciones' in p else None,
+        }
+    categorias = {str(c).strip()[:100] for c in _lista(datos.get('categorias'), 'categorias') if str(c).strip()}
+    categorias |= {p['categoria'] for p in productos.values() if p['categoria']}
+    return categorias, productos
+
+
+# --- Diff ---------------------------------------------------------------------
+
+def _estado_actual(nombres):
+    """Lee de una vez lo que existe para los productos del archivo."""
+    from models import Categoria, Sucursal, MenuItem, MenuItemSucursal, OpcionPersonalizada, ValorOpcion
+    categorias = dict(db.session.query(Categoria.nombre, Categoria.id).all())
+    nombres_categoria = {v: k for k, v in categorias.items()}
+    existentes = {}
+    for p in (db.session.query(MenuItem.id, MenuItem.nombre, MenuItem.descripcion, MenuItem.precio,
+                               MenuItem.imagen, MenuItem.categoria_id)
+              .filter(MenuItem.nombre.in_(nombres)).order_by(MenuItem.id.desc())):
+        # Con nombres repetidos en la base gana el de menor id
+        existentes[p.nombre] = {
+            'id': p.id, 'descripcion': p.descripcion or '', 'precio': round(float(p.precio or 0), 2),
+            'imagen': p.imagen or '', 'categoria': nombres_categoria.get(p.categoria_id)}
+    ids = [e['id'] for e in existentes.values()]
+    disponibilidad = {}
+    opciones = {}
+    if ids:
+        for menuitem_id, sucursal_id, disponible in db.session.query(
+                MenuItemSucursal.menuitem_id, MenuItemSucursal.sucursal_id, MenuItemSucursal.disponible
+        ).filter(MenuItemSucursal.menuitem_id.in_(ids)):
+            disponibilidad[(menuitem_id, sucursal_id)] = bool(disponible)
+        valores = {}
+        for opcion_id, texto, precio in (db.session.query(ValorOpcion.opcion_id, ValorOpcion.texto, ValorOpcion.precio)
+                                         .join(OpcionPersonalizada, OpcionPersonalizada.id == ValorOpcion.opcion_id)
+                                         .filter(OpcionPersonalizada.menuitem_id.in_(ids)).order_by(ValorOpcion.id)):
+            valores.setdefault(opcion_id, []).append((texto or '', round(float(precio or 0), 2)))
+        for op in (db.session.query(OpcionPersonalizada.id, OpcionPersonalizada.menuitem_id, OpcionPersonalizada.titulo,
+                                    OpcionPersonalizada.tipo, OpcionPersonalizada.obligatorio)
+                   .filter(OpcionPersonalizada.menuitem_id.in_(ids)).order_by(OpcionPersonalizada.id)):
+            opciones.setdefault(op.menuitem_id, []).append(
+                (op.titulo or '', op.tipo or 'radio', bool(op.obligatorio), tuple(valores.get(op.id, []))))
+    sucursal_ids = [s for (s,) in db.session.query(Sucursal.id)]
+    return categorias, existentes, disponibilidad, {k: tuple(v) for k, v in opciones.items()}, sucursal_ids
+
+
+def calcular_diff(datos) -> dict:
+    """Compara el archivo con la base. Devuelve el plan (con resumen legible en 'resumen')."""
+    from models import Sucursal
+    sucursales_por_nombre = dict(db.session.query(Sucursal.nombre, Sucursal.id).all())
+    categorias, productos = _normalizar(datos, sucursales_por_nombre)
+    cat_actuales, existentes, disponibilidad, opciones, sucursal_ids = _estado_actual(list(productos))
+
+    plan = {'categorias_nuevas': sorted(categorias - set(cat_actuales)), 'insertar': [], 'actualizar': [],
+            'disponibilidad': [], 'opciones': [], 'productos': productos}
+    resumen = {'categorias_nuevas': plan['categorias_nuevas'], 'productos_nuevos': [],
+               'productos_modificados': {}, 'opciones_reemplazadas': [], 'cambios_disponibilidad': 0,
+               'sin_cambios': 0}
+    for nombre, p in productos.items():
+        actual = existentes.get(nombre)
+        if actual is None:
+            plan['insertar'].append(nombre)
+            resumen['productos_nuevos'].append(nombre)
+            continue
+        campos = [c for c in CAMPOS_PRODUCTO if p[c] != actual[c]]
+        if campos:
+            plan['actualizar'].append((actual['id'], nombre, campos))
+            resumen['productos_modificados'][nombre] = campos
+        cambios_disp = [(actual['id'], sid, disp) for sid, disp in (p['sucursales'] or {}).items()
+                        if disponibilidad.get((actual['id'], sid)) != disp]
+        plan['disponibilidad'].extend(cambios_disp)
+        resumen['cambios_disponibilidad'] += len(cambios_disp)
+        if p['opciones'] is not None and p['opciones'] != opciones.get(actual['id'], ()):
+            plan['opciones'].append((actual['id'], nombre))
+            resumen['opciones_reemplazadas'].append(nombre)
+        if not campos and not cambios_disp and (actual['id'], nombre) not in plan['opciones']:
+            resumen['sin_cambios'] += 1
+    plan['sucursal_ids'] = sucursal_ids
+    plan['resumen'] = resumen
+    return plan
+
+
+def _hay_cambios(plan) -> bool:
+    return any(plan[k] for k in ('categorias_nuevas', 'insertar', 'actualizar', 'disponibilidad', 'opciones'))
+
+
+# --- Aplicación ---------------------------------------------------------------
+
+def _upsert_disponibilidad(filas):
+    from sqlalchemy import delete, tuple_
+    from models import MenuItemSucursal
+    if not filas:
+        return
+    tabla = MenuItemSucursal.__table__
+    insert = insert_con_conflicto()
+    if insert is not None:
+        stmt = insert(tabla)
+        stmt = stmt.on_conflict_do_update(index_elements=['menuitem_id', 'sucursal_id'],
+                                          set_={'disponible': stmt.excluded.disponible})
+        db.session.execute(stmt, filas)
+        return
+    claves = [(f['menuitem_id'], f['sucursal_id']) for f in filas]
+    db.session.execute(delete(MenuItemSucursal).where(
+        tuple_(MenuItemSucursal.menuitem_id, MenuItemSucursal.sucursal_id).in_(claves)))
+    db.session.execute(tabla.insert(), filas)
+
+
+def _aplicar(plan):
+    from sqlalchemy import insert, update, delete, select
+    from models import Categoria, MenuItem, OpcionPersonalizada, ValorOpcion
+    import catalogo
+    productos = plan['productos']
+
+    if plan['categorias_nuevas']:
+        db.session.execute(insert(Categoria), [{'nombre': n} for n in plan['categorias_nuevas']])
+    categorias = dict(db.session.query(Categoria.nombre, Categoria.id).all())
+
+    # Productos nuevos: un INSERT de muchas filas que devuelve los ids en el mismo orden
+    ids_nuevos = {}
+    if plan['insertar']:
+        filas = [{'nombre': n, 'descripcion': productos[n]['descripcion'], 'precio': productos[n]['precio'],
+                  'imagen': productos[n]['imagen'], 'categoria_id': categorias.get(productos[n]['categoria'])}
+                 for n in plan['insertar']]
+        ids = db.session.scalars(insert(MenuItem).returning(MenuItem.id, sort_by_parameter_order=True), filas).all()
+        ids_nuevos = dict(zip(plan['insertar'], ids))
+
+    # Productos modificados: UPDATE por clave primaria agrupado por conjunto de columnas
+    por_columnas = {}
+    for menuitem_id, nombre, campos in plan['actualizar']:
+        fila = {'id': menuitem_id}
+        for campo in campos:
+            if campo == 'categoria':
+                fila['categoria_id'] = categorias.get(productos[nombre]['categoria'])
+            else:
+                fila[campo] = productos[nombre][campo]
+        por_columnas.setdefault(tuple(sorted(fila)), []).append(fila)
+    for filas in por_columnas.values():
+        db.session.execute(update(MenuItem), filas)
+
+    disponibilidad = [{'menuitem_id': m, 'sucursal_id': s, 'disponible': d} for m, s, d in plan['disponibilidad']]
+    for nombre, menuitem_id in ids_nuevos.items():
+        propia = productos[nombre]['sucursales'] or {}
+        disponibilidad.extend({'menuitem_id': menuitem_id, 'sucursal_id': sid, 'disponible': propia.get(sid, True)}
+                              for sid in plan['sucursal_ids'])
+    _upsert_disponibilidad(disponibilidad)
+
+    # Opciones: borrar las de productos que cambian y reinsertar todo en bloque
+    reemplazar = [m for m, _ in plan['opciones']]
+    if reemplazar:
+        ids_opciones = select(OpcionPersonalizada.id).where(OpcionPersonalizada.menuitem_id.in_(reemplazar))
+        db.session.execute(delete(ValorOpcion).where(ValorOpcion.opcion_id.in_(ids_opciones)))
+        db.session.execute(delete(OpcionPersonalizada).where(OpcionPersonalizada.menuitem_id.in_(reemplazar)))
+    destino = [(m, n) for m, n in plan['opciones']] + [(m, n) for n, m in ids_nuevos.items()]
+    filas_op, valores_por_op = [], []
+    for menuitem_id, nombre in destino:
+        for titulo, tipo, obligatorio, valores in productos[nombre]['opciones'] or ():
+            filas_op.append({'menuitem_id': menuitem_id, 'titulo': titulo, 'tipo': tipo, 'obligatorio': obligatorio})
+            valores_por_op.append(valores)
+    if filas_op:
+        ids_op = db.session.scalars(
+            insert(OpcionPersonalizada).returning(OpcionPersonalizada.id, sort_by_parameter_order=True), filas_op).all()
+        filas_val = [{'opcion_id': op_id, 'texto': texto, 'precio': precio}
+                     for op_id, valores in zip(ids_op, valores_por_op) for texto, precio in valores]
+        if filas_val:
+            db.session.execute(insert(ValorOpcion), filas_val)
+
+    catalogo.incrementar_version()
+    if disponibilidad:
+        catalogo.incrementar_particiones(f['sucursal_id'] for f in disponibilidad)
+
+
+def importar_menu(datos, simular: bool = False) -> dict:
+    """Importa el menú. Con ``simular`` solo devuelve el diff. Devuelve el resumen de cambios."""
+    plan = calcular_diff(datos)
+    resumen = dict(plan['resumen'], aplicado=False)
+    if simular or not _hay_cambios(plan):
+        return resumen
+    try:
+        _aplicar(plan)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    resumen['aplicado'] = True
+    return resumen
@@ -0,0 +1,354 @@
+"""Métricas del proceso: contadores, medidores e histogramas con etiquetas, sin dependencias.
+
+Cada módulo declara las suyas al importarse (``metricas.contador(...)``, ``metricas.histograma(...)``)
+y las actualiza en caliente con ``inc``/``observar``, que solo toman un lock y suman.
+``instantanea()`` devuelve todo como dict: primero corre los recolectores registrados con
+``al_leer``, que llenan medidores que conviene calcular solo al leer (conexiones en uso, por
+ejemplo). Se expone en /health/metricas (JSON, este worker).
+
+/metrics las da en formato de texto de Prometheus. Con varios workers de gunicorn cada uno vuelca
+sus valores cada METRICAS_INTERVALO_SEG a ``METRICAS_DIR/<pid>.json`` (gunicorn.conf.py lo define).
+El worker que atiende /metrics suma contadores e histogramas de todos los archivos, incluidos los
+de workers ya muertos, para que los totales no retrocedan. Los medidores salen por worker (etiqueta
+``pid``), solo de los procesos vivos.
+"""
+import atexit
+import bisect
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+DIRECTORIO = os.getenv('METRICAS_DIR')
+INTERVALO_SEG = float(os.getenv('METRICAS_INTERVALO_SEG', '5'))
+
+# Buckets por defecto (segundos): de 1 ms a 10 s
+BUCKETS_SEG = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger(__name__)
+_lock = threading.Lock()
+_registro = {}
+_recolectores = []
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def _clave(self, etiquetas) -> tuple:
+        return tuple(str(etiquetas.get(e, '')) for e in self.etiquetas)
+
+    def valores(self) -> list:
+        with self._lock:
+            return [(dict(zip(self.etiquetas, clave)), self._copiar(v)) for clave, v in self._valores.items()]
+
+    def _copiar(self, valor):
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._valores.clear()
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+
+class Medidor(_Metrica):
+    tipo = 'gauge'
+
+    def set(self, valor, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def dec(self, cantidad=1, **etiquetas):
+        self.inc(-cantidad, **etiquetas)
+
+
+class Histograma(_Metrica):
+    """Conteos por bucket (no acumulados), suma y total de observaciones por combinación de etiquetas."""
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEG):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            estado = self._valores.get(clave)
+            if estado is None:
+                estado = self._valores[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            estado[0][i] += 1
+            estado[1] += valor
+            estado[2] += 1
+
+    def _copiar(self, estado):
+        return {'buckets': list(estado[0]), 'suma': estado[1], 'total': estado[2]}
+
+
+def _registrar(clase, nombre, ayuda, etiquetas=(), **opciones):
+    with _lock:
+        metrica = _registro.get(nombre)
+        if metrica is None:
+            metrica = _registro[nombre] = clase(nombre, ayuda, etiquetas, **opciones)
+        return metrica
+
+
+def contador(nombre, ayuda, etiquetas=()) -> Contador:
+    return _registrar(Contador, nombre, ayuda, etiquetas)
+
+
+def medidor(nombre, ayuda, etiquetas=()) -> Medidor:
+    return _registrar(Medidor, nombre, ayuda, etiquetas)
+
+
+def histograma(nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEG) -> Histograma:
+    return _registrar(Histograma, nombre, ayuda, etiquetas, buckets=buckets)
+
+
+def reiniciar():
+    """Pone todo en cero (post_fork: lo que midió el master al precalentar no es de este worker)."""
+    with _lock:
+        for m in _registro.values():
+            m.limpiar()
+
+
+def al_leer(funcion):
+    """Registra un recolector que se corre antes de cada lectura (puede usarse como decorador)."""
+    with _lock:
+        _recolectores.append(funcion)
+    return funcion
+
+
+def metricas() -> list:
+    for funcion in list(_recolectores):
+        try:
+            funcion()
+        except Exception as e:
+            log.warning('Error en recolector %s: %s', getattr(funcion, '__name__', funcion), e)
+    with _lock:
+        return list(_registro.values())
+
+
+def instantanea() -> dict:
+    resultado = {'pid': os.getpid()}
+    for m in metricas():
+        datos = {'tipo': m.tipo, 'ayuda': m.ayuda, 'valores': [dict(etiquetas=e, valor=v) for e, v in m.valores()]}
+        if isinstance(m, Histograma):
+            datos['buckets'] = list(m.buckets)
+        resultado[m.nombre] = datos
+    return resultado
+
+
+def autorizado(request) -> bool:
+    """Con METRICAS_TOKEN definido, exige ``Authorization: Bearer <token>`` o ``?token=``."""
+    token = os.getenv('METRICAS_TOKEN')
+    if not token:
+        return True
+    enviado = request.headers.get('Authorization', '').removeprefix('Bearer ').strip() or request.args.get('token')
+    return bool(enviado) and hmac.compare_digest(enviado, token)
+
+
+# --- Varios procesos (directorio compartido) --------------------------------------------------
+
+def _exportar() -> dict:
+    datos = {}
+    for m in metricas():
+        datos[m.nombre] = {'tipo': m.tipo, 'ayuda': m.ayuda, 'etiquetas': list(m.etiquetas),
+                           'buckets': list(getattr(m, 'buckets', ())),
+                           'valores': [[[e[k] for k in m.etiquetas], v] for e, v in m.valores()]}
+    return datos
+
+
+def volcar(directorio=None):
+    """Escribe los valores de este proceso en ``<directorio>/<pid>.json`` (reemplazo atómico)."""
+    directorio = directorio or DIRECTORIO
+    if not directorio:
+        return
+    os.makedirs(directorio, exist_ok=True)
+    destino = os.path.join(directorio, f'{os.getpid()}.json')
+    temporal = f'{destino}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(_exportar(), f)
+    os.replace(temporal, destino)
+
+
+def limpiar_directorio(directorio=None):
+    """Al arrancar el master: descarta lo que dejaron corridas anteriores."""
+    directorio = directorio or DIRECTORIO
+    if directorio and os.path.isdir(directorio):
+        for ruta in glob.glob(os.path.join(directorio, '*.json*')):
+            os.remove(ruta)
+
+
+_volcado = {'hilo': None}
+
+
+def iniciar_volcado():
+    """Hilo que vuelca cada INTERVALO_SEG (uno por proceso; se llama en cada worker)."""
+    if not DIRECTORIO or (_volcado['hilo'] and _volcado['hilo'].is_alive()):
+        return
+
+    def bucle():
+        while True:
+            time.sleep(INTERVALO_SEG)
+            try:
+                volcar()
+            except Exception as e:
+                log.warning('No se pudo volcar métricas: %s', e)
+
+    _volcado['hilo'] = threading.Thread(target=bucle, name='metricas-volcado', daemon=True)
+    _volcado['hilo'].start()
+    atexit.register(volcar)
+
+
+def _vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _sumar(a, b):
+    if isinstance(a, dict):
+        return {'buckets': [x + y for x, y in zip(a['buckets'], b['buckets'])],
+                'suma': a['suma'] + b['suma'], 'total': a['total'] + b['total']}
+    return a + b
+
+
+def agregadas(directorio=None) -> dict:
+    """{nombre: {tipo, ayuda, etiquetas, buckets, valores: {tupla_etiquetas: valor}}} de todos los procesos."""
+    directorio = directorio or DIRECTORIO
+    if directorio:
+        volcar(directorio)
+        fuentes = []
+        for ruta in glob.glob(os.path.join(directorio, '*.json')):
+            try:
+                with open(ruta, encoding='utf-8') as f:
+                    fuentes.append((int(os.path.basename(ruta)[:-5]), json.load(f)))
+            except (OSError, ValueError):
+                continue
+    else:
+        fuentes = [(os.getpid(), _exportar())]
+    resultado = {}
+    for pid, datos in fuentes:
+        for nombre, m in datos.items():
+            es_medidor = m['tipo'] == 'gauge'
+            if es_medidor and not _vivo(pid):
+                continue
+            destino = resultado.setdefault(nombre, dict(m, valores={}, etiquetas=m['etiquetas'] + (['pid'] if es_medidor else [])))
+            for etiquetas, valor in m['valores']:
+                clave = tuple(etiquetas) + ((str(pid),) if es_medidor else ())
+                previo = destino['valores'].get(clave)
+                destino['valores'][clave] = valor if previo is None else _sumar(previo, valor)
+    _ratios_de_cache(resultado)
+    return resultado
+
+
+def _ratios_de_cache(resultado):
+    consultas = resultado.get('cache_consultas_total')
+    if not consultas:
+        return
+    por_cache = {}
+    for (cache, tipo), valor in consultas['valores'].items():
+        aciertos, total = por_cache.get(cache, (0, 0))
+        por_cache[cache] = (aciertos + (valor if tipo == 'acierto' else 0), total + valor)
+    resultado['cache_aciertos_ratio'] = {
+        'tipo': 'gauge', 'ayuda': 'Aciertos / consultas por caché (todos los workers)', 'etiquetas': ['cache'],
+        'buckets': [], 'valores': {(c,): round(a / t, 4) for c, (a, t) in por_cache.items() if t}}
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=()) -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in list(zip(nombres, valores)) + list(extra)]
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def texto_prometheus(directorio=None) -> str:
+    """Formato de exposición de texto 0.0.4 de Prometheus."""
+    lineas = []
+    for nombre, m in sorted(agregadas(directorio).items()):
+        lineas.append(f'# HELP {nombre} {m["ayuda"]}')
+        lineas.append(f'# TYPE {nombre} {m["tipo"]}')
+        for clave, valor in sorted(m['valores'].items()):
+            if m['tipo'] != 'histogram':
+                lineas.append(f'{nombre}{_etiquetas(m["etiquetas"], clave)} {_numero(valor)}')
+                continue
+            acumulado = 0
+            for limite, conteo in zip(list(m['buckets']) + [float('inf')], valor['buckets']):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{_etiquetas(m["etiquetas"], clave, [("le", _numero(limite))])} {acumulado}')
+            lineas.append(f'{nombre}_sum{_etiquetas(m["etiquetas"], clave)} {_numero(valor["suma"])}')
+            lineas.append(f'{nombre}_count{_etiquetas(m["etiquetas"], clave)} {valor["total"]}')
+    return '\n'.join(lineas) + '\n'
+
+
+# --- HTTP y cachés ----------------------------------------------------------------------------
+
+HTTP_LATENCIA = histograma('http_request_segundos', 'Latencia de requests por endpoint, método y status',
+                           ('endpoint', 'metodo', 'status'))
+HTTP_EN_CURSO = medidor('http_requests_en_curso', 'Requests atendiéndose ahora en este worker')
+CACHE = contador('cache_consultas_total', 'Consultas a cachés en memoria', ('cache', 'resultado'))
+
+
+def cache(nombre: str, acierto: bool):
+    CACHE.inc(cache=nombre, resultado='acierto' if acierto else 'fallo')
+
+
+def _inicio_request():
+    from flask import g
+    g._metricas_t0 = time.perf_counter()
+    HTTP_EN_CURSO.inc()
+
+
+def _fin_request(response):
+    from flask import g, request
+    t0 = g.pop('_metricas_t0', None)
+    if t0 is not None:
+        HTTP_LATENCIA.observar(time.perf_counter() - t0, endpoint=request.endpoint or 'sin_ruta',
+                               metodo=request.method, status=response.status_code)
+        g._metricas_en_curso = True
+    return response
+
+
+def _cierre_request(error=None):
+    from flask import g
+    if g.pop('_metricas_en_curso', False) or g.pop('_metricas_t0', None) is not None:
+        HTTP_EN_CURSO.dec()
+
+
+def init_app(app):
+    app.before_request(_inicio_request)
+    app.after_request(_fin_request)
+    app.teardown_request(_cierre_request)
@@ -0,0 +1,163 @@
+"""Instrumentación del pool de conexiones y de las consultas (para ajustar DB_POOL_SIZE con datos).
+
+* ``PoolMedido`` (poolclass de SQLALCHEMY_ENGINE_OPTIONS) mide la espera de cada checkout, que
+  incluye abrir la conexión si hace falta. También cuenta los checkouts que usan overflow y los
+  timeouts.
+* Los eventos del pool cuentan los pre-ping fallidos y las demás invalidaciones.
+* Los eventos del engine cuentan sentencias y tiempo de DB por request (por endpoint). Guardan
+  las DB_LENTAS_POR_ENDPOINT sentencias más lentas de cada endpoint, sin parámetros.
+* Al leer las métricas se toman las conexiones en uso, en el pool y en overflow.
+* Cada sentencia de un request pasa por presupuesto_sql.py (límite de sentencias por endpoint).
+* Con DB_SENTENCIAS_HEADER=1 cada respuesta lleva ``X-DB-Sentencias`` (lo usa bench/rutas.py).
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+import metricas
+import perfilador
+import presupuesto_sql
+from extensions import db
+
+LENTAS_POR_ENDPOINT = int(os.getenv('DB_LENTAS_POR_ENDPOINT', '5'))
+_SQL_MAX = 300
+
+ESPERA_POOL = metricas.histograma('db_pool_checkout_segundos', 'Espera para obtener una conexión del pool', ('bind',))
+OVERFLOW = metricas.contador('db_pool_overflow_total', 'Checkouts atendidos con conexiones de overflow', ('bind',))
+TIMEOUTS = metricas.contador('db_pool_timeout_total', 'Checkouts que agotaron pool_timeout', ('bind',))
+PREPING_FALLIDOS = metricas.contador('db_pool_preping_fallidos_total', 'Conexiones muertas detectadas por pre-ping', ('bind',))
+INVALIDADAS = metricas.contador('db_pool_invalidadas_total', 'Conexiones invalidadas por errores', ('bind',))
+EN_USO = metricas.medidor('db_pool_conexiones', 'Conexiones del pool por estado', ('bind', 'estado'))
+SENTENCIAS = metricas.histograma('db_sentencias_por_request', 'Sentencias SQL por request', ('endpoint',),
+                                 buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144))
+TIEMPO_DB = metricas.histograma('db_tiempo_por_request_segundos', 'Tiempo en la DB por request', ('endpoint',))
+
+_lentas = {}  # endpoint -> heap de (segundos, sql)
+_lentas_lock = threading.Lock()
+_pools = {}  # bind -> engine
+
+
+# El logger del pool toma el nombre de la subclase y queda fuera de "sqlalchemy" (que SQLAlchemy
+# deja en WARNING): sin esto cada dispose/recreate saldría en el log a nivel INFO
+logging.getLogger(f'{__name__}.PoolMedido').setLevel(logging.WARNING)
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide la espera de cada checkout."""
+
+    bind = 'default'
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except exc.TimeoutError:
+            TIMEOUTS.inc(bind=self.bind)
+            raise
+        finally:
+            ESPERA_POOL.observar(time.perf_counter() - t0, bind=self.bind)
+        if self.checkedout() > self.size():
+            OVERFLOW.inc(bind=self.bind)
+        return conexion
+
+    def recreate(self):
+        nuevo = super().recreate()
+        nuevo.bind = self.bind
+        return nuevo
+
+
+def _endpoint() -> str:
+    return (request.endpoint or '-') if has_request_context() else '(fondo)'
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_t_sentencia', []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    pila = conn.info.get('_t_sentencia')
+    if not pila:
+        return
+    duracion = time.perf_counter() - pila.pop()
+    endpoint = _endpoint()
+    if has_request_context():
+        g._db_sentencias = g.get('_db_sentencias', 0) + 1
+        g._db_tiempo = g.get('_db_tiempo', 0.0) + duracion
+        perfilador.registrar_sentencia(statement, duracion)
+        presupuesto_sql.registrar(statement)
+    _registrar_lenta(endpoint, duracion, statement)
+
+
+def _error(contexto):
+    # after_cursor_execute no corre si la sentencia falla: descartar su marca de inicio
+    if contexto.connection is not None and contexto.connection.info.get('_t_sentencia'):
+        contexto.connection.info['_t_sentencia'].pop()
+
+
+def _registrar_lenta(endpoint, duracion, statement):
+    with _lentas_lock:
+        heap = _lentas.setdefault(endpoint, [])
+        if len(heap) < LENTAS_POR_ENDPOINT:
+            heapq.heappush(heap, (duracion, ' '.join(statement.split())[:_SQL_MAX]))
+        elif duracion > heap[0][0]:
+            heapq.heapreplace(heap, (duracion, ' '.join(statement.split())[:_SQL_MAX]))
+
+
+def lentas() -> dict:
+    """{endpoint: [{'segundos', 'sql'}, ...]} de la más lenta a la más rápida."""
+    with _lentas_lock:
+        return {ep: [{'segundos': round(s, 6), 'sql': sql} for s, sql in sorted(heap, reverse=True)]
+                for ep, heap in _lentas.items()}
+
+
+def _invalidada(dbapi_connection, connection_record, exception, bind='default'):
+    if isinstance(exception, exc.InvalidatePoolError):
+        PREPING_FALLIDOS.inc(bind=bind)
+    else:
+        INVALIDADAS.inc(bind=bind)
+
+
+def _al_terminar_request(response):
+    n = g.get('_db_sentencias')
+    if n:
+        SENTENCIAS.observar(n, endpoint=request.endpoint or '-')
+        TIEMPO_DB.observar(g.get('_db_tiempo', 0.0), endpoint=request.endpoint or '-')
+    if current_app.config.get('DB_SENTENCIAS_HEADER'):
+        response.headers['X-DB-Sentencias'] = str(n or 0)
+    return response
+
+
+@metricas.al_leer
+def _leer_pools():
+    for bind, engine in list(_pools.items()):
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        EN_USO.set(pool.checkedout(), bind=bind, estado='en_uso')
+        EN_USO.set(pool.checkedin(), bind=bind, estado='libres')
+        EN_USO.set(max(pool.overflow(), 0), bind=bind, estado='overflow')
+
+
+def instrumentar(engine, bind='default'):
+    if event.contains(engine, 'before_cursor_execute', _antes):
+        return
+    if isinstance(engine.pool, PoolMedido):
+        engine.pool.bind = bind
+    event.listen(engine, 'before_cursor_execute', _antes)
+    event.listen(engine, 'after_cursor_execute', _despues)
+    event.listen(engine, 'handle_error', _error)
+    event.listen(engine.pool, 'invalidate', lambda *a: _invalidada(*a, bind=bind))
+    _pools[bind] = engine
+
+
+def init_app(app):
+    with app.app_context():
+        for clave, engine in db.engines.items():
+            instrumentar(engine, clave or 'default')
+    app.after_request(_al_terminar_request)
@@ -0,0 +1,120 @@
+"""Migraciones de esquema versionadas.
+
+Cada migración tiene un número, un nombre y una función idempotente que recibe la conexión.
+Se aplican en orden, una sola vez, con ``flask --app app migrar`` (paso de release antes de
+levantar gunicorn). La tabla ``schema_version`` guarda las aplicadas.
+
+Al arrancar, cada worker solo consulta ``max(version)`` (``verificar``). En SQLite (desarrollo y
+pruebas) aplica lo pendiente ahí mismo; en otros motores solo avisa, salvo MIGRAR_AL_ARRANCAR=1.
+
+Para un cambio nuevo: agregar una función ``_m000N_...`` al final de MIGRACIONES. No editar las
+ya publicadas.
+"""
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+
+from extensions import db
+
+_meta = MetaData()
+log = logging.getLogger(__name__)
+schema_version = Table(
+    'schema_version', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('nombre', String(100), nullable=False),
+    Column('aplicada', DateTime, nullable=False),
+)
+
+_LOCK_PG = 823_001  # pg_advisory_xact_lock: dos releases simultáneos no corren DDL a la vez
+
+
+# --- Migraciones ------------------------------------------------------------------
+
+def _m0001_esquema_base(conexion):
+    """Tablas de models.py (create_all solo crea las que falten)."""
+    import models  # noqa: F401  (registra los modelos en la metadata)
+    db.metadata.create_all(bind=conexion)
+
+
+def _m0002_administrador_rol(conexion):
+    """Columna administrador.rol en bases creadas antes de los roles."""
+    columnas = {c['name'] for c in inspect(conexion).get_columns('administrador')}
+    if 'rol' not in columnas:
+        conexion.execute(text("ALTER TABLE administrador ADD COLUMN rol VARCHAR(20) DEFAULT 'empleado'"))
+
+
+def _m0003_indices_pedidocliente(conexion):
+    """Índices de listado/dashboard en pedidocliente (create_all no los agrega a tablas existentes)."""
+    from models import PedidoCliente
+    for indice in PedidoCliente.__table__.indexes:
+        indice.create(bind=conexion, checkfirst=True)
+
+
+def _m0004_indices_consultas(conexion):
+    """Índices de búsquedas frecuentes: catálogo por sucursal/categoría, opciones, horarios y admins."""
+    from models import (AdministradorSucursal, Extra, HorarioSucursal, MenuItem, MenuItemSucursal,
+                        OpcionPersonalizada, ValorOpcion)
+    for modelo in (MenuItem, MenuItemSucursal, Extra, AdministradorSucursal, OpcionPersonalizada, ValorOpcion,
+                   HorarioSucursal):
+        for indice in modelo.__table__.indexes:
+            indice.create(bind=conexion, checkfirst=True)
+
+
+MIGRACIONES = [
+    (1, 'esquema_base', _m0001_esquema_base),
+    (2, 'administrador_rol', _m0002_administrador_rol),
+    (3, 'indices_pedidocliente', _m0003_indices_pedidocliente),
+    (4, 'indices_consultas', _m0004_indices_consultas),
+]
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+
+# --- Aplicación ---------------------------------------------------------------------
+
+def version_esquema(conexion) -> int:
+    """Última migración aplicada (0 si la tabla no existe). Una sola consulta."""
+    try:
+        return conexion.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except Exception:
+        conexion.rollback()
+        return 0
+
+
+def migrar(engine=None) -> list:
+    """Aplica las migraciones pendientes en orden dentro de una transacción. Devuelve las aplicadas."""
+    engine = engine or db.engine
+    aplicadas = []
+    with engine.begin() as conexion:
+        if engine.dialect.name == 'postgresql':
+            conexion.execute(text('SELECT pg_advisory_xact_lock(:k)'), {'k': _LOCK_PG})
+        schema_version.create(bind=conexion, checkfirst=True)
+        hechas = set(conexion.execute(select(schema_version.c.version)).scalars())
+        for numero, nombre, funcion in MIGRACIONES:
+            if numero in hechas:
+                continue
+            funcion(conexion)
+            conexion.execute(schema_version.insert().values(version=numero, nombre=nombre,
+                                                            aplicada=datetime.utcnow()))
+            aplicadas.append(f'{numero:04d}_{nombre}')
+    return aplicadas
+
+
+def verificar(app) -> int:
+    """Chequeo barato al arrancar un worker: compara la versión del esquema con VERSION_ACTUAL."""
+    with app.app_context():
+        engine = db.engine
+        with engine.connect() as conexion:
+            version = version_esquema(conexion)
+        if version < VERSION_ACTUAL:
+            auto = os.getenv('MIGRAR_AL_ARRANCAR', '1' if engine.dialect.name == 'sqlite' else '0') == '1'
+            if auto:
+                for nombre in migrar(engine):
+                    log.info('Migración aplicada: %s', nombre)
+                version = VERSION_ACTUAL
+            else:
+                log.warning('Esquema en versión %s, se esperaba %s: ejecuta "flask --app app migrar" '
+                            'antes de levantar los workers', version, VERSION_ACTUAL)
+        app.extensions['esquema_version'] = version
+        return version
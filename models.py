@@ -10,8 +10,19 @@ class Sucursal(db.Model):
     menuitems = db.relationship('MenuItemSucursal', back_populates='sucursal')
     horarios = db.relationship('HorarioSucursal', backref='sucursal', lazy=True, cascade='all, delete-orphan')
 
+class SucursalTelegramChat(db.Model):
+    """Ruteo de notificaciones: qué chats de Telegram reciben (y pueden gestionar) los pedidos de cada sucursal."""
+    __tablename__ = 'sucursal_telegram_chat'
+    id = db.Column(db.Integer, primary_key=True)
+    sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursal.id'), nullable=False)
+    chat_id = db.Column(db.String(50), nullable=False)
+    rol = db.Column(db.String(20), default='sucursal')  # 'sucursal' o 'supervisor'
+    sucursal = db.relationship('Sucursal', backref=db.backref('telegram_chats', lazy=True, cascade='all, delete-orphan'))
+    __table_args__ = (db.UniqueConstraint('sucursal_id', 'chat_id', name='uq_sucursal_telegram_chat'),)
+
 class MenuItem(db.Model):
     __tablename__ = 'menu_item'
+    __table_args__ = (db.Index('ix_menu_item_categoria', 'categoria_id'),)
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100))
     descripcion = db.Column(db.String(200))
@@ -25,6 +36,8 @@ class MenuItem(db.Model):
 
 class MenuItemSucursal(db.Model):
     __tablename__ = 'menuitem_sucursal'
+    # La PK empieza por menuitem_id; por sucursal (partición del catálogo) cubre la consulta completa
+    __table_args__ = (db.Index('ix_menuitem_sucursal_sucursal', 'sucursal_id', 'disponible', 'menuitem_id'),)
     menuitem_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), primary_key=True)
     sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursal.id'), primary_key=True)
     disponible = db.Column(db.Boolean, default=True)
@@ -41,6 +54,7 @@ class Pedido(db.Model):
     total = db.Column(db.Float)
 
 class Extra(db.Model):
+    __table_args__ = (db.Index('ix_extra_menuitem', 'menuitem_id'),)
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100))
     precio = db.Column(db.Float)
@@ -57,6 +71,7 @@ class Administrador(db.Model):
 # Tabla pivote para relación muchos-a-muchos entre administradores y sucursales
 class AdministradorSucursal(db.Model):
     __tablename__ = 'administrador_sucursal'
+    __table_args__ = (db.Index('ix_administrador_sucursal_sucursal', 'sucursal_id'),)
     administrador_id = db.Column(db.Integer, db.ForeignKey('administrador.id'), primary_key=True)
     sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursal.id'), primary_key=True)
 
@@ -65,6 +80,12 @@ Administrador.sucursales = db.relationship('Sucursal', secondary='administrador_
 
 class PedidoCliente(db.Model):
     __tablename__ = 'pedidocliente'
+    # Índices para rangos de fecha (dashboard, listados) y conteos por estado
+    __table_args__ = (
+        db.Index('ix_pedidocliente_fecha', 'fecha'),
+        db.Index('ix_pedidocliente_sucursal_fecha', 'sucursal_id', 'fecha'),
+        db.Index('ix_pedidocliente_estado', 'estado'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     numero_pedido = db.Column(db.String(10), unique=True, nullable=False)  # Número único de pedido
     nombre = db.Column(db.String(100))
@@ -91,6 +112,7 @@ class Categoria(db.Model):
     nombre = db.Column(db.String(100), unique=True, nullable=False)
 
 class OpcionPersonalizada(db.Model):
+    __table_args__ = (db.Index('ix_opcion_personalizada_menuitem', 'menuitem_id'),)
     id = db.Column(db.Integer, primary_key=True)
     menuitem_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'))
     titulo = db.Column(db.String(100))
@@ -98,6 +120,7 @@ class OpcionPersonalizada(db.Model):
     tipo = db.Column(db.String(20))  # 'radio' o 'checkbox'
 
 class ValorOpcion(db.Model):
+    __table_args__ = (db.Index('ix_valor_opcion_opcion', 'opcion_id'),)
     id = db.Column(db.Integer, primary_key=True)
     opcion_id = db.Column(db.Integer, db.ForeignKey('opcion_personalizada.id'))
     texto = db.Column(db.String(100))
@@ -108,6 +131,7 @@ OpcionPersonalizada.valores = db.relationship('ValorOpcion', backref='opcion', l
 
 class HorarioSucursal(db.Model):
     __tablename__ = 'horario_sucursal'
+    __table_args__ = (db.Index('ix_horario_sucursal_dia', 'sucursal_id', 'dia_semana'),)
     id = db.Column(db.Integer, primary_key=True)
     sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursal.id'), nullable=False)
     dia_semana = db.Column(db.Integer, nullable=False)  # 0=Lunes, 1=Martes, ..., 6=Domingo
@@ -158,29 +182,66 @@ class HorarioSucursal(db.Model):
     
     @classmethod
     def sucursal_abierta_ahora(cls, sucursal_id):
-        """Verifica si una sucursal específica está abierta ahora"""
-        from datetime import datetime
-        import pytz
-        
-        # Obtener hora actual en México City
-        tz_mexico = pytz.timezone('America/Mexico_City')
-        ahora_mexico = datetime.now(tz_mexico)
-        dia_actual = ahora_mexico.weekday()  # 0=Lunes, 6=Domingo
-        hora_actual = ahora_mexico.time()
-        
-        # Buscar el horario para el día actual
-        horario_hoy = cls.query.filter_by(
-            sucursal_id=sucursal_id,
-            dia_semana=dia_actual
-        ).first()
-        
-        if not horario_hoy:
-            return False
-            
-        if horario_hoy.cerrado:
-            return False
-            
-        if not horario_hoy.hora_apertura or not horario_hoy.hora_cierre:
-            return False
-            
-        return horario_hoy.hora_apertura <= hora_actual <= horario_hoy.hora_cierre
+        """Verifica si una sucursal específica está abierta ahora (desde el índice de horarios.py)"""
+        import horarios
+        return horarios.abierta_ahora(sucursal_id)
+
+class TelegramPolling(db.Model):
+    """Fila única (id=1) con el lease del proceso que hace long polling y el último update procesado."""
+    __tablename__ = 'telegram_polling'
+    id = db.Column(db.Integer, primary_key=True)
+    ultimo_update_id = db.Column(db.BigInteger, default=0, nullable=False)
+    lider = db.Column(db.String(120), nullable=True)  # host:pid del proceso que tiene el lease
+    lease_hasta = db.Column(db.DateTime, nullable=True)  # UTC
+
+# --- Resúmenes de ventas (mantenidos por resumen_ventas.py) ---
+# sucursal_id=0 agrupa pedidos sin sucursal (formulario antiguo). Los pedidos cancelados
+# se restan de pedidos/ingresos en las tablas por hora y por producto.
+
+class VentaDiaria(db.Model):
+    __tablename__ = 'venta_diaria'
+    dia = db.Column(db.Date, primary_key=True)
+    sucursal_id = db.Column(db.Integer, primary_key=True)
+    pedidos = db.Column(db.Integer, default=0, nullable=False)  # Creados (incluye cancelados)
+    ingresos = db.Column(db.Float, default=0, nullable=False)  # Sin cancelados
+    pedidos_entregados = db.Column(db.Integer, default=0, nullable=False)
+    ingresos_entregados = db.Column(db.Float, default=0, nullable=False)
+    pedidos_cancelados = db.Column(db.Integer, default=0, nullable=False)
+
+class VentaHora(db.Model):
+    __tablename__ = 'venta_hora'
+    dia = db.Column(db.Date, primary_key=True)
+    sucursal_id = db.Column(db.Integer, primary_key=True)
+    hora = db.Column(db.Integer, primary_key=True)  # 0-23
+    pedidos = db.Column(db.Integer, default=0, nullable=False)
+    ingresos = db.Column(db.Float, default=0, nullable=False)
+
+class VentaProducto(db.Model):
+    __tablename__ = 'venta_producto'
+    dia = db.Column(db.Date, primary_key=True)
+    sucursal_id = db.Column(db.Integer, primary_key=True)
+    nombre = db.Column(db.String(100), primary_key=True)
+    producto_id = db.Column(db.Integer, nullable=True)
+    cantidad = db.Column(db.Integer, default=0, nullable=False)
+    ingresos = db.Column(db.Float, default=0, nullable=False)
+
+class VentaFormaPago(db.Model):
+    __tablename__ = 'venta_forma_pago'
+    dia = db.Column(db.Date, primary_key=True)
+    sucursal_id = db.Column(db.Integer, primary_key=True)
+    forma_pago = db.Column(db.String(20), primary_key=True)
+    pedidos = db.Column(db.Integer, default=0, nullable=False)
+    ingresos = db.Column(db.Float, default=0, nullable=False)
+
+class CatalogoVersion(db.Model):
+    """Fila única (id=1) con la versión del catálogo; sube en cada cambio masivo del menú."""
+    __tablename__ = 'catalogo_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    actualizado = db.Column(db.DateTime, nullable=True)
+
+class CatalogoParticion(db.Model):
+    """Versión de la disponibilidad por sucursal: cambiar lo agotado de una sucursal no invalida las demás."""
+    __tablename__ = 'catalogo_particion'
+    sucursal_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
@@ -0,0 +1,96 @@
+"""Perfil de SQLite para un solo nodo con varios workers (sucursales chicas sin Postgres).
+
+En cada conexión se aplica WAL (los lectores no bloquean al escritor ni al revés), busy_timeout
+(esperar el lock en vez de fallar con "database is locked"), synchronous=NORMAL (seguro con WAL,
+un fsync por checkpoint y no por commit), mmap y caché de páginas.
+
+Las lecturas siguen sin transacción. La escritura empieza con BEGIN IMMEDIATE en el primer
+INSERT/UPDATE/DELETE, así que toma el lock al empezar y espera su turno. Con BEGIN diferido, una
+transacción que leyó y luego escribe puede fallar al instante si otro escribió en medio: SQLite no
+espera en ese caso aunque haya busy_timeout. ``escritura()`` es el camino único de escritura:
+transacción corta, un escritor por proceso, commit al salir. ``SQLITE_PERFIL=0`` lo desactiva (ver
+``python -m bench.checkout_sqlite``).
+"""
+import contextlib
+import os
+import threading
+
+from sqlalchemy import event
+
+from extensions import db
+
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '15000'))
+MMAP_MB = int(os.getenv('SQLITE_MMAP_MB', '256'))
+CACHE_MB = int(os.getenv('SQLITE_CACHE_MB', '16'))
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', MMAP_MB * 1024 * 1024),
+    ('cache_size', -CACHE_MB * 1024),  # negativo = KiB
+    ('temp_store', 'MEMORY'),
+)
+
+_lock_escritura = threading.Lock()
+_local = threading.local()
+
+
+def _al_conectar(dbapi_connection, connection_record):
+    # El driver abre la transacción antes del primer DML: con IMMEDIATE toma el lock de escritura ahí
+    dbapi_connection.isolation_level = 'IMMEDIATE'
+    cursor = dbapi_connection.cursor()
+    try:
+        for nombre, valor in PRAGMAS:
+            cursor.execute(f'PRAGMA {nombre}={valor}')
+    finally:
+        cursor.close()
+
+
+def aplicable(engine) -> bool:
+    """Solo archivos SQLite (en memoria no hay WAL ni otros procesos)."""
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+
+def aplicado(engine) -> bool:
+    return event.contains(engine, 'connect', _al_conectar)
+
+
+def aplicar(engine):
+    if aplicado(engine):
+        return
+    event.listen(engine, 'connect', _al_conectar)
+
+
+def init_app(app):
+    if not app.config.get('SQLITE_PERFIL'):
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if aplicable(engine):
+                aplicar(engine)
+
+
+@contextlib.contextmanager
+def escritura():
+    """Transacción de escritura corta que se confirma al salir (rollback si hay error).
+
+    Con el perfil de SQLite los hilos del proceso escriben de a uno (entre procesos ordena
+    BEGIN IMMEDIATE + busy_timeout). En otros motores solo hace el commit. Anidada se une a la de
+    afuera.
+    """
+    sesion = db.session
+    if getattr(_local, 'dentro', False):
+        yield sesion
+        return
+    lock = _lock_escritura if aplicado(db.engine) else contextlib.nullcontext()
+    with lock:
+        _local.dentro = True
+        try:
+            yield sesion
+            sesion.commit()
+        except BaseException:
+            sesion.rollback()
+            raise
+        finally:
+            _local.dentro = False
@@ -0,0 +1,253 @@
+"""Perfilado a pedido de un request en producción: ¿es SQL, Jinja o Python?
+
+Se activa con ``?_perfil=muestreo`` (o ``=1``) o ``?_perfil=determinista``. Solo lo pueden pedir:
+
+* un admin ``super`` con sesión iniciada, o
+* quien mande ``X-Perfil: <expira>.<firma>``. La firma es un HMAC con SECRET_KEY y el header
+  vence en la fecha indicada. Se genera con ``flask --app app perfil-firma``.
+
+Hay dos modos:
+
+* ``muestreo``: un hilo toma la pila del hilo del request cada PERFIL_INTERVALO_MS. Cuesta poco
+  y sirve para páginas lentas reales.
+* ``determinista``: ``sys.setprofile`` suma el tiempo de cada pila exacta. Es más caro, pero no
+  se le escapan las funciones cortas.
+
+El tiempo de las pilas se reparte en SQL (hay un frame de SQLAlchemy o del driver), plantillas
+(Jinja) y Python. Las sentencias SQL se toman con sus tiempos reales de los eventos del engine
+(metricas_db.py).
+
+Cada worker guarda los PERFIL_POR_ENDPOINT perfiles más lentos de cada endpoint. Se ven en
+/admin/perfiles y se descargan en formato de pilas colapsadas (``flamegraph.pl``/speedscope). El
+formato también se puede pedir en el mismo request con ``&_perfil_salida=folded``, que devuelve
+el archivo en lugar de la página. Así no importa qué worker lo atendió.
+"""
+import hashlib
+import heapq
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, current_app, g, request, session
+
+INTERVALO_MS = float(os.getenv('PERFIL_INTERVALO_MS', '1'))
+POR_ENDPOINT = int(os.getenv('PERFIL_POR_ENDPOINT', '5'))
+_SQL_MAX = 300
+MODOS = ('muestreo', 'determinista')
+
+_guardados = {}  # endpoint -> heap de (duracion, seq, perfil); el más rápido se descarta primero
+_lock = threading.Lock()
+_seq = itertools.count(1)
+
+
+def _nombre(frame) -> str:
+    # Los templates compilados de Jinja no tienen __name__: se nombran por archivo (catalogo.html:root)
+    modulo = frame.f_globals.get('__name__') or os.path.basename(frame.f_code.co_filename)
+    return f'{modulo}:{frame.f_code.co_qualname}'
+
+
+def _categoria(pila) -> str:
+    """Desde la hoja hacia arriba: el primer frame de SQLAlchemy/driver o de Jinja decide."""
+    for nombre in reversed(pila):
+        modulo = nombre.split(':', 1)[0]
+        if modulo.startswith(('sqlalchemy', 'sqlite3', 'psycopg')):
+            return 'sql'
+        if modulo.startswith('jinja2') or modulo.endswith('.html'):
+            return 'plantillas'
+    return 'python'
+
+
+class _Muestreo:
+    """Un hilo que cada INTERVALO_MS copia la pila del hilo perfilado."""
+
+    def __init__(self):
+        self.pilas = Counter()
+        self._objetivo = threading.get_ident()
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name='perfil-muestreo', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def _bucle(self):
+        intervalo = INTERVALO_MS / 1000
+        while not self._parar.wait(intervalo):
+            frame = sys._current_frames().get(self._objetivo)
+            pila = []
+            while frame is not None:
+                pila.append(_nombre(frame))
+                frame = frame.f_back
+            if pila:
+                self.pilas[tuple(reversed(pila))] += 1
+
+    def detener(self) -> dict:
+        self._parar.set()
+        self._hilo.join()
+        # Cada muestra vale un intervalo
+        return {pila: n * INTERVALO_MS / 1000 for pila, n in self.pilas.items()}
+
+
+class _Determinista:
+    """Con ``sys.setprofile`` (solo este hilo): el tiempo entre eventos va a la pila en curso."""
+
+    def __init__(self):
+        self.pilas = Counter()
+        self._pila = []
+        self._ultimo = 0
+
+    def _evento(self, frame, evento, arg):
+        ahora = time.perf_counter_ns()
+        if self._pila:
+            self.pilas[tuple(self._pila)] += ahora - self._ultimo
+        if evento == 'call':
+            self._pila.append(_nombre(frame))
+        elif evento == 'c_call':
+            self._pila.append(f"{getattr(arg, '__module__', None) or 'builtins'}:{arg.__qualname__}")
+        elif self._pila:
+            # return, c_return, c_exception (los frames anteriores al inicio no están en la pila)
+            self._pila.pop()
+        self._ultimo = time.perf_counter_ns()
+
+    def iniciar(self):
+        self._ultimo = time.perf_counter_ns()
+        sys.setprofile(self._evento)
+
+    def detener(self) -> dict:
+        sys.setprofile(None)
+        return {pila: ns / 1e9 for pila, ns in self.pilas.items()}
+
+
+def firmar(expira: int, secreto: str) -> str:
+    firma = hmac.new(secreto.encode(), f'perfil:{expira}'.encode(), hashlib.sha256).hexdigest()
+    return f'{expira}.{firma}'
+
+
+def _firma_valida(valor: str) -> bool:
+    expira, _, _firma = valor.partition('.')
+    if not expira.isdigit() or int(expira) < time.time():
+        return False
+    return hmac.compare_digest(firmar(int(expira), current_app.config['SECRET_KEY']), valor)
+
+
+def autorizado() -> bool:
+    if session.get('admin_logged_in') and session.get('admin_rol') == 'super':
+        return True
+    return _firma_valida(request.headers.get('X-Perfil', ''))
+
+
+def _modo_pedido():
+    valor = request.args.get('_perfil')
+    if not valor:
+        return None
+    return 'muestreo' if valor == '1' else valor if valor in MODOS else None
+
+
+def registrar_sentencia(statement, duracion):
+    """Llamado por metricas_db en cada sentencia; solo anota si este request se está perfilando."""
+    sentencias = g.get('_perfil_sql')
+    if sentencias is not None:
+        sentencias.append({'sql': ' '.join(statement.split())[:_SQL_MAX], 'segundos': round(duracion, 6)})
+
+
+def _iniciar():
+    modo = _modo_pedido()
+    if modo is None or not autorizado():
+        return
+    perfilador = _Muestreo() if modo == 'muestreo' else _Determinista()
+    g._perfil = (modo, perfilador, time.perf_counter())
+    g._perfil_sql = []
+    perfilador.iniciar()
+
+
+def _detener():
+    """Para el perfilador del request (una sola vez) y devuelve el perfil armado."""
+    estado = g.pop('_perfil', None)
+    if estado is None:
+        return None
+    modo, perfilador, t0 = estado
+    pilas = perfilador.detener()
+    duracion = time.perf_counter() - t0
+    desglose = Counter()
+    for pila, segundos in pilas.items():
+        desglose[_categoria(pila)] += segundos
+    sentencias = g.pop('_perfil_sql', [])
+    return {
+        'id': f'{os.getpid()}-{next(_seq)}',
+        'endpoint': request.endpoint or '-',
+        'metodo': request.method,
+        'ruta': request.path,
+        'modo': modo,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duracion_seg': round(duracion, 6),
+        'desglose_seg': {k: round(desglose.get(k, 0.0), 6) for k in ('sql', 'plantillas', 'python')},
+        'sql_medido_seg': round(sum(s['segundos'] for s in sentencias), 6),
+        'sentencias': sentencias,
+        'pilas': pilas,
+    }
+
+
+def _guardar(perfil):
+    with _lock:
+        heap = _guardados.setdefault(perfil['endpoint'], [])
+        entrada = (perfil['duracion_seg'], next(_seq), perfil)
+        if len(heap) < POR_ENDPOINT:
+            heapq.heappush(heap, entrada)
+        elif entrada[0] > heap[0][0]:
+            heapq.heapreplace(heap, entrada)
+
+
+def colapsado(perfil) -> str:
+    """Pilas en formato "a;b;c <peso>" (microsegundos), el que leen flamegraph.pl y speedscope."""
+    lineas = (f"{';'.join(pila)} {max(int(segundos * 1e6), 1)}" for pila, segundos in perfil['pilas'].items())
+    return '\n'.join(sorted(lineas)) + '\n'
+
+
+def resumen(perfil) -> dict:
+    return {k: v for k, v in perfil.items() if k != 'pilas'}
+
+
+def guardados() -> dict:
+    """{endpoint: [resumen, ...]} del más lento al más rápido (este worker)."""
+    with _lock:
+        return {ep: [resumen(p) for _, _, p in sorted(heap, key=lambda e: e[:2], reverse=True)]
+                for ep, heap in _guardados.items()}
+
+
+def buscar(perfil_id):
+    with _lock:
+        for heap in _guardados.values():
+            for _, _, perfil in heap:
+                if perfil['id'] == perfil_id:
+                    return perfil
+    return None
+
+
+def _al_terminar(response):
+    perfil = _detener()
+    if perfil is None:
+        return response
+    _guardar(perfil)
+    if request.args.get('_perfil_salida') == 'folded':
+        response = Response(colapsado(perfil), mimetype='text/plain')
+        response.headers['Content-Disposition'] = f"attachment; filename=perfil-{perfil['id']}.folded"
+    response.headers['X-Perfil-Id'] = perfil['id']
+    response.headers['Server-Timing'] = ', '.join(
+        f'{k};dur={v * 1000:.1f}' for k, v in perfil['desglose_seg'].items())
+    return response
+
+
+def _cierre(_exc=None):
+    # Si el request terminó sin pasar por after_request el perfilador no puede quedar corriendo
+    if '_perfil' in g:
+        g.pop('_perfil')[1].detener()
+
+
+def init_app(app):
+    # Se registra antes que los demás hooks: su before_request corre primero y su after_request al final
+    app.before_request(_iniciar)
+    app.after_request(_al_terminar)
+    app.teardown_request(_cierre)
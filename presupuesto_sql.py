@@ -0,0 +1,151 @@
+"""Presupuesto de sentencias SQL por endpoint, para que un N+1 no llegue a producción sin que se note.
+
+Las relaciones lazy de models.py hacen fácil meter un N+1 sin darse cuenta: un ``.horarios`` o un
+``.get()`` dentro de un for. metricas_db pasa cada sentencia del request a ``registrar()``. Al
+terminar el request se compara el total con PRESUPUESTOS (por nombre de endpoint):
+
+* SQL_PRESUPUESTO=error (las pruebas, ver conftest.py): pasarse lanza ``PresupuestoExcedido`` y
+  la prueba falla.
+* SQL_PRESUPUESTO=aviso (producción): un warning con las huellas de las sentencias, es decir el
+  SQL sin literales y cuántas veces se repitió. La que más se repite suele ser el N+1. Se avisa a
+  lo más una vez cada SQL_PRESUPUESTO_AVISO_SEG por endpoint, y siempre se cuenta en
+  ``sql_presupuesto_excedido_total``.
+* SQL_PRESUPUESTO=0 (por omisión): no se instala nada.
+
+SQL_PRESUPUESTOS ajusta o agrega límites sin tocar el código, p. ej. ``catalogo=4,admin.listar_menu=6``.
+
+Los límites no dependen de cuántas sucursales o productos haya. Las consultas que llenan una caché
+(menú, disponibilidad, índice de horarios) van dentro de ``recarga()`` y no cuentan: pasan una vez
+por cambio, no en cada request.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+
+import metricas
+
+log = logging.getLogger(__name__)
+
+MODOS = ('0', 'aviso', 'error')
+AVISO_CADA_SEG = float(os.getenv('SQL_PRESUPUESTO_AVISO_SEG', '60'))
+_SQL_MAX = 300
+_HUELLAS_EN_AVISO = 10
+
+# Sentencias por request con las cachés llenas (medido con test_presupuesto_sql.py). Un dict separa
+# por método: el POST de checkout guarda el pedido y los resúmenes.
+PRESUPUESTOS = {
+    'index': 3,
+    'catalogo': 3,
+    'catalogo_disponibilidad': 2,
+    'agregar_carrito': 3,
+    'carrito': 2,
+    'checkout': {'GET': 3, 'POST': 9},
+    'api_sucursales': 1,
+    'api_pedido_estado': 1,
+    'admin.dashboard': 7,
+    'admin.listar_pedidos_clientes': 4,
+    'admin.listar_menu': 4,
+}
+for _par in filter(None, os.getenv('SQL_PRESUPUESTOS', '').split(',')):
+    _endpoint, _, _maximo = _par.partition('=')
+    PRESUPUESTOS[_endpoint.strip()] = int(_maximo)
+
+EXCEDIDOS = metricas.contador('sql_presupuesto_excedido_total',
+                              'Requests que pasaron su presupuesto de sentencias SQL', ('endpoint',))
+
+_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETROS = re.compile(r'%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+')
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_COLUMNAS = re.compile(r'^SELECT (DISTINCT )?.+? FROM ')
+
+_ultimo_aviso = {}  # endpoint -> time.monotonic() del último warning
+_lock = threading.Lock()
+
+
+class PresupuestoExcedido(AssertionError):
+    """Un request hizo más sentencias SQL que las declaradas para su endpoint (modo ``error``)."""
+
+
+def huella(statement) -> str:
+    """El SQL sin literales, parámetros ni lista de columnas: dos sentencias iguales salvo por los
+    valores dan la misma huella, y lo que queda a la vista es la tabla y el WHERE."""
+    sql = ' '.join(statement.split())
+    sql = _NUMEROS.sub('?', _PARAMETROS.sub('?', _CADENAS.sub('?', sql)))
+    sql = _COLUMNAS.sub(lambda m: f"SELECT {m.group(1) or ''}… FROM ", sql)
+    return _LISTAS.sub('(?…)', sql)[:_SQL_MAX]
+
+
+@contextmanager
+def recarga():
+    """Las sentencias de adentro llenan una caché: no cuentan para el presupuesto del request."""
+    if not has_request_context() or '_sql_huellas' not in g:
+        yield
+        return
+    g._sql_recarga = g.get('_sql_recarga', 0) + 1
+    try:
+        yield
+    finally:
+        g._sql_recarga -= 1
+
+
+def registrar(statement):
+    """Llamado por metricas_db en cada sentencia; solo anota si el presupuesto está activo."""
+    huellas = g.get('_sql_huellas')
+    if huellas is None:
+        return
+    if not g.get('_sql_recarga'):
+        huellas[huella(statement)] += 1
+
+
+def limite(endpoint, metodo):
+    maximo = PRESUPUESTOS.get(endpoint)
+    return maximo.get(metodo) if isinstance(maximo, dict) else maximo
+
+
+def _iniciar():
+    g._sql_huellas = Counter()
+
+
+def _avisar(endpoint, n, maximo, huellas):
+    ahora = time.monotonic()
+    with _lock:
+        if ahora - _ultimo_aviso.get(endpoint, -AVISO_CADA_SEG) < AVISO_CADA_SEG:
+            return
+        _ultimo_aviso[endpoint] = ahora
+    log.warning('Presupuesto SQL excedido en %s: %d sentencias (máximo %d)', endpoint, n, maximo, extra={'datos': {
+        'endpoint': endpoint, 'ruta': request.path, 'sentencias': n, 'presupuesto': maximo,
+        'huellas': [{'veces': veces, 'sql': sql} for sql, veces in huellas.most_common(_HUELLAS_EN_AVISO)],
+    }})
+
+
+def _verificar(response):
+    huellas = g.pop('_sql_huellas', None)
+    maximo = limite(request.endpoint, request.method)
+    if huellas is None or maximo is None:
+        return response
+    n = sum(huellas.values())
+    if n <= maximo:
+        return response
+    EXCEDIDOS.inc(endpoint=request.endpoint)
+    if current_app.config['SQL_PRESUPUESTO'] == 'error':
+        detalle = '\n'.join(f'  {veces}x {sql}' for sql, veces in huellas.most_common(_HUELLAS_EN_AVISO))
+        raise PresupuestoExcedido(f'{request.endpoint} hizo {n} sentencias SQL (presupuesto {maximo}):\n{detalle}')
+    _avisar(request.endpoint, n, maximo, huellas)
+    return response
+
+
+def init_app(app):
+    modo = app.config.get('SQL_PRESUPUESTO', '0')
+    if modo not in MODOS:
+        raise ValueError(f'SQL_PRESUPUESTO debe ser uno de {MODOS}, no {modo!r}')
+    if modo == '0':
+        return
+    app.before_request(_iniciar)
+    app.after_request(_verificar)
@@ -0,0 +1,183 @@
+"""Logging de la app: niveles, un logger por módulo y salida JSON sin bloquear el request.
+
+Los módulos usan ``log = logging.getLogger(__name__)``. ``configurar()`` pone en la raíz un
+QueueHandler: el hilo del request solo arma el registro (con su request_id) y lo encola. Un
+QueueListener por proceso lo formatea y lo escribe a stdout. Al hacer fork (gunicorn) el hijo
+arranca su propia cola y su propio hilo.
+
+* LOG_NIVEL: nivel raíz (INFO). LOG_NIVELES ajusta módulos sueltos, p. ej. ``telegram_bot=DEBUG,app=WARNING``.
+* LOG_FORMATO: ``json`` (una línea por registro) o ``texto``.
+* LOG_MUESTREO_DEBUG: fracción de ``volcado()`` que se escriben (0.01). Con DEBUG apagado
+  ``volcado()`` sale antes de tocar los datos. Los campos personales se enmascaran siempre.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+
+NIVEL = os.getenv('LOG_NIVEL', 'INFO').upper()
+FORMATO = os.getenv('LOG_FORMATO', 'json')
+MUESTREO_DEBUG = float(os.getenv('LOG_MUESTREO_DEBUG', '0.01'))
+
+# Datos del cliente que no deben quedar en logs (carrito, formularios, updates de Telegram)
+CAMPOS_PERSONALES = frozenset({
+    'nombre', 'telefono', 'direccion', 'calle', 'numero', 'colonia', 'entre_calles', 'referencia',
+    'first_name', 'last_name', 'username', 'phone_number', 'email', 'password',
+})
+_ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_estado = {'pid': None, 'handler': None, 'listener': None}
+
+
+class _FiltroContexto(logging.Filter):
+    """Corre en el hilo que loguea (antes de encolar): agrega request_id y pid."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id()
+        record.pid = os.getpid()
+        return True
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        datos = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'pid': getattr(record, 'pid', None),
+        }
+        if getattr(record, 'datos', None) is not None:
+            datos['datos'] = record.datos
+        if record.exc_info:
+            datos['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos['exc'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _FormatoTexto(logging.Formatter):
+    def format(self, record):
+        linea = super().format(record)
+        if getattr(record, 'datos', None) is not None:
+            linea += ' ' + json.dumps(record.datos, ensure_ascii=False, default=str)
+        return linea
+
+
+class _ManejadorCola(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Como el QueueHandler base, pero sin formatear con el formatter de salida en este hilo
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _formatter():
+    if FORMATO == 'texto':
+        return _FormatoTexto('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+    return FormatoJSON()
+
+
+def _iniciar_listener(handler):
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(_formatter())
+    handler.queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(handler.queue, salida, respect_handler_level=False)
+    listener.start()
+    _estado.update(pid=os.getpid(), listener=listener)
+
+
+def _tras_fork():
+    # El hilo del listener no sobrevive al fork y la cola pudo quedar a medias: cola e hilo nuevos
+    if _estado['handler'] is not None:
+        _iniciar_listener(_estado['handler'])
+
+
+def _detener():
+    if _estado['listener'] is not None and _estado['pid'] == os.getpid():
+        _estado['listener'].stop()
+
+
+def configurar():
+    """Instala el handler con cola en la raíz (idempotente; una vez por proceso)."""
+    if _estado['handler'] is not None:
+        return
+    raiz = logging.getLogger()
+    raiz.setLevel(NIVEL)
+    for nombre_nivel in filter(None, os.getenv('LOG_NIVELES', '').split(',')):
+        nombre, _, nivel = nombre_nivel.partition('=')
+        logging.getLogger(nombre.strip()).setLevel(nivel.strip().upper())
+    handler = _ManejadorCola(queue.SimpleQueue())
+    handler.addFilter(_FiltroContexto())
+    raiz.addHandler(handler)
+    _estado['handler'] = handler
+    _iniciar_listener(handler)
+    os.register_at_fork(after_in_child=_tras_fork)
+    atexit.register(_detener)
+    # Flask/werkzeug traen su propio handler a stderr: que propaguen a la raíz
+    for nombre in ('werkzeug', 'flask.app'):
+        logging.getLogger(nombre).handlers.clear()
+
+
+def request_id() -> str:
+    from flask import g, has_request_context
+    if has_request_context():
+        return g.get('request_id', '-')
+    return '-'
+
+
+def redactar(datos, _profundidad=0):
+    """Copia de ``datos`` con los campos personales enmascarados (dicts/listas anidados)."""
+    if _profundidad > 6:
+        return '…'
+    if isinstance(datos, dict):
+        return {k: ('***' if str(k).lower() in CAMPOS_PERSONALES else redactar(v, _profundidad + 1))
+                for k, v in datos.items()}
+    if isinstance(datos, (list, tuple)):
+        return [redactar(v, _profundidad + 1) for v in datos]
+    return datos
+
+
+def volcado(logger, mensaje, datos, *args, muestreo=None):
+    """Vuelca ``datos`` a DEBUG en una fracción de las llamadas (``datos`` puede ser una función).
+
+    ``args`` completan ``mensaje`` como en ``logger.debug``. Con DEBUG apagado no evalúa, formatea
+    ni copia nada.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= (MUESTREO_DEBUG if muestreo is None else muestreo):
+        return
+    if callable(datos):
+        datos = datos()
+    logger.debug(mensaje, *args, extra={'datos': redactar(datos)})
+
+
+def init_app(app):
+    configurar()
+
+    @app.before_request
+    def _asignar_request_id():
+        from flask import g, request
+        enviado = request.headers.get('X-Request-ID', '')
+        g.request_id = enviado if _ID_VALIDO.match(enviado) else uuid.uuid4().hex
+
+    @app.after_request
+    def _devolver_request_id(response):
+        from flask import g
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
@@ -0,0 +1,96 @@
+"""Ruteo de lecturas a una réplica (opcional) con lectura-de-lo-escrito.
+
+Con DATABASE_REPLICA_URL definida (una o varias URLs separadas por coma) se agregan los binds
+``replica_0``, ``replica_1``... Cada sesión elige una réplica al azar y se queda con ella. Las vistas
+marcadas con ``@solo_lectura`` leen de ahí: catálogo, sucursales, reportes, exportaciones. Todo lo demás usa el
+primario, igual que cualquier escritura (flush/INSERT/UPDATE/DELETE) y cualquier lectura posterior a
+una escritura en el mismo request.
+
+Cuando un request confirma escrituras (checkout, cambio de estado, disponibilidad...), el cliente
+queda fijado al primario REPLICA_PEGAJOSO_SEG segundos, así no ve datos atrasados justo después de
+su propio cambio. La consulta de pedidos (/consultar-pedido, /api/pedido_estado) nunca usa la
+réplica.
+"""
+import os
+import random
+import time
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import g, has_request_context, session
+from flask_sqlalchemy.session import Session
+
+PREFIJO = 'replica_'
+PEGAJOSO_SEG = float(os.getenv('REPLICA_PEGAJOSO_SEG', '10'))
+_CLAVE_SESION = '_primario_hasta'
+
+
+class SesionRuteada(Session):
+    """Session de Flask-SQLAlchemy que manda a la réplica solo las lecturas permitidas."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._leer_de_replica(clause):
+            if 'replica' not in self.info:
+                self.info['replica'] = random.choice([k for k in self._db.engines if isinstance(k, str)
+                                                      and k.startswith(PREFIJO)])
+            return self._db.engines[self.info['replica']]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _leer_de_replica(self, clause):
+        if self._flushing or self.info.get('escribio'):
+            return False
+        if not has_request_context() or not g.get('leer_replica'):
+            return False
+        if f'{PREFIJO}0' not in self._db.engines:
+            return False
+        return not isinstance(clause, (sa.Insert, sa.Update, sa.Delete))
+
+
+@sa.event.listens_for(SesionRuteada, 'after_flush')
+def _marcar_escritura(sesion, flush_context):
+    sesion.info['escribio'] = True
+
+
+@sa.event.listens_for(SesionRuteada, 'do_orm_execute')
+def _marcar_dml(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        estado.session.info['escribio'] = True
+
+
+@sa.event.listens_for(SesionRuteada, 'after_commit')
+def _fijar_primario_tras_commit(sesion):
+    if sesion.info.pop('escribio', False) and has_request_context():
+        g.fijar_primario = True
+
+
+@sa.event.listens_for(SesionRuteada, 'after_rollback')
+def _descartar_escritura(sesion):
+    sesion.info.pop('escribio', None)
+
+
+def fijado_al_primario() -> bool:
+    return session.get(_CLAVE_SESION, 0) > time.time()
+
+
+def solo_lectura(vista):
+    """Marca una vista cuyas lecturas pueden ir a la réplica (salvo si el cliente escribió hace poco)."""
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        g.leer_replica = not fijado_al_primario()
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+def configurar(app, uris):
+    """Agrega un bind por réplica a la config (antes de db.init_app)."""
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for i, uri in enumerate(uris):
+        binds[f'{PREFIJO}{i}'] = uri
+
+
+def init_app(app):
+    @app.after_request
+    def _guardar_ventana(response):
+        if g.get('fijar_primario'):
+            session[_CLAVE_SESION] = time.time() + PEGAJOSO_SEG
+        return response
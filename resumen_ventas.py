@@ -0,0 +1,291 @@
+"""Resúmenes de ventas mantenidos de forma incremental.
+
+Tablas (ver models.py): venta_diaria (día, sucursal), venta_hora (día, sucursal, hora),
+venta_producto (día, sucursal, producto) y venta_forma_pago (día, sucursal, forma de pago). Se actualizan al crear el pedido y cuando pasa a
+Entregado/Cancelado (o sale de esos estados). ``reconstruir(desde, hasta)`` recalcula un rango
+desde pedidocliente; disponible como ``flask reconstruir-resumenes``.
+
+Los pedidos sin fecha no entran en ningún resumen, ni en vivo ni al reconstruir.
+
+Las funciones de escritura no hacen commit: el llamador decide la transacción.
+"""
+import json
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from extensions import db, insert_con_conflicto
+
+ENTREGADO = 'Entregado'
+CANCELADO = 'Cancelado'
+
+
+def _incrementar(modelo, claves: dict, deltas: dict, al_insertar: dict | None = None):
+    """Upsert atómico: inserta la fila (con `al_insertar`) o suma los deltas a la existente."""
+    tabla = modelo.__table__
+    al_insertar = al_insertar or {}
+    insert = insert_con_conflicto()
+    if insert is not None:
+        stmt = insert(tabla).values(**claves, **deltas, **al_insertar)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(claves),
+            set_={k: tabla.c[k] + stmt.excluded[k] for k in deltas},
+        )
+        db.session.execute(stmt)
+        return
+    # Otros motores: leer-modificar-escribir con bloqueo de fila
+    fila = db.session.query(modelo).filter_by(**claves).with_for_update().first()
+    if fila is None:
+        db.session.add(modelo(**claves, **deltas, **al_insertar))
+    else:
+        for k, v in deltas.items():
+            setattr(fila, k, (getattr(fila, k) or 0) + v)
+    db.session.flush()
+
+
+def _incrementar_varias(modelo, claves: tuple, deltas: tuple, filas: list):
+    """Como ``_incrementar`` para muchas filas con una sola sentencia (executemany).
+
+    Cada fila trae las columnas de ``claves`` y ``deltas``; las demás solo se usan al insertar.
+    """
+    if not filas:
+        return
+    insert = insert_con_conflicto()
+    if insert is None:
+        for fila in filas:
+            _incrementar(modelo, {k: fila[k] for k in claves}, {k: fila[k] for k in deltas},
+                         {k: v for k, v in fila.items() if k not in claves and k not in deltas})
+        return
+    tabla = modelo.__table__
+    stmt = insert(tabla)
+    stmt = stmt.on_conflict_do_update(index_elements=list(claves),
+                                      set_={k: tabla.c[k] + stmt.excluded[k] for k in deltas})
+    db.session.execute(stmt, filas)
+
+
+def _productos(pedido):
+    """Lista (nombre, producto_id, cantidad, importe) del JSON de productos; vacío si es texto libre."""
+    try:
+        items = json.loads(pedido.productos or '[]')
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(items, list):
+        return []
+    salida = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('nombre'):
+            continue
+        cantidad = int(item.get('cantidad') or 1)
+        importe = float(item.get('precio_total') or (item.get('precio_unitario') or 0) * cantidad)
+        salida.append((str(item['nombre'])[:100], item.get('id') or None, cantidad, importe))
+    return salida
+
+
+def _claves(pedido):
+    return pedido.fecha.date(), pedido.sucursal_id or 0, pedido.fecha.hour
+
+
+def _forma_pago(pedido):
+    return (pedido.forma_pago or 'efectivo')[:20]
+
+
+def _aplicar_ventas(pedido, signo: int):
+    """Suma (signo=1) o resta (signo=-1) el pedido en las tablas por hora, forma de pago y producto."""
+    from models import VentaHora, VentaProducto, VentaFormaPago
+    dia, sucursal_id, hora = _claves(pedido)
+    total = float(pedido.total or 0)
+    _incrementar(VentaHora, {'dia': dia, 'sucursal_id': sucursal_id, 'hora': hora},
+                 {'pedidos': signo, 'ingresos': signo * total})
+    _incrementar(VentaFormaPago, {'dia': dia, 'sucursal_id': sucursal_id, 'forma_pago': _forma_pago(pedido)},
+                 {'pedidos': signo, 'ingresos': signo * total})
+    # Una fila por producto aunque venga en varias líneas del carrito, y todas en una sentencia
+    por_nombre = {}
+    for nombre, producto_id, cantidad, importe in _productos(pedido):
+        fila = por_nombre.setdefault(nombre, {'dia': dia, 'sucursal_id': sucursal_id, 'nombre': nombre,
+                                              'producto_id': producto_id, 'cantidad': 0, 'ingresos': 0.0})
+        fila['cantidad'] += signo * cantidad
+        fila['ingresos'] += signo * importe
+    _incrementar_varias(VentaProducto, ('dia', 'sucursal_id', 'nombre'), ('cantidad', 'ingresos'),
+                        list(por_nombre.values()))
+
+
+def registrar_pedido(pedido):
+    """Suma un pedido recién creado a los resúmenes."""
+    from models import VentaDiaria
+    if pedido.fecha is None:
+        return  # sin día al que sumarlo; reconstruir() tampoco lo cuenta
+    dia, sucursal_id, _ = _claves(pedido)
+    total = float(pedido.total or 0)
+    cancelado = pedido.estado == CANCELADO
+    entregado = pedido.estado == ENTREGADO
+    _incrementar(VentaDiaria, {'dia': dia, 'sucursal_id': sucursal_id}, {
+        'pedidos': 1,
+        'ingresos': 0.0 if cancelado else total,
+        'pedidos_entregados': int(entregado),
+        'ingresos_entregados': total if entregado else 0.0,
+        'pedidos_cancelados': int(cancelado),
+    })
+    if not cancelado:
+        _aplicar_ventas(pedido, 1)
+
+
+def registrar_cambio_estado(pedido, anterior: str, nuevo: str):
+    """Ajusta los resúmenes cuando un pedido entra o sale de Entregado/Cancelado."""
+    from models import VentaDiaria
+    if anterior == nuevo or pedido.fecha is None:
+        return
+    total = float(pedido.total or 0)
+    deltas = defaultdict(float)
+    for estado, signo in ((anterior, -1), (nuevo, 1)):
+        if estado == ENTREGADO:
+            deltas['pedidos_entregados'] += signo
+            deltas['ingresos_entregados'] += signo * total
+        elif estado == CANCELADO:
+            deltas['pedidos_cancelados'] += signo
+            deltas['ingresos'] -= signo * total
+    if not deltas:
+        return
+    dia, sucursal_id, _ = _claves(pedido)
+    _incrementar(VentaDiaria, {'dia': dia, 'sucursal_id': sucursal_id},
+                 {k: int(v) if k.startswith('pedidos') else v for k, v in deltas.items()})
+    if CANCELADO in (anterior, nuevo):
+        _aplicar_ventas(pedido, 1 if anterior == CANCELADO else -1)
+
+
+def cambiar_estado_pedido(condicion, nuevo_estado: str, intentos: int = 3):
+    """UPDATE del estado que además mantiene los resúmenes. No hace commit.
+
+    El UPDATE se condiciona al estado leído para no contar dos veces una transición
+    concurrente. Devuelve el estado anterior o None si el pedido no existe.
+    """
+    from sqlalchemy import update
+    from models import PedidoCliente
+    for _ in range(intentos):
+        pedido = (db.session.query(PedidoCliente.id, PedidoCliente.estado, PedidoCliente.fecha,
+                                   PedidoCliente.sucursal_id, PedidoCliente.total, PedidoCliente.productos,
+                                   PedidoCliente.forma_pago)
+                  .filter(condicion).first())
+        if pedido is None:
+            return None
+        anterior = pedido.estado
+        mismo_estado = PedidoCliente.estado.is_(None) if anterior is None else PedidoCliente.estado == anterior
+        res = db.session.execute(
+            update(PedidoCliente)
+            .where(PedidoCliente.id == pedido.id, mismo_estado)
+            .values(estado=nuevo_estado)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount:
+            registrar_cambio_estado(pedido, anterior, nuevo_estado)
+            return anterior
+    raise RuntimeError('El estado del pedido cambió concurrentemente; reintentar')
+
+
+def reconstruir(desde: date, hasta: date) -> int:
+    """Recalcula los resúmenes de [desde, hasta] (inclusive) desde pedidocliente. Hace commit."""
+    from models import PedidoCliente, VentaDiaria, VentaHora, VentaProducto, VentaFormaPago
+    inicio = datetime.combine(desde, time.min)
+    fin = datetime.combine(hasta + timedelta(days=1), time.min)
+    for modelo in (VentaDiaria, VentaHora, VentaProducto, VentaFormaPago):
+        modelo.query.filter(modelo.dia >= desde, modelo.dia <= hasta).delete(synchronize_session=False)
+
+    diaria = defaultdict(lambda: defaultdict(float))
+    por_hora = defaultdict(lambda: defaultdict(float))
+    por_producto = defaultdict(lambda: defaultdict(float))
+    por_pago = defaultdict(lambda: defaultdict(float))
+    ids_producto = {}
+    n = 0
+    consulta = (db.session.query(PedidoCliente.fecha, PedidoCliente.sucursal_id, PedidoCliente.total,
+                                 PedidoCliente.estado, PedidoCliente.productos, PedidoCliente.forma_pago)
+                .filter(PedidoCliente.fecha >= inicio, PedidoCliente.fecha < fin)
+                .execution_options(yield_per=1000))
+    for pedido in consulta:
+        n += 1
+        dia, sucursal_id, hora = _claves(pedido)
+        total = float(pedido.total or 0)
+        d = diaria[(dia, sucursal_id)]
+        d['pedidos'] += 1
+        if pedido.estado == CANCELADO:
+            d['pedidos_cancelados'] += 1
+            continue
+        d['ingresos'] += total
+        if pedido.estado == ENTREGADO:
+            d['pedidos_entregados'] += 1
+            d['ingresos_entregados'] += total
+        h = por_hora[(dia, sucursal_id, hora)]
+        h['pedidos'] += 1
+        h['ingresos'] += total
+        fp = por_pago[(dia, sucursal_id, _forma_pago(pedido))]
+        fp['pedidos'] += 1
+        fp['ingresos'] += total
+        for nombre, producto_id, cantidad, importe in _productos(pedido):
+            p = por_producto[(dia, sucursal_id, nombre)]
+            p['cantidad'] += cantidad
+            p['ingresos'] += importe
+            if producto_id:
+                ids_producto[(dia, sucursal_id, nombre)] = producto_id
+
+    enteros = ('pedidos', 'pedidos_entregados', 'pedidos_cancelados', 'cantidad')
+    normalizar = lambda valores: {k: int(v) if k in enteros else v for k, v in valores.items()}
+    db.session.bulk_insert_mappings(VentaDiaria, [
+        dict(dia=dia, sucursal_id=sid, **normalizar(v)) for (dia, sid), v in diaria.items()])
+    db.session.bulk_insert_mappings(VentaHora, [
+        dict(dia=dia, sucursal_id=sid, hora=hora, **normalizar(v)) for (dia, sid, hora), v in por_hora.items()])
+    db.session.bulk_insert_mappings(VentaProducto, [
+        dict(dia=dia, sucursal_id=sid, nombre=nombre, producto_id=ids_producto.get((dia, sid, nombre)), **normalizar(v))
+        for (dia, sid, nombre), v in por_producto.items()])
+    db.session.bulk_insert_mappings(VentaFormaPago, [
+        dict(dia=dia, sucursal_id=sid, forma_pago=fp, **normalizar(v)) for (dia, sid, fp), v in por_pago.items()])
+    db.session.commit()
+    return n
+
+
+# --- Lecturas (O(días × sucursales), no O(pedidos)) ---
+
+def _alcance(query, modelo, sucursales):
+    if sucursales and sucursales != 'ALL':
+        query = query.filter(modelo.sucursal_id.in_(sucursales))
+    return query
+
+
+def totales(desde: date, hasta: date, sucursales=None) -> dict:
+    """Suma de venta_diaria en [desde, hasta]."""
+    from sqlalchemy import func
+    from models import VentaDiaria
+    q = db.session.query(
+        func.coalesce(func.sum(VentaDiaria.pedidos), 0),
+        func.coalesce(func.sum(VentaDiaria.ingresos), 0),
+        func.coalesce(func.sum(VentaDiaria.pedidos_entregados), 0),
+        func.coalesce(func.sum(VentaDiaria.ingresos_entregados), 0),
+        func.coalesce(func.sum(VentaDiaria.pedidos_cancelados), 0),
+    ).filter(VentaDiaria.dia >= desde, VentaDiaria.dia <= hasta)
+    fila = _alcance(q, VentaDiaria, sucursales).one()
+    return {'pedidos': int(fila[0]), 'ingresos': float(fila[1]), 'pedidos_entregados': int(fila[2]),
+            'ingresos_entregados': float(fila[3]), 'pedidos_cancelados': int(fila[4])}
+
+
+def ventas_por_dia(desde: date, hasta: date, sucursales=None):
+    from sqlalchemy import func
+    from models import VentaDiaria
+    q = (db.session.query(VentaDiaria.dia, func.sum(VentaDiaria.pedidos), func.sum(VentaDiaria.ingresos))
+         .filter(VentaDiaria.dia >= desde, VentaDiaria.dia <= hasta))
+    q = _alcance(q, VentaDiaria, sucursales).group_by(VentaDiaria.dia).order_by(VentaDiaria.dia)
+    return [(dia, int(p or 0), float(i or 0)) for dia, p, i in q]
+
+
+def ventas_por_hora(desde: date, hasta: date, sucursales=None):
+    from sqlalchemy import func
+    from models import VentaHora
+    q = (db.session.query(VentaHora.hora, func.sum(VentaHora.pedidos), func.sum(VentaHora.ingresos))
+         .filter(VentaHora.dia >= desde, VentaHora.dia <= hasta))
+    q = _alcance(q, VentaHora, sucursales).group_by(VentaHora.hora).order_by(VentaHora.hora)
+    return [(hora, int(p or 0), float(i or 0)) for hora, p, i in q]
+
+
+def top_productos(desde: date, hasta: date, sucursales=None, limite: int = 10):
+    from sqlalchemy import func
+    from models import VentaProducto
+    cantidad = func.sum(VentaProducto.cantidad)
+    q = (db.session.query(VentaProducto.nombre, cantidad, func.sum(VentaProducto.ingresos))
+         .filter(VentaProducto.dia >= desde, VentaProducto.dia <= hasta))
+    q = _alcance(q, VentaProducto, sucursales).group_by(VentaProducto.nombre).order_by(cantidad.desc()).limit(limite)
+    return [(nombre, int(c or 0), float(i or 0)) for nombre, c, i in q]
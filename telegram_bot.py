@@ -1,21 +1,39 @@
 import requests
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 import threading
+import socket
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event, inspect
 import time
 import os
+import logging
+
+import metricas
+from registro import volcado
+
+log = logging.getLogger(__name__)
+
+LLAMADAS = metricas.histograma('telegram_llamada_segundos', 'Latencia de llamadas a la Bot API', ('metodo',))
+ERRORES = metricas.contador('telegram_errores_total', 'Llamadas a la Bot API fallidas', ('metodo', 'tipo'))
 
 # Configuración del bot de Telegram cargada desde variables de entorno
 # (Nunca dejar tokens sensibles en el repositorio)
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN', '')
 ADMIN_CHAT_ID = os.getenv('TELEGRAM_ADMIN_CHAT_ID', '')
-# Si no se define ADMIN_CHAT_ID se activa modo relajado: se aceptan todos los chats (solo para debug)
-ALLOWED_CHATS = {c for c in {ADMIN_CHAT_ID} if c}
-if not ALLOWED_CHATS:
-    print('[TELEGRAM] Advertencia: TELEGRAM_ADMIN_CHAT_ID no definido. Modo debug: se aceptarán todos los chats para comandos.')
+# Supervisores globales: reciben todos los pedidos y pueden gestionar cualquier sucursal.
+# Los chats por sucursal se configuran en la tabla sucursal_telegram_chat (admin > editar sucursal).
+SUPERVISOR_CHATS = {c.strip() for c in [ADMIN_CHAT_ID, *os.getenv('TELEGRAM_SUPERVISOR_CHAT_IDS', '').split(',')] if c.strip()}
+# Compatibilidad: antes era el único filtro de chats
+ALLOWED_CHATS = SUPERVISOR_CHATS
+if not SUPERVISOR_CHATS:
+    log.warning('TELEGRAM_ADMIN_CHAT_ID no definido. Si tampoco hay chats por sucursal se aceptarán todos los chats (modo debug).')
 
-API_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}" if TELEGRAM_TOKEN else ''
+# TELEGRAM_API_BASE permite apuntar a un servidor local (bench/fake_telegram.py) en pruebas de carga
+API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org').rstrip('/')
+API_URL = f"{API_BASE}/bot{TELEGRAM_TOKEN}" if TELEGRAM_TOKEN else ''
 
 ESTADOS_MAP = {
     'pendiente': 'Pendiente',
@@ -40,69 +58,140 @@ ESTADOS_MAP = {
     'x': 'Cancelado'
 }
 
-_POLL_OFFSET_FILE = 'telegram_offset.txt'
+# Long polling: un solo proceso (elegido por lease en DB) mantiene abierto getUpdates.
+LONG_POLL_TIMEOUT = int(os.getenv('TELEGRAM_LONG_POLL_TIMEOUT', '50'))  # segundos que Telegram retiene la petición
+LEASE_SEGUNDOS = LONG_POLL_TIMEOUT + 40  # debe superar el long poll para que el lease no caduque en plena espera
 _polling_thread = None
 _polling_running = False
 
 def iniciar_polling_background(app=None, intervalo: int = 2):
-    """Inicia un hilo en segundo plano para hacer polling si no hay webhook.
+    """Inicia un hilo en segundo plano que hace long polling si no hay webhook.
 
-    Usar solo en desarrollo local (sin URL pública). Evita duplicados verificando variable global.
+    Puede llamarse en todos los workers: solo el proceso que obtiene el lease en
+    `telegram_polling` llama a getUpdates; el resto reintenta cada `intervalo`
+    segundos por si el líder muere. El offset vive en DB, no en disco.
     """
     global _polling_thread, _polling_running
     if _polling_running:
         return
-    # Evitar doble arranque por el reloader de Flask en debug
-    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not os.environ.get('FLASK_ENV'):
-        _polling_running = True
-
-        def _loop():
-            while _polling_running:
-                try:
-                    # Asegurar contexto de aplicación si se pasó.
-                    if app is not None:
-                        with app.app_context():
-                            poll_once()
-                    else:
-                        poll_once()
-                except Exception as e:
-                    print('[TELEGRAM] Error en loop polling:', e)
+    _polling_running = True
+
+    def _ciclo():
+        if not _adquirir_lease():
+            return False
+        poll_once(timeout=LONG_POLL_TIMEOUT, lider=_proceso_id())
+        return True
+
+    def _loop():
+        while _polling_running:
+            es_lider = False
+            try:
+                # Asegurar contexto de aplicación si se pasó.
+                if app is not None:
+                    with app.app_context():
+                        es_lider = _ciclo()
+                else:
+                    es_lider = _ciclo()
+            except Exception as e:
+                log.exception('Error en loop de polling: %s', e)
+            # El líder vuelve a llamar de inmediato (getUpdates ya espera en el servidor)
+            if not es_lider:
                 time.sleep(intervalo)
-        _polling_thread = threading.Thread(target=_loop, name='TelegramPolling', daemon=True)
-        _polling_thread.start()
+    _polling_thread = threading.Thread(target=_loop, name='TelegramPolling', daemon=True)
+    _polling_thread.start()
+
+def detener_polling_background():
+    global _polling_running
+    _polling_running = False
+
+def _proceso_id() -> str:
+    # Se calcula al vuelo: tras un fork el pid cambia
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _fila_polling():
+    """Obtiene (o crea) la fila única de estado del polling."""
+    from extensions import db
+    from models import TelegramPolling
+    from sqlalchemy.exc import IntegrityError
+    fila = db.session.get(TelegramPolling, 1)
+    if fila is None:
+        try:
+            db.session.add(TelegramPolling(id=1, ultimo_update_id=0))
+            db.session.commit()
+        except IntegrityError:
+            # Otro worker la creó al mismo tiempo
+            db.session.rollback()
+        fila = db.session.get(TelegramPolling, 1)
+    return fila
+
+def _adquirir_lease() -> bool:
+    """Toma o renueva el lease con un UPDATE condicional (atómico en SQLite y Postgres)."""
+    from extensions import db
+    from models import TelegramPolling
+    from sqlalchemy import update, or_
+    _fila_polling()
+    ahora = datetime.utcnow()
+    yo = _proceso_id()
+    res = db.session.execute(
+        update(TelegramPolling)
+        .where(TelegramPolling.id == 1)
+        .where(or_(TelegramPolling.lider.is_(None),
+                   TelegramPolling.lider == yo,
+                   TelegramPolling.lease_hasta.is_(None),
+                   TelegramPolling.lease_hasta < ahora))
+        .values(lider=yo, lease_hasta=ahora + timedelta(seconds=LEASE_SEGUNDOS))
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+def _guardar_offset(update_id: int, lider: Optional[str]) -> bool:
+    """Avanza el offset en DB. Si se indica líder, solo escribe mientras conserve el lease."""
+    from extensions import db
+    from models import TelegramPolling
+    from sqlalchemy import update
+    stmt = (update(TelegramPolling)
+            .where(TelegramPolling.id == 1)
+            .where(TelegramPolling.ultimo_update_id < update_id)
+            .values(ultimo_update_id=update_id))
+    if lider:
+        stmt = stmt.where(TelegramPolling.lider == lider)
+    res = db.session.execute(stmt)
+    db.session.commit()
+    return res.rowcount == 1
+
+def poll_once(timeout: int = 0, lider: Optional[str] = None):
+    """Realiza una iteración de getUpdates para entornos sin webhook.
 
-def poll_once():
-    """Realiza una iteración de getUpdates para entornos sin webhook (desarrollo)."""
+    `timeout` > 0 activa long polling (Telegram retiene la petición hasta que hay updates).
+    """
     if not TELEGRAM_TOKEN or not API_URL:
-        print('[TELEGRAM] Token no configurado, no se enviará notificación.')
+        log.warning('Token no configurado, no se consultan updates')
         return False
     try:
-        offset = 0
-        import os
-        if os.path.isfile(_POLL_OFFSET_FILE):
-            try:
-                with open(_POLL_OFFSET_FILE, 'r', encoding='utf-8') as f:
-                    offset = int(f.read().strip() or 0)
-            except Exception:
-                offset = 0
-        r = requests.get(f"{API_URL}/getUpdates", params={'timeout': 0, 'offset': offset + 1}, timeout=10)
+        offset = int(_fila_polling().ultimo_update_id or 0)
+        r = requests.get(f"{API_URL}/getUpdates",
+                         params={'timeout': timeout, 'offset': offset + 1},
+                         timeout=timeout + 10)
         data = r.json()
         if not data.get('ok'):
-            print('[TELEGRAM] getUpdates fallo', data)
+            log.error('getUpdates falló: %s', data)
             return {'ok': False, 'error': data}
         updates = data.get('result', [])
-        max_update_id = offset
+        procesados = 0
         for upd in updates:
-            procesar_update(upd)
             uid = upd.get('update_id', 0)
-            if uid > max_update_id:
-                max_update_id = uid
-        if max_update_id != offset:
-            with open(_POLL_OFFSET_FILE, 'w', encoding='utf-8') as f:
-                f.write(str(max_update_id))
-        return {'ok': True, 'nuevos': len(updates)}
+            if uid <= offset:
+                continue
+            procesar_update(upd)
+            # Persistir tras cada update: si el proceso muere no se reprocesa lo ya aplicado
+            if not _guardar_offset(uid, lider) and lider:
+                log.warning('Lease perdido durante polling, se detiene el lote')
+                break
+            offset = uid
+            procesados += 1
+        return {'ok': True, 'nuevos': procesados}
     except Exception as e:
-        print('[TELEGRAM] Error poll_once:', e)
+        log.exception('Error en poll_once: %s', e)
         return {'ok': False, 'error': str(e)}
 
 def _build_inline_keyboard(numero_pedido: str, estado_actual: str):
@@ -121,64 +210,136 @@ def _build_inline_keyboard(numero_pedido: str, estado_actual: str):
 
 def _send(api_method: str, payload: dict):
     if not TELEGRAM_TOKEN or not API_URL:
-        print('[TELEGRAM] Token no configurado, no se puede probar bot.')
+        log.debug('Token no configurado, no se llama %s', api_method)
         return False
+    t0 = time.perf_counter()
     try:
         r = requests.post(f"{API_URL}/{api_method}", json=payload, timeout=10)
         if r.status_code != 200:
-            print('[TELEGRAM] Error:', r.status_code, r.text)
+            ERRORES.inc(metodo=api_method, tipo=str(r.status_code))
+            log.error('%s respondió %s: %s', api_method, r.status_code, r.text[:500])
         return r.json() if r.content else {}
     except Exception as e:
-        print('[TELEGRAM] Excepción enviando:', e)
+        ERRORES.inc(metodo=api_method, tipo=type(e).__name__)
+        log.error('Excepción llamando %s: %s', api_method, e)
         return {}
+    finally:
+        LLAMADAS.observar(time.perf_counter() - t0, metodo=api_method)
+
+# ---------------------------------------------------------------------------
+# Ruteo por sucursal y envío en paralelo
+# ---------------------------------------------------------------------------
+RUTAS_TTL_SEG = int(os.getenv('TELEGRAM_RUTAS_TTL', '60'))
+FANOUT_WORKERS = int(os.getenv('TELEGRAM_FANOUT_WORKERS', '8'))
+_rutas = {'cargado': 0.0, 'por_sucursal': {}}
+_rutas_lock = threading.Lock()
+_fanout_pool = None
+_fanout_lock = threading.Lock()
+
+def rutas_telegram() -> dict:
+    """sucursal_id -> set de chat_ids (sucursal + supervisores de esa sucursal). Cacheado RUTAS_TTL_SEG."""
+    ahora = time.monotonic()
+    vigente = ahora - _rutas['cargado'] < RUTAS_TTL_SEG
+    metricas.cache('telegram_rutas', vigente)
+    if vigente:
+        return _rutas['por_sucursal']
+    from extensions import db
+    from models import SucursalTelegramChat
+    por_sucursal = {}
+    for sucursal_id, chat_id in db.session.query(SucursalTelegramChat.sucursal_id, SucursalTelegramChat.chat_id):
+        por_sucursal.setdefault(sucursal_id, set()).add(str(chat_id))
+    with _rutas_lock:
+        _rutas['por_sucursal'] = por_sucursal
+        _rutas['cargado'] = ahora
+    return por_sucursal
+
+def invalidar_rutas_telegram():
+    with _rutas_lock:
+        _rutas['cargado'] = 0.0
+
+def chats_para_sucursal(sucursal_id) -> list:
+    """Chats que deben recibir los pedidos de la sucursal (sin duplicados)."""
+    chats = set(rutas_telegram().get(sucursal_id, set()))
+    chats |= SUPERVISOR_CHATS
+    return sorted(chats)
+
+def chat_autorizado(chat_id: str, sucursal_id=None) -> bool:
+    """Un chat puede gestionar pedidos de una sucursal si es supervisor global o está ruteado a ella.
+
+    Sin `sucursal_id` basta con estar ruteado a alguna sucursal (p. ej. /start).
+    """
+    chat_id = str(chat_id)
+    if chat_id in SUPERVISOR_CHATS:
+        return True
+    rutas = rutas_telegram()
+    if not SUPERVISOR_CHATS and not rutas:
+        return True  # modo debug: nada configurado
+    if sucursal_id is None:
+        return any(chat_id in chats for chats in rutas.values())
+    return chat_id in rutas.get(sucursal_id, set())
+
+def _pool_envios():
+    # Se crea al primer uso para que cada worker (tras el fork) tenga sus propios hilos
+    global _fanout_pool
+    if _fanout_pool is None:
+        with _fanout_lock:
+            if _fanout_pool is None:
+                _fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='TelegramFanout')
+    return _fanout_pool
+
+def _enviar_a_chats(chats, payload: dict) -> list:
+    """Envía `payload` (sin chat_id) a cada chat en paralelo y devuelve las respuestas en orden."""
+    if len(chats) == 1:
+        return [_send('sendMessage', {**payload, 'chat_id': chats[0]})]
+    futuros = [_pool_envios().submit(_send, 'sendMessage', {**payload, 'chat_id': chat}) for chat in chats]
+    respuestas = []
+    for f in futuros:
+        try:
+            respuestas.append(f.result())
+        except Exception as e:
+            respuestas.append({'ok': False, 'error': str(e)})
+    return respuestas
+
+def _sucursal_de_pedido(numero_pedido: str):
+    from extensions import db
+    from models import PedidoCliente
+    return db.session.query(PedidoCliente.sucursal_id).filter_by(numero_pedido=numero_pedido).scalar()
 
 def enviar_notificacion_pedido(pedido):
     """
     Envía una notificación al admin cuando se crea un nuevo pedido
     """
     if not TELEGRAM_TOKEN or not API_URL:
-        print('[TELEGRAM] Token no configurado, ignorando update.')
+        log.debug('Token no configurado, no se notifica el pedido %s', pedido.numero_pedido)
         return
     try:
-        # Formatear información del pedido
-        fecha_formateada = pedido.fecha.strftime('%d/%m/%Y %H:%M') if pedido.fecha else 'No disponible'
-        
-        # Procesar productos desde JSON
-        productos_texto = ""
-        try:
-            productos_lista = json.loads(pedido.productos) if pedido.productos else []
-            for producto in productos_lista:
-                productos_texto += f"• {producto.get('nombre', 'Producto')} x{producto.get('cantidad', 1)}"
-                if producto.get('opciones_personalizadas'):
-                    productos_texto += f" ({', '.join(producto['opciones_personalizadas'])})"
-                productos_texto += f" - ${producto.get('precio_total', 0):.2f}\n"
-        except (json.JSONDecodeError, TypeError):
-            productos_texto = f"• {pedido.productos}\n"
-        
-        # Construir mensaje completo con helper reutilizable
-        mensaje = build_pedido_message(pedido, productos_texto=productos_texto, fecha_formateada=fecha_formateada)
+        # Renderiza (y deja en caché) el mensaje completo del pedido
+        mensaje = mensaje_pedido(pedido.numero_pedido, pedido.estado or 'Pendiente', pedido=pedido)
 
-        # Enviar mensaje
+        # Enviar en paralelo al chat de la sucursal y a los supervisores
+        chats = chats_para_sucursal(pedido.sucursal_id)
+        if not chats:
+            log.warning('Sin chats configurados para la sucursal %s; pedido %s no notificado', pedido.sucursal_id, pedido.numero_pedido)
+            return False
         reply_markup = _build_inline_keyboard(pedido.numero_pedido, 'Pendiente')
         payload = {
-            "chat_id": ADMIN_CHAT_ID,
             "text": mensaje,
             "parse_mode": "Markdown",
             "reply_markup": reply_markup
         }
-        resp = _send('sendMessage', payload)
-        ok = bool(resp.get('ok')) if isinstance(resp, dict) else False
+        respuestas = _enviar_a_chats(chats, payload)
+        ok = any(isinstance(r, dict) and r.get('ok') for r in respuestas)
         if ok:
-            print(f"✅ Notificación de Telegram enviada exitosamente para pedido {pedido.numero_pedido}")
+            log.info('Notificación del pedido %s enviada (%d chats)', pedido.numero_pedido, len(chats))
         else:
-            print(f"❌ Error al enviar notificación de Telegram: {resp}")
+            log.error('No se pudo notificar el pedido %s: %s', pedido.numero_pedido, respuestas)
         return ok
         
     except requests.exceptions.RequestException as e:
-        print(f"❌ Error de conexión al enviar notificación de Telegram: {e}")
+        log.error('Error de conexión notificando el pedido %s: %s', pedido.numero_pedido, e)
         return False
     except Exception as e:
-        print(f"❌ Error inesperado al enviar notificación de Telegram: {e}")
+        log.exception('Error inesperado notificando el pedido %s: %s', pedido.numero_pedido, e)
         return False
 
 def enviar_confirmacion(pedido):
@@ -192,30 +353,30 @@ def test_telegram_bot():
     Función para probar la conexión del bot
     """
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/getMe"
+        url = f"{API_URL}/getMe"
         response = requests.get(url, timeout=5)
         
         if response.status_code == 200:
             bot_info = response.json()
-            print(f"✅ Bot conectado: {bot_info['result']['first_name']} (@{bot_info['result']['username']})")
+            log.info('Bot conectado: %s (@%s)', bot_info['result']['first_name'], bot_info['result']['username'])
             return True
         else:
-            print(f"❌ Error al conectar con el bot: {response.status_code}")
+            log.error('Error al conectar con el bot: %s', response.status_code)
             return False
     except Exception as e:
-        print(f"❌ Error al probar el bot: {e}")
+        log.error('Error al probar el bot: %s', e)
         return False
 
 def procesar_update(update: dict):
     """Procesa un update entrante de Telegram (webhook)."""
     try:
-        print('[TELEGRAM] Update recibido bruto:', update)
+        volcado(log, 'Update recibido', update)
         if 'message' in update:
             message = update['message']
             chat_id = str(message.get('chat', {}).get('id'))
             text = (message.get('text') or '').strip()
-            if ALLOWED_CHATS and chat_id not in ALLOWED_CHATS:
-                print(f'[TELEGRAM] Ignorando mensaje de chat no autorizado {chat_id}')
+            if not chat_autorizado(chat_id):
+                log.info('Ignorando mensaje de chat no autorizado %s', chat_id)
                 return
             if text.startswith('/'):
                 manejar_comando(chat_id, text)
@@ -224,12 +385,10 @@ def procesar_update(update: dict):
             chat_id = str(cq.get('message', {}).get('chat', {}).get('id'))
             data = cq.get('data', '')
             message_id = cq.get('message', {}).get('message_id')
-            if ALLOWED_CHATS and chat_id not in ALLOWED_CHATS:
-                print(f'[TELEGRAM] Ignorando callback de chat no autorizado {chat_id}')
-                return
+            # La autorización por sucursal se hace en manejar_callback (depende del pedido)
             manejar_callback(chat_id, message_id, data, cq.get('id'))
     except Exception as e:
-        print('[TELEGRAM] Error procesando update:', e)
+        log.exception('Error procesando update: %s', e)
 
 def manejar_comando(chat_id: str, text: str):
     parts = text.split()
@@ -244,18 +403,28 @@ def manejar_comando(chat_id: str, text: str):
             estados_validos = ', '.join(sorted({v for v in ESTADOS_MAP.values()}))
             _send('sendMessage', {"chat_id": chat_id, "text": f"Estado inválido. Valores: {estados_validos}"})
             return
+        sucursal_id = _sucursal_de_pedido(numero)
+        if sucursal_id is not None and not chat_autorizado(chat_id, sucursal_id):
+            _send('sendMessage', {"chat_id": chat_id, "text": f"No autorizado para pedidos de la sucursal {sucursal_id}."})
+            return
         actualizar_estado_pedido_telegram(chat_id, numero, estado_destino)
     else:
         _send('sendMessage', {"chat_id": chat_id, "text": "Comando no reconocido."})
 
 def manejar_callback(chat_id: str, message_id: int, data: str, callback_id: Optional[str]):
     try:
-        print('[TELEGRAM] Callback recibido:', data)
+        log.debug('Callback recibido: %s', data)
         if data.startswith('update_status'):
             _, numero, estado_code = data.split('|', 2)
             estado_destino = ESTADOS_MAP.get(estado_code)
             if not estado_destino:
                 return
+            sucursal_id = _sucursal_de_pedido(numero)
+            if not chat_autorizado(chat_id, sucursal_id):
+                log.info('Ignorando callback de chat no autorizado %s (sucursal %s)', chat_id, sucursal_id)
+                if callback_id:
+                    _send('answerCallbackQuery', {"callback_query_id": callback_id, "text": "No autorizado para esta sucursal"})
+                return
             actualizar_estado_pedido_telegram(chat_id, numero, estado_destino, message_id=message_id, edit_original=True)
             # Enviar confirmación explícita en el chat
             _send('sendMessage', {
@@ -272,77 +441,170 @@ def manejar_callback(chat_id: str, message_id: int, data: str, callback_id: Opti
         elif data.startswith('noop') and callback_id:
             _send('answerCallbackQuery', {"callback_query_id": callback_id, "text": "Estado actual"})
     except Exception as e:
-        print('[TELEGRAM] Error en callback:', e)
+        log.exception('Error en callback: %s', e)
 
 def actualizar_estado_pedido_telegram(chat_id: str, numero_pedido: str, nuevo_estado: str, message_id: Optional[int]=None, edit_original: bool=False):
     """Actualiza el estado del pedido en DB y refleja en Telegram."""
     try:
         from extensions import db
         from models import PedidoCliente
-        pedido = PedidoCliente.query.filter_by(numero_pedido=numero_pedido).first()
-        if not pedido:
+        from resumen_ventas import cambiar_estado_pedido
+        from perfil_sqlite import escritura
+        # UPDATE directo (sin cargar el pedido completo) que también ajusta los resúmenes de ventas
+        with escritura():
+            anterior = cambiar_estado_pedido(PedidoCliente.numero_pedido == numero_pedido, nuevo_estado)
+        if anterior is None:
             _send('sendMessage', {"chat_id": chat_id, "text": f"Pedido {numero_pedido} no encontrado."})
             return
-        pedido.estado = nuevo_estado
-        db.session.commit()
-        print(f'[TELEGRAM] Pedido {numero_pedido} -> {nuevo_estado}')
+        log.info('Pedido %s -> %s', numero_pedido, nuevo_estado)
         # Broadcast SSE
         try:
             from event_bus import broadcast_pedido_estado
             broadcast_pedido_estado(numero_pedido, nuevo_estado)
         except Exception as be:
-            print('[TELEGRAM] Broadcast SSE fallo:', be)
+            log.warning('Broadcast SSE falló: %s', be)
         if edit_original and message_id:
             # Re-editar el mensaje completo con todos los detalles + estado actualizado
             try:
-                # Reusar parseo de productos
-                fecha_formateada = pedido.fecha.strftime('%d/%m/%Y %H:%M') if pedido.fecha else 'No disponible'
-                productos_texto = ""
-                try:
-                    productos_lista = json.loads(pedido.productos) if pedido.productos else []
-                    for producto in productos_lista:
-                        linea = f"• {producto.get('nombre','Producto')} x{producto.get('cantidad',1)}"
-                        # Opciones/complementos
-                        ops = producto.get('opciones_personalizadas') or []
-                        if ops:
-                            linea += " (" + ', '.join(ops) + ")"
-                        # Precio total del item
-                        linea += f" - ${producto.get('precio_total',0):.2f}\n"
-                        productos_texto += linea
-                except Exception:
-                    productos_texto = f"• {pedido.productos}\n"
-                mensaje_edit = build_pedido_message(pedido, estado_override=nuevo_estado, productos_texto=productos_texto, fecha_formateada=fecha_formateada)
+                mensaje_edit = mensaje_pedido(numero_pedido, nuevo_estado)
             except Exception as ie:
-                print('[TELEGRAM] Error reconstruyendo mensaje:', ie)
+                log.warning('Error reconstruyendo mensaje del pedido %s: %s', numero_pedido, ie)
+                mensaje_edit = None
+            if not mensaje_edit:
                 mensaje_edit = f"PEDIDO {numero_pedido} ACTUALIZADO A: {nuevo_estado.upper()}"
             reply_markup = _build_inline_keyboard(numero_pedido, nuevo_estado)
-            _send('editMessageText', {
-                'chat_id': chat_id,
-                'message_id': message_id,
-                'text': mensaje_edit,
-                'parse_mode': 'Markdown'
-            })
-            _send('editMessageReplyMarkup', {
-                'chat_id': chat_id,
-                'message_id': message_id,
-                'reply_markup': reply_markup
-            })
+            # Texto y teclado en una sola edición; toques rápidos se agrupan
+            _programar_edicion(chat_id, message_id, mensaje_edit, reply_markup)
         else:
             # No tenemos message_id (comando /estado): enviar mensaje separado resumen
             texto = f"PEDIDO {numero_pedido} ACTUALIZADO A: {nuevo_estado.upper()}"
             _send('sendMessage', {'chat_id': chat_id, 'text': texto})
     except Exception as e:
-        print('[TELEGRAM] Error actualizando estado:', e)
+        log.exception('Error actualizando estado del pedido %s: %s', numero_pedido, e)
         # Recuperar estado actual si existe
         try:
             from models import PedidoCliente
             from extensions import db
+            db.session.rollback()
             pedido = PedidoCliente.query.filter_by(numero_pedido=numero_pedido).first()
             estado_actual = pedido.estado if pedido else 'DESCONOCIDO'
         except Exception:
             estado_actual = 'DESCONOCIDO'
         _send('sendMessage', {"chat_id": chat_id, "text": f"ERROR AL ACTUALIZAR PEDIDO {numero_pedido} ESTADO ACTUAL: {estado_actual}"})
 
+# ---------------------------------------------------------------------------
+# Caché del mensaje renderizado por pedido
+# ---------------------------------------------------------------------------
+# Se guarda el texto completo con un marcador en lugar del estado, así un cambio de
+# estado no invalida nada: solo se sustituye el marcador. Cualquier otro cambio del
+# pedido (listener after_update) descarta la entrada.
+_MARCADOR_ESTADO = '\x00ESTADO\x00'
+MENSAJES_CACHE_MAX = int(os.getenv('TELEGRAM_MENSAJES_CACHE_MAX', '500'))
+_mensajes_cache = OrderedDict()  # numero_pedido -> texto con marcador
+_mensajes_lock = threading.Lock()
+
+def _productos_texto(pedido) -> str:
+    """Lista de productos en viñetas tal como se muestra en Telegram."""
+    productos_texto = ""
+    try:
+        productos_lista = json.loads(pedido.productos) if pedido.productos else []
+        for producto in productos_lista:
+            linea = f"• {producto.get('nombre','Producto')} x{producto.get('cantidad',1)}"
+            # Opciones/complementos
+            ops = producto.get('opciones_personalizadas') or []
+            if ops:
+                linea += " (" + ', '.join(ops) + ")"
+            # Precio total del item
+            linea += f" - ${producto.get('precio_total',0):.2f}\n"
+            productos_texto += linea
+    except Exception:
+        productos_texto = f"• {pedido.productos}\n"
+    return productos_texto
+
+def mensaje_pedido(numero_pedido: str, estado: str, pedido=None) -> Optional[str]:
+    """Devuelve el mensaje del pedido con `estado`, usando la caché si es posible.
+
+    Solo consulta la DB (o usa `pedido` si se pasa) cuando no hay entrada en caché.
+    Devuelve None si el pedido no existe.
+    """
+    with _mensajes_lock:
+        plantilla = _mensajes_cache.get(numero_pedido)
+        if plantilla is not None:
+            _mensajes_cache.move_to_end(numero_pedido)
+    metricas.cache('telegram_mensajes', plantilla is not None)
+    if plantilla is None:
+        if pedido is None:
+            from models import PedidoCliente
+            pedido = PedidoCliente.query.filter_by(numero_pedido=numero_pedido).first()
+            if not pedido:
+                return None
+        fecha_formateada = pedido.fecha.strftime('%d/%m/%Y %H:%M') if pedido.fecha else 'No disponible'
+        plantilla = build_pedido_message(pedido, estado_override=_MARCADOR_ESTADO,
+                                         productos_texto=_productos_texto(pedido),
+                                         fecha_formateada=fecha_formateada)
+        with _mensajes_lock:
+            _mensajes_cache[numero_pedido] = plantilla
+            while len(_mensajes_cache) > MENSAJES_CACHE_MAX:
+                _mensajes_cache.popitem(last=False)
+    return plantilla.replace(_MARCADOR_ESTADO, estado)
+
+def invalidar_mensaje_pedido(numero_pedido: str):
+    with _mensajes_lock:
+        _mensajes_cache.pop(numero_pedido, None)
+
+def _invalidar_por_cambio(mapper, connection, target):
+    """Listener ORM: invalida si cambió algo distinto del estado."""
+    estado_obj = inspect(target)
+    for attr in estado_obj.mapper.column_attrs:
+        if attr.key != 'estado' and estado_obj.attrs[attr.key].history.has_changes():
+            invalidar_mensaje_pedido(target.numero_pedido)
+            return
+
+def _invalidar_por_borrado(mapper, connection, target):
+    invalidar_mensaje_pedido(target.numero_pedido)
+
+def _registrar_invalidacion_cache():
+    from models import PedidoCliente
+    event.listen(PedidoCliente, 'after_update', _invalidar_por_cambio)
+    event.listen(PedidoCliente, 'after_delete', _invalidar_por_borrado)
+
+_registrar_invalidacion_cache()
+
+# ---------------------------------------------------------------------------
+# Ediciones agrupadas por mensaje
+# ---------------------------------------------------------------------------
+# Si el staff toca varios estados seguidos, solo se envía la última edición de cada
+# (chat_id, message_id) pasado EDIT_DEBOUNCE_SEG. Con 0 se edita al instante.
+EDIT_DEBOUNCE_SEG = float(os.getenv('TELEGRAM_EDIT_DEBOUNCE', '0.8'))
+_ediciones_pendientes = {}  # (chat_id, message_id) -> payload editMessageText
+_ediciones_lock = threading.Lock()
+
+def _programar_edicion(chat_id: str, message_id: int, texto: str, reply_markup: dict):
+    clave = (str(chat_id), message_id)
+    payload = {
+        'chat_id': chat_id,
+        'message_id': message_id,
+        'text': texto,
+        'parse_mode': 'Markdown',
+        'reply_markup': reply_markup,
+    }
+    if EDIT_DEBOUNCE_SEG <= 0:
+        _send('editMessageText', payload)
+        return
+    with _ediciones_lock:
+        ya_programada = clave in _ediciones_pendientes
+        _ediciones_pendientes[clave] = payload  # la más reciente reemplaza a la anterior
+    if not ya_programada:
+        t = threading.Timer(EDIT_DEBOUNCE_SEG, _enviar_edicion, args=(clave,))
+        t.daemon = True
+        t.start()
+
+def _enviar_edicion(clave):
+    with _ediciones_lock:
+        payload = _ediciones_pendientes.pop(clave, None)
+    if payload:
+        _send('editMessageText', payload)
+
 def build_pedido_message(pedido, *, estado_override: Optional[str]=None, productos_texto: Optional[str]=None, fecha_formateada: Optional[str]=None):
     """Genera el texto completo del pedido con todos los detalles para Telegram."""
     try:
@@ -383,10 +645,10 @@ def build_pedido_message(pedido, *, estado_override: Optional[str]=None, product
                 productos_lista = json.loads(productos_raw) if productos_raw else []
                 if isinstance(productos_lista, list):
                     if not productos_lista:
-                        print('[TELEGRAM] Debug: productos_lista vacío. Raw=', productos_raw)
+                        log.debug('Pedido %s sin productos (raw=%r)', pedido.numero_pedido, productos_raw)
                     for idx, producto in enumerate(productos_lista, start=1):
                         if not isinstance(producto, dict):
-                            print('[TELEGRAM] Debug: elemento productos_lista no dict:', producto)
+                            log.debug('Elemento de productos que no es dict en el pedido %s', pedido.numero_pedido)
                             continue
                         nombre = producto.get('nombre', 'Producto')
                         cantidad = int(producto.get('cantidad', 1) or 1)
@@ -454,5 +716,5 @@ def build_pedido_message(pedido, *, estado_override: Optional[str]=None, product
 """
         return mensaje
     except Exception as e:
-        print('[TELEGRAM] Error build_pedido_message:', e)
+        log.exception('Error armando el mensaje del pedido: %s', e)
         return f"Pedido {getattr(pedido,'numero_pedido','')} Estado: {getattr(pedido,'estado','')} Total: ${getattr(pedido,'total',0):.2f}"
@@ -0,0 +1,139 @@
+import json
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app
+from extensions import db
+from models import PedidoCliente, Sucursal
+
+
+@pytest.fixture
+def cliente():
+    with app.app_context():
+        PedidoCliente.query.delete()
+        db.session.commit()
+        sucursal = Sucursal.query.first()
+        if sucursal is None:
+            sucursal = Sucursal(nombre='Centro', direccion='Local', telefono='0', activa=True)
+            db.session.add(sucursal)
+            db.session.commit()
+        sucursal_id = sucursal.id
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['admin_logged_in'] = True
+        s['sucursales_permitidas'] = 'ALL'
+    yield client, sucursal_id
+    with app.app_context():
+        PedidoCliente.query.delete()
+        db.session.commit()
+
+
+def _crear_pedidos(sucursal_id, n):
+    base = datetime(2024, 5, 1, 12, 0)
+    with app.app_context():
+        for i in range(n):
+            db.session.add(PedidoCliente(
+                numero_pedido=f'PG{i:04d}', nombre='Cliente', telefono=f'55{i:08d}', calle='C', numero='1',
+                colonia='Centro', entre_calles='-', referencia='-', sucursal_id=sucursal_id,
+                productos=json.dumps([]), total=100.0,
+                # Varias filas comparten fecha para ejercitar el desempate por id
+                fecha=base + timedelta(minutes=i // 3),
+                estado='Entregado' if i % 2 else 'Pendiente', forma_pago='efectivo'))
+        db.session.commit()
+
+
+def _numeros(html):
+    # La tabla muestra el teléfono de cada pedido (único por pedido en estos datos)
+    return [f'PG{int(t):04d}' for t in re.findall(r'href="tel:55(\d{8})"', html)]
+
+
+def test_paginacion_keyset_recorre_todo_sin_repetir(cliente):
+    client, sucursal_id = cliente
+    _crear_pedidos(sucursal_id, 120)
+    vistos, url = [], '/admin/pedidos_clientes'
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        pagina = list(dict.fromkeys(_numeros(html)))
+        assert len(pagina) <= 50
+        vistos.extend(pagina)
+        m = re.search(r'href="(/admin/pedidos_clientes\?antes=[^"]+)"', html)
+        url = m.group(1).replace('&amp;', '&') if m else None
+    assert len(vistos) == 120
+    assert len(set(vistos)) == 120
+    assert vistos[0] == 'PG0119'
+
+
+def test_filtros_de_servidor(cliente):
+    client, sucursal_id = cliente
+    _crear_pedidos(sucursal_id, 10)
+    html = client.get('/admin/pedidos_clientes?estado=Pendiente').get_data(as_text=True)
+    assert set(_numeros(html)) == {f'PG{i:04d}' for i in range(0, 10, 2)}
+    html = client.get('/admin/pedidos_clientes?q=pg000').get_data(as_text=True)
+    assert len(set(_numeros(html))) == 10
+    html = client.get('/admin/pedidos_clientes?q=5500000003').get_data(as_text=True)
+    assert set(_numeros(html)) == {'PG0003'}
+    html = client.get('/admin/pedidos_clientes?desde=2024-05-02').get_data(as_text=True)
+    assert _numeros(html) == []
+
+
+def test_dashboard_agregado_respeta_sucursales(cliente):
+    from flask import template_rendered
+    client, sucursal_id = cliente
+    with app.app_context():
+        otra = Sucursal(nombre='Norte', direccion='Local', telefono='0', activa=True)
+        db.session.add(otra)
+        db.session.commit()
+        otra_id = otra.id
+        ahora, ayer = datetime.now(), datetime.now() - timedelta(days=1)
+        filas = [(sucursal_id, ahora, 'Pendiente', 100.0), (sucursal_id, ahora, 'Entregado', 50.0),
+                 (sucursal_id, ayer, 'En camino', 30.0), (sucursal_id, ayer, 'Entregado', 999.0),
+                 (otra_id, ahora, 'Pendiente', 70.0)]
+        for i, (sid, fecha, estado, total) in enumerate(filas):
+            db.session.add(PedidoCliente(numero_pedido=f'DB{i:04d}', sucursal_id=sid, fecha=fecha,
+                                         estado=estado, total=total, productos='[]'))
+        db.session.commit()
+        import resumen_ventas
+        resumen_ventas.reconstruir(ayer.date(), ahora.date())
+    contextos = []
+    registrar = lambda sender, template, context, **extra: contextos.append(context)
+    template_rendered.connect(registrar, app)
+    try:
+        client.get('/admin/')
+        with client.session_transaction() as s:
+            s['sucursales_permitidas'] = [sucursal_id]
+        client.get('/admin/')
+    finally:
+        template_rendered.disconnect(registrar, app)
+        with app.app_context():
+            PedidoCliente.query.delete()
+            db.session.delete(db.session.get(Sucursal, otra_id))
+            db.session.commit()
+    todos, propios = contextos[0], contextos[-1]
+    assert (todos['total_pedidos_hoy'], todos['ingresos_hoy'], todos['pedidos_pendientes']) == (3, 220.0, 2)
+    assert (propios['total_pedidos_hoy'], propios['ingresos_hoy'], propios['pedidos_pendientes']) == (2, 150.0, 1)
+    assert propios['pedidos_en_camino'] == 1 and propios['pedidos_completados_hoy'] == 1
+    assert [s.id for s in propios['sucursales_stats']] == [sucursal_id]
+
+
+def test_export_streaming_csv_ndjson_gzip(cliente):
+    import gzip
+    client, sucursal_id = cliente
+    _crear_pedidos(sucursal_id, 2500)
+    resp = client.get('/admin/pedidos_clientes/export?estado=Pendiente')
+    assert resp.is_streamed
+    lineas = resp.get_data(as_text=True).splitlines()
+    assert lineas[0].startswith('numero_pedido,fecha,estado')
+    assert len(lineas) == 1 + 1250
+
+    resp = client.get('/admin/pedidos_clientes/export?formato=ndjson&gzip=1&q=PG000')
+    assert resp.mimetype == 'application/gzip'
+    registros = [json.loads(l) for l in gzip.decompress(resp.get_data()).decode('utf-8').splitlines()]
+    assert [r['numero_pedido'] for r in registros] == [f'PG{i:04d}' for i in range(10)]
+    assert registros[0]['sucursal'] and registros[0]['productos'] == []
+
+    # Un admin limitado a otra sucursal no exporta nada
+    with client.session_transaction() as s:
+        s['sucursales_permitidas'] = [sucursal_id + 1000]
+    assert client.get('/admin/pedidos_clientes/export').get_data(as_text=True).count('\n') == 1
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+# Presupuesto holgado para máquinas de CI lentas; en producción el import ronda 0.4 s
+PRESUPUESTO_IMPORT_SEG = float(os.getenv('ARRANQUE_PRESUPUESTO_SEG', '1.5'))
+
+_SCRIPT = r'''
+import json, socket
+def _sin_red(*a, **k):
+    raise AssertionError('red durante el arranque: %r' % (a,))
+socket.create_connection = _sin_red
+socket.socket.connect = _sin_red
+import app as m
+r = m.app.test_client().get('/health')
+print(json.dumps({'import': m.app.config['ARRANQUE_IMPORT_SEG'],
+                  'primer_request': m.app.config['ARRANQUE_PRIMER_REQUEST_SEG'], 'status': r.status_code}))
+'''
+
+
+def test_arranque_sin_red_y_dentro_del_presupuesto(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'arranque.db'}", TELEGRAM_TOKEN='123:abc',
+               TELEGRAM_AUTO_WEBHOOK='1', TELEGRAM_WEBHOOK_BASE='https://ejemplo.invalid',
+               ADMIN_DEFAULT_USER='admin', ADMIN_DEFAULT_PASS='x')
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    # Primera corrida: crea el esquema (SQLite migra solo); la segunda mide un arranque normal
+    for _ in range(2):
+        salida = subprocess.run([sys.executable, '-c', _SCRIPT], cwd=cwd, env=env,
+                                capture_output=True, text=True, timeout=60)
+        assert salida.returncode == 0, salida.stderr[-2000:]
+    datos = json.loads(salida.stdout.strip().splitlines()[-1])
+    assert datos['status'] == 200
+    assert datos['import'] < PRESUPUESTO_IMPORT_SEG
+    assert datos['primer_request'] < PRESUPUESTO_IMPORT_SEG + 0.5
+
+
+def test_create_app_con_config_y_precalentado(tmp_path):
+    import app as modulo
+    nueva = modulo.create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'fabrica.db'}",
+                               'INICIAR_HILOS': False})
+    assert nueva is not modulo.app
+    assert {'catalogo', 'health', 'admin.dashboard'} <= set(nueva.view_functions)
+    modulo.precalentar(nueva)
+    modulo.al_iniciar_worker(nueva)
+    try:
+        assert nueva.test_client().get('/catalogo').status_code == 200
+    finally:
+        import gc
+        gc.unfreeze()
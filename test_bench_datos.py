@@ -0,0 +1,45 @@
+"""El generador de datos a escala (bench/datos.py): reproducible y con datos que la app acepta."""
+import re
+from datetime import datetime
+
+import pytest
+
+from bench import datos
+
+HASTA = datetime(2026, 3, 14, 21, 30)
+
+
+def _generar(crear_app, semilla):
+    app = crear_app()
+    resumen = datos.generar(app, sucursales=3, productos=30, n_pedidos=400, dias=20, semilla=semilla,
+                            lote=150, salida=lambda _msg: None, hasta=HASTA)
+    from sqlalchemy import select
+    from extensions import db
+    from models import PedidoCliente, VentaDiaria
+    with app.app_context():
+        filas = db.session.execute(select(PedidoCliente.numero_pedido, PedidoCliente.total, PedidoCliente.fecha)
+                                   .order_by(PedidoCliente.id)).all()
+        dias_con_ventas = db.session.scalar(select(db.func.count()).select_from(VentaDiaria))
+    return app, resumen, filas, dias_con_ventas
+
+
+def test_misma_semilla_mismos_pedidos(crear_app):
+    _, resumen, filas, dias_con_ventas = _generar(crear_app, 7)
+    _, _, otra_vez, _ = _generar(crear_app, 7)
+    _, _, distinta, _ = _generar(crear_app, 8)
+    assert resumen['pedidos'] == len(filas) == 400 and resumen['hasta'] == '2026-03-14T21:30:00'
+    # Con el mismo --hasta las fechas también coinciden, aunque se genere otro día
+    assert filas == otra_vez
+    assert [t for _, t, _ in filas] != [t for _, t, _ in distinta]
+    numeros = [n for n, _, _ in filas]
+    assert len(set(numeros)) == len(numeros) and all(re.fullmatch(r'[A-Z]{2}\d{6}', n) for n in numeros)
+    # Los ids siguen el orden de las fechas, como en una base real
+    fechas = [f for _, _, f in filas]
+    assert fechas == sorted(fechas) and fechas[-1] <= HASTA
+    assert dias_con_ventas > 0
+
+
+def test_rechaza_una_base_con_datos(crear_app):
+    app, *_ = _generar(crear_app, 1)
+    with pytest.raises(SystemExit):
+        datos.generar(app, sucursales=1, productos=2, n_pedidos=1, salida=lambda _msg: None)
@@ -0,0 +1,28 @@
+"""El benchmark de rutas (bench/rutas.py) corre de punta a punta en modo test client."""
+import json
+
+import pytest
+
+import metricas
+from bench import rutas
+
+
+@pytest.fixture(autouse=True)
+def _metricas_limpias():
+    yield
+    # El modo cliente corre la app en este proceso: no dejar sus conteos a otras pruebas
+    metricas.reiniciar()
+
+
+def test_todas_las_rutas_responden_y_reportan_sql(tmp_path):
+    salida = tmp_path / 'rutas.json'
+    rutas.main(['--modos', 'cliente', '--peticiones', '4', '--calentamiento', '1', '--productos', '6',
+                '--pedidos', '20', '--json', str(salida)])
+    datos = json.loads(salida.read_text())
+    filas = {r['ruta']: r for r in datos['resultados']['cliente']}
+    assert set(filas) == {nombre for nombre, *_ in rutas.RUTAS}
+    for fila in filas.values():
+        assert fila['errores'] == 0, fila
+        assert fila['p99_ms'] >= fila['p50_ms'] > 0
+        assert fila['sql_por_request'] >= 1
+    assert datos['git']['commit']
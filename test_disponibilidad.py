@@ -0,0 +1,107 @@
+import pytest
+
+import catalogo
+from app import app
+from extensions import db
+from models import CatalogoParticion, Categoria, MenuItem, MenuItemSucursal, Sucursal
+
+
+def _limpiar():
+    MenuItemSucursal.query.delete()
+    MenuItem.query.delete()
+    Categoria.query.delete()
+    CatalogoParticion.query.delete()
+    Sucursal.query.filter(Sucursal.nombre.in_(['Centro', 'Norte'])).delete()
+    db.session.commit()
+    catalogo.limpiar_cache()
+
+
+@pytest.fixture
+def datos():
+    with app.app_context():
+        _limpiar()
+        centro, norte = Sucursal(nombre='Centro', activa=True), Sucursal(nombre='Norte', activa=True)
+        cat = Categoria(nombre='Pozoles')
+        db.session.add_all([centro, norte, cat])
+        db.session.flush()
+        productos = [MenuItem(nombre=f'Pozole {i}', precio=100, categoria_id=cat.id) for i in range(5)]
+        db.session.add_all(productos)
+        db.session.flush()
+        db.session.add_all(MenuItemSucursal(menuitem_id=p.id, sucursal_id=s.id, disponible=True)
+                           for p in productos for s in (centro, norte))
+        db.session.commit()
+        yield centro.id, norte.id, [p.id for p in productos]
+        _limpiar()
+
+
+def test_agotar_en_una_sucursal_solo_invalida_su_particion(datos):
+    centro, norte, ids = datos
+    with app.app_context():
+        catalogo.disponibilidad()  # llena la caché
+        version_menu = catalogo.version_actual()
+        antes = dict(db.session.query(CatalogoParticion.sucursal_id, CatalogoParticion.version).all())
+
+        assert catalogo.cambiar_disponibilidad(ids[:3], [centro], False) == 3
+        # Repetir no reescribe filas ni sube versiones
+        assert catalogo.cambiar_disponibilidad(ids[:3], [centro], False) == 0
+
+        despues = dict(db.session.query(CatalogoParticion.sucursal_id, CatalogoParticion.version).all())
+        assert despues[centro] == antes[centro] + 1
+        assert despues.get(norte) == antes.get(norte)
+        assert catalogo.version_actual() == version_menu
+
+        disp = catalogo.disponibilidad()
+        assert disp[centro] == frozenset(ids[3:])
+        assert disp[norte] == frozenset(ids)
+
+        productos, _ = catalogo.catalogo()
+        por_id = {p['id']: p['sucursales'] for p in productos}
+        assert por_id[ids[0]] == [str(norte)]
+        assert sorted(por_id[ids[4]]) == sorted([str(centro), str(norte)])
+
+
+def test_editar_producto_sube_version_del_menu(datos):
+    _, _, ids = datos
+    with app.app_context():
+        version = catalogo.version_actual()
+        db.session.get(MenuItem, ids[0]).precio = 120
+        db.session.commit()
+        assert catalogo.version_actual() == version + 1
+        productos, _ = catalogo.catalogo()
+        assert next(p for p in productos if p['id'] == ids[0])['precio'] == 120
+
+
+def test_api_admin_respeta_sucursales_permitidas(datos):
+    centro, norte, ids = datos
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['admin_logged_in'] = True
+        s['sucursales_permitidas'] = [centro]
+    r = client.post('/admin/api/disponibilidad', json={'productos': ids, 'sucursales': [centro, norte],
+                                                         'disponible': False})
+    assert r.status_code == 200 and r.get_json()['sucursales'] == [centro]
+    r = client.get('/catalogo/disponibilidad', query_string={'sucursal': norte})
+    assert r.get_json() == {str(norte): ids}
+    r = client.get('/catalogo/disponibilidad', query_string={'sucursal': centro})
+    assert r.get_json() == {str(centro): []}
+    assert client.get('/admin/disponibilidad').status_code == 200
+    assert b'data-id=' in client.get('/catalogo').data
+
+
+def test_catalogo_abierto_consulta_con_etag(datos):
+    centro, norte, ids = datos
+    client = app.test_client()
+    r = client.get('/catalogo/disponibilidad', query_string={'sucursal': centro})
+    etag = r.headers['ETag']
+    # Sin cambios: 304 sin cuerpo; agotar en otra sucursal tampoco cambia la de centro
+    assert client.get('/catalogo/disponibilidad', query_string={'sucursal': centro},
+                      headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        catalogo.cambiar_disponibilidad(ids[:1], [norte], False)
+    assert client.get('/catalogo/disponibilidad', query_string={'sucursal': centro},
+                      headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        catalogo.cambiar_disponibilidad(ids[:1], [centro], False)
+    r = client.get('/catalogo/disponibilidad', query_string={'sucursal': centro}, headers={'If-None-Match': etag})
+    assert r.status_code == 200 and r.get_json() == {str(centro): ids[1:]}
+    assert b'/sse/catalogo' not in client.get('/catalogo').data
@@ -0,0 +1,26 @@
+import dispositivo
+from app import app
+
+UA_IPHONE = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148'
+UA_ESCRITORIO = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36'
+
+
+def test_clasificacion_cacheada():
+    dispositivo._clasificar.cache_clear()
+    assert dispositivo.clase_dispositivo(UA_IPHONE) == 'mobile'
+    assert dispositivo.clase_dispositivo(UA_ESCRITORIO) == 'desktop'
+    assert dispositivo.clase_dispositivo(None) == 'desktop'
+    dispositivo.clase_dispositivo(UA_IPHONE)
+    assert dispositivo._clasificar.cache_info().hits == 1
+
+
+def test_variantes_y_vary():
+    with app.test_request_context(headers={'User-Agent': UA_IPHONE}):
+        assert dispositivo.plantilla('catalogo') == 'catalogo_mobile.html'
+        assert dispositivo.plantilla('admin/dashboard') == 'admin/dashboard_mobile.html'
+    with app.test_request_context(headers={'User-Agent': UA_ESCRITORIO}):
+        assert dispositivo.plantilla('catalogo') == 'catalogo_desktop.html'
+    client = app.test_client()
+    r = client.get('/consultar-pedido', headers={'User-Agent': UA_IPHONE})
+    assert r.status_code == 200 and 'User-Agent' in r.headers.get('Vary', '')
+    assert 'User-Agent' not in client.get('/health').headers.get('Vary', '')
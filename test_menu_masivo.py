@@ -0,0 +1,97 @@
+import pytest
+
+import catalogo
+import menu_masivo
+from app import app
+from extensions import db
+from models import Categoria, MenuItem, MenuItemSucursal, OpcionPersonalizada, Sucursal, ValorOpcion
+
+
+def _limpiar():
+    for modelo in (ValorOpcion, OpcionPersonalizada, MenuItemSucursal, MenuItem, Categoria):
+        modelo.query.delete()
+    Sucursal.query.filter(Sucursal.nombre.in_(['Centro', 'Norte'])).delete()
+    db.session.commit()
+
+
+@pytest.fixture
+def ctx():
+    with app.app_context():
+        _limpiar()
+        db.session.add_all([Sucursal(nombre='Centro', activa=True), Sucursal(nombre='Norte', activa=True)])
+        db.session.commit()
+        yield
+        _limpiar()
+
+
+def _menu(n, precio=100.0):
+    return {'formato': 1, 'categorias': ['Pozoles'], 'productos': [
+        {'nombre': f'Producto {i}', 'descripcion': 'x', 'precio': precio, 'imagen': '', 'categoria': 'Pozoles',
+         'sucursales': {'Centro': True, 'Norte': i % 2 == 0},
+         'opciones': [{'titulo': 'Tamaño', 'tipo': 'radio', 'obligatorio': True,
+                       'valores': [{'texto': 'Chico', 'precio': 0}, {'texto': 'Grande', 'precio': 30}]}]}
+        for i in range(n)]}
+
+
+def test_importar_simular_aplicar_y_exportar(ctx):
+    version = catalogo.version_actual()
+    resumen = menu_masivo.importar_menu(_menu(50), simular=True)
+    assert len(resumen['productos_nuevos']) == 50 and not resumen['aplicado']
+    assert MenuItem.query.count() == 0
+
+    resumen = menu_masivo.importar_menu(_menu(50))
+    assert resumen['aplicado']
+    assert catalogo.version_actual() == version + 1
+    assert MenuItem.query.count() == 50
+    assert MenuItemSucursal.query.count() == 100
+    assert ValorOpcion.query.count() == 100
+
+    # Re-importar lo exportado no cambia nada ni sube la versión
+    exportado = menu_masivo.exportar_menu()
+    resumen = menu_masivo.importar_menu(exportado)
+    assert not resumen['aplicado'] and resumen['sin_cambios'] == 50
+    assert catalogo.version_actual() == version + 1
+
+    # Cambio de precio, disponibilidad y opciones de un producto
+    exportado['productos'][0]['precio'] = 150.0
+    exportado['productos'][1]['sucursales']['Norte'] = True
+    exportado['productos'][2]['opciones'][0]['valores'].append({'texto': 'Familiar', 'precio': 80})
+    resumen = menu_masivo.importar_menu(exportado)
+    assert resumen['productos_modificados'] == {'Producto 0': ['precio']}
+    assert resumen['cambios_disponibilidad'] == 1
+    assert resumen['opciones_reemplazadas'] == ['Producto 2']
+    assert catalogo.version_actual() == version + 2
+    assert menu_masivo.exportar_menu() == exportado
+
+
+def test_importar_rechaza_sucursal_desconocida(ctx):
+    datos = _menu(1)
+    datos['productos'][0]['sucursales'] = {'Sur': True}
+    with pytest.raises(menu_masivo.ErrorImportacion):
+        menu_masivo.importar_menu(datos)
+    assert MenuItem.query.count() == 0
+
+
+@pytest.mark.parametrize('danar, mensaje', [
+    (lambda d: d['productos'][0]['opciones'][0]['valores'][1].update(precio='abc'),
+     'Producto "Producto 0", valor "Grande": precio inválido'),
+    (lambda d: d['productos'].append('Pozole verde'), 'Producto #2: se esperaba un objeto'),
+    (lambda d: d['productos'][0].update(sucursales=['Centro']), 'Producto "Producto 0", sucursales: se esperaba un objeto'),
+    (lambda d: d['productos'][0]['opciones'].append(None), 'Producto "Producto 0", opción: se esperaba un objeto'),
+])
+def test_importar_rechaza_archivo_mal_formado(ctx, danar, mensaje):
+    import io
+    import json
+    from markupsafe import escape
+    datos = _menu(1)
+    danar(datos)
+    with pytest.raises(menu_masivo.ErrorImportacion, match=mensaje.replace('"', '.')):
+        menu_masivo.importar_menu(datos)
+    # Desde el admin sale como aviso, no como error 500
+    client = app.test_client()
+    with client.session_transaction() as sesion:
+        sesion.update(admin_logged_in=True, admin_rol='super', admin_user='admin', admin_id=1)
+    respuesta = client.post('/admin/menu/importar', content_type='multipart/form-data',
+                            data={'archivo': (io.BytesIO(json.dumps(datos).encode()), 'menu.json')})
+    assert respuesta.status_code == 200 and str(escape(mensaje)) in respuesta.get_data(as_text=True)
+    assert MenuItem.query.count() == 0
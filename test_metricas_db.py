@@ -0,0 +1,49 @@
+"""Instrumentación del pool y de consultas expuesta en /health/metricas."""
+import pytest
+
+import metricas
+from extensions import db
+from models import Sucursal
+
+
+@pytest.fixture
+def app(app):
+    with app.app_context():
+        db.session.add(Sucursal(nombre='Centro', activa=True))
+        db.session.commit()
+    return app
+
+
+def _valores(datos, nombre, **etiquetas):
+    return [v['valor'] for v in datos[nombre]['valores'] if all(v['etiquetas'].get(k) == x for k, x in etiquetas.items())]
+
+
+def test_consultas_por_endpoint_y_pool(app):
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get('/api/sucursales').status_code == 200
+    datos = client.get('/health/metricas').get_json()
+    por_request = _valores(datos, 'db_sentencias_por_request', endpoint='api_sucursales')
+    assert por_request and por_request[0]['total'] == 3 and por_request[0]['suma'] >= 3
+    assert _valores(datos, 'db_pool_checkout_segundos', bind='default')[0]['total'] >= 3
+    assert _valores(datos, 'db_pool_conexiones', bind='default', estado='en_uso') == [0]
+    lentas = datos['db_sentencias_lentas']['api_sucursales']
+    assert lentas and 'FROM sucursal' in lentas[0]['sql']
+
+
+def test_preping_fallido_se_cuenta(app, monkeypatch):
+    with app.app_context():
+        engine = db.engine
+        engine.connect().close()  # deja una conexión usada en el pool (las nuevas no se pinguean)
+        antes = sum(v for _, v in metricas.contador('db_pool_preping_fallidos_total', '').valores())
+        monkeypatch.setattr(engine.dialect, 'do_ping', lambda conexion: False)
+        engine.connect().close()
+        despues = sum(v for _, v in metricas.contador('db_pool_preping_fallidos_total', '').valores())
+    assert despues == antes + 1
+
+
+def test_token_de_metricas(app, monkeypatch):
+    monkeypatch.setenv('METRICAS_TOKEN', 'secreto')
+    client = app.test_client()
+    assert client.get('/health/metricas').status_code == 401
+    assert client.get('/health/metricas', headers={'Authorization': 'Bearer secreto'}).status_code == 200
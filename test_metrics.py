@@ -0,0 +1,56 @@
+"""/metrics en formato Prometheus y agregación de varios workers por directorio compartido."""
+import json
+import subprocess
+import sys
+
+import pytest
+
+import metricas
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _linea(texto, prefijo):
+    return next((l for l in texto.splitlines() if l.startswith(prefijo)), None)
+
+
+def test_latencia_por_endpoint_y_en_curso(client):
+    client.get('/api/sucursales')
+    respuesta = client.get('/metrics')
+    assert respuesta.status_code == 200 and respuesta.mimetype == 'text/plain'
+    texto = respuesta.get_data(as_text=True)
+    assert '# TYPE http_request_segundos histogram' in texto
+    infinito = _linea(texto, 'http_request_segundos_bucket{endpoint="api_sucursales",metodo="GET",status="200",le="+Inf"}')
+    conteo = _linea(texto, 'http_request_segundos_count{endpoint="api_sucursales",metodo="GET",status="200"}')
+    assert infinito and conteo and infinito.split()[-1] == conteo.split()[-1]
+    # El propio /metrics está en curso mientras se genera
+    assert _linea(texto, 'http_requests_en_curso{pid=').endswith(' 1')
+    assert '# TYPE sse_suscriptores gauge' in texto
+
+
+def test_suma_workers_y_descarta_medidores_de_muertos(tmp_path):
+    muerto = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True, check=True)
+    pid = int(muerto.stdout)
+    (tmp_path / f'{pid}.json').write_text(json.dumps({
+        'pedidos_creados_total': {'tipo': 'counter', 'ayuda': 'Pedidos creados por sucursal', 'etiquetas': ['sucursal'],
+                                  'buckets': [], 'valores': [[['1'], 5]]},
+        'http_requests_en_curso': {'tipo': 'gauge', 'ayuda': 'x', 'etiquetas': [], 'buckets': [], 'valores': [[[], 3]]},
+    }))
+    propios = metricas.contador('pedidos_creados_total', 'Pedidos creados por sucursal', ('sucursal',))
+    antes = dict((tuple(e.values()), v) for e, v in propios.valores()).get(('1',), 0)
+    propios.inc(2, sucursal=1)
+    texto = metricas.texto_prometheus(str(tmp_path))
+    assert _linea(texto, 'pedidos_creados_total{sucursal="1"}') == f'pedidos_creados_total{{sucursal="1"}} {antes + 7}'
+    assert f'pid="{pid}"' not in texto
+
+
+def test_ratio_de_cache():
+    metricas.CACHE.limpiar()
+    for acierto in (True, True, True, False):
+        metricas.cache('prueba', acierto)
+    texto = metricas.texto_prometheus()
+    assert 'cache_aciertos_ratio{cache="prueba"} 0.75' in texto
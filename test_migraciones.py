@@ -0,0 +1,30 @@
+from sqlalchemy import create_engine, inspect, text
+
+import migraciones
+from app import app
+
+
+def test_migrar_es_idempotente_y_agrega_columnas(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'vieja.db'}")
+    with engine.begin() as conexion:  # base anterior a los roles y sin schema_version
+        conexion.execute(text('CREATE TABLE administrador (id INTEGER PRIMARY KEY, usuario VARCHAR(50), '
+                              'password VARCHAR(100), nombre VARCHAR(100))'))
+    with app.app_context():
+        aplicadas = migraciones.migrar(engine)
+        assert len(aplicadas) == len(migraciones.MIGRACIONES)
+        assert migraciones.migrar(engine) == []
+    inspector = inspect(engine)
+    assert 'rol' in {c['name'] for c in inspector.get_columns('administrador')}
+    assert 'ix_pedidocliente_fecha' in {i['name'] for i in inspector.get_indexes('pedidocliente')}
+    with engine.connect() as conexion:
+        assert migraciones.version_esquema(conexion) == migraciones.VERSION_ACTUAL
+
+
+def test_version_sin_tabla_es_cero(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'vacia.db'}")
+    with engine.connect() as conexion:
+        assert migraciones.version_esquema(conexion) == 0
+
+
+def test_app_arranca_con_esquema_al_dia():
+    assert app.extensions['esquema_version'] == migraciones.VERSION_ACTUAL
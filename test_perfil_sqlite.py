@@ -0,0 +1,66 @@
+"""Perfil de SQLite: PRAGMAs por conexión y escrituras concurrentes sin "database is locked"."""
+import threading
+
+import pytest
+from sqlalchemy import func, text
+
+from extensions import db
+from models import PedidoCliente, Sucursal
+from perfil_sqlite import escritura
+
+
+@pytest.fixture
+def config_app():
+    return {'SQLITE_PERFIL': True}
+
+
+@pytest.fixture
+def app(app):
+    with app.app_context():
+        db.session.add(Sucursal(id=1, nombre='Centro', activa=True))
+        db.session.commit()
+    return app
+
+
+def test_pragmas_en_cada_conexion(app):
+    with app.app_context():
+        valor = lambda pragma: db.session.execute(text(f'PRAGMA {pragma}')).scalar()
+        assert valor('journal_mode') == 'wal'
+        assert valor('synchronous') == 1  # NORMAL
+        assert valor('busy_timeout') > 0
+        assert valor('mmap_size') > 0
+
+
+def test_escrituras_concurrentes_no_fallan_por_lock(app):
+    hilos, por_hilo, errores = 8, 15, []
+
+    def trabajar(n):
+        try:
+            for i in range(por_hilo):
+                with app.app_context():
+                    # Lee y luego escribe, como el checkout (número único + INSERT)
+                    with escritura():
+                        previos = db.session.query(func.count(PedidoCliente.id)).scalar()
+                        db.session.add(PedidoCliente(numero_pedido=f'T{n}{i:03d}{previos}', telefono='0',
+                                                     sucursal_id=1, total=1, estado='Pendiente'))
+        except Exception as e:
+            errores.append(e)
+
+    trabajadores = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    assert not errores
+    with app.app_context():
+        assert PedidoCliente.query.count() == hilos * por_hilo
+
+
+def test_escritura_hace_rollback_si_falla(app):
+    with app.app_context():
+        with pytest.raises(RuntimeError):
+            with escritura():
+                db.session.add(PedidoCliente(numero_pedido='RB000001', telefono='0', sucursal_id=1, total=1))
+                db.session.flush()
+                raise RuntimeError('falla a mitad')
+        assert PedidoCliente.query.filter_by(numero_pedido='RB000001').count() == 0
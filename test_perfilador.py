@@ -0,0 +1,59 @@
+"""Perfilado a pedido: acceso restringido, desglose SQL/plantillas/Python y descarga en pilas colapsadas."""
+import time
+
+import pytest
+
+import perfilador
+
+
+def _como_super(client):
+    with client.session_transaction() as sesion:
+        sesion.update(admin_logged_in=True, admin_rol='super', admin_user='prueba')
+
+
+def test_sin_permiso_no_se_perfila(app):
+    client = app.test_client()
+    assert 'X-Perfil-Id' not in client.get('/catalogo?_perfil=1').headers
+    vencida = perfilador.firmar(int(time.time()) - 1, app.config['SECRET_KEY'])
+    assert 'X-Perfil-Id' not in client.get('/catalogo?_perfil=1', headers={'X-Perfil': vencida}).headers
+    ajena = perfilador.firmar(int(time.time()) + 60, 'otro-secreto')
+    assert 'X-Perfil-Id' not in client.get('/catalogo?_perfil=1', headers={'X-Perfil': ajena}).headers
+
+
+@pytest.mark.parametrize('modo', ['determinista', 'muestreo'])
+def test_desglose_y_sentencias_con_firma(app, modo):
+    firma = perfilador.firmar(int(time.time()) + 60, app.config['SECRET_KEY'])
+    respuesta = app.test_client().get(f'/catalogo?_perfil={modo}', headers={'X-Perfil': firma})
+    assert respuesta.status_code == 200
+    perfil = perfilador.buscar(respuesta.headers['X-Perfil-Id'])
+    assert perfil['endpoint'] == 'catalogo' and perfil['modo'] == modo
+    assert perfil['sentencias'] and all(s['segundos'] >= 0 for s in perfil['sentencias'])
+    assert set(perfil['desglose_seg']) == {'sql', 'plantillas', 'python'}
+    if modo == 'determinista':
+        # Con setprofile no se escapa nada: la consulta y el render tienen que aparecer
+        assert perfil['desglose_seg']['sql'] > 0 and perfil['desglose_seg']['plantillas'] > 0
+    assert 'sql;dur=' in respuesta.headers['Server-Timing']
+
+
+def test_super_admin_descarga_pilas_colapsadas(app):
+    client = app.test_client()
+    _como_super(client)
+    directo = client.get('/catalogo?_perfil=determinista&_perfil_salida=folded')
+    assert directo.mimetype == 'text/plain' and 'attachment' in directo.headers['Content-Disposition']
+    lineas = [l.rsplit(' ', 1) for l in directo.get_data(as_text=True).splitlines()]
+    assert all(int(peso) >= 1 for _, peso in lineas)
+    assert any('app:catalogo;' in pila for pila, _ in lineas)
+
+    listado = client.get('/admin/perfiles').get_json()
+    ids = [p['id'] for p in listado['perfiles']['catalogo']]
+    assert directo.headers['X-Perfil-Id'] in ids
+    descarga = client.get(f"/admin/perfiles/{directo.headers['X-Perfil-Id']}.folded")
+    assert descarga.status_code == 200 and descarga.get_data(as_text=True) == directo.get_data(as_text=True)
+
+
+def test_guarda_solo_los_mas_lentos_por_endpoint(monkeypatch):
+    monkeypatch.setattr(perfilador, '_guardados', {})
+    monkeypatch.setattr(perfilador, 'POR_ENDPOINT', 2)
+    for i, duracion in enumerate((0.3, 0.1, 0.5, 0.2)):
+        perfilador._guardar({'id': str(i), 'endpoint': 'x', 'duracion_seg': duracion, 'pilas': {}})
+    assert [p['id'] for p in perfilador.guardados()['x']] == ['2', '0']
@@ -0,0 +1,140 @@
+"""Regresión de planes: las consultas calientes de tienda y admin deben usar índices.
+
+Llena una base aparte con bench/datos.py (SQLite temporal, o PLANES_DATABASE_URL para correrlo contra
+Postgres), que ya corre ANALYZE. Cada caso hace requests reales a la app, captura las sentencias que
+emite y revisa el plan de cada una con sus mismos parámetros:
+
+* SQLite: ``EXPLAIN QUERY PLAN``; la tabla debe aparecer como SEARCH (acceso por índice), no SCAN
+  ni skip-scan (``ANY(…)``, un índice que no empieza por la columna filtrada).
+  Se admite recorrer un índice en orden (``SCAN … USING INDEX``) cuando la sentencia lleva LIMIT,
+  como la página de pedidos más recientes.
+* Postgres: ``EXPLAIN`` con enable_seqscan=off; si aun así sale "Seq Scan" es que no hay índice utilizable.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, select
+
+from bench import datos
+from extensions import db
+from models import MenuItemSucursal, OpcionPersonalizada, PedidoCliente
+
+SUCURSALES, PRODUCTOS, PEDIDOS = 30, 400, 6000
+HASTA = datetime(2025, 7, 1, 22)
+
+
+@pytest.fixture(scope='module')
+def base(crear_app):
+    import os
+    import catalogo
+    import horarios
+    app = crear_app(os.getenv('PLANES_DATABASE_URL'))
+    datos.generar(app, sucursales=SUCURSALES, productos=PRODUCTOS, n_pedidos=PEDIDOS, dias=180, hasta=HASTA,
+                  salida=lambda _msg: None)
+    catalogo.limpiar_cache()
+    horarios.invalidar()
+    # Cachés llenas, como en producción: la carga en frío lee tablas completas a propósito
+    app.test_client().get('/catalogo')
+    with app.app_context():
+        yield app, _valores()
+
+
+def _valores():
+    """Datos reales de la base para armar las rutas de los casos."""
+    pedido = db.session.scalars(select(PedidoCliente).where(PedidoCliente.sucursal_id.in_([2, 9]))
+                                .order_by(PedidoCliente.fecha.desc(), PedidoCliente.id.desc()).offset(50).limit(1)).one()
+    disponibles = db.session.scalars(select(MenuItemSucursal.menuitem_id).where(
+        MenuItemSucursal.sucursal_id == 7, MenuItemSucursal.disponible.is_(True)).limit(2)).all()
+    return {
+        'numero': pedido.numero_pedido,
+        'cursor': f'{pedido.fecha.isoformat()}_{pedido.id}',
+        'dia': (HASTA - timedelta(days=30)).date().isoformat(),
+        'producto': db.session.scalar(select(OpcionPersonalizada.menuitem_id).limit(1)),
+        'agotar': {'productos': disponibles, 'sucursales': [7], 'disponible': False},
+    }
+
+
+@contextmanager
+def _capturar():
+    sentencias = []
+
+    def anotar(_conexion, _cursor, statement, parameters, _contexto, _varios):
+        if statement.lstrip().upper().startswith('SELECT'):
+            sentencias.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', anotar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', anotar)
+
+
+def _plan(statement, parameters):
+    with db.engine.connect() as conexion:
+        if db.engine.dialect.name == 'sqlite':
+            return [fila[-1] for fila in conexion.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+        conexion.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        return [fila[0] for fila in conexion.exec_driver_sql(f'EXPLAIN {statement}', parameters)]
+
+
+def _usa_indice(statement, plan, tabla):
+    """True si la sentencia lee ``tabla`` por índice; None si no la lee."""
+    if db.engine.dialect.name != 'sqlite':
+        return None if f' {tabla}' not in statement else not any(f'Seq Scan on {tabla}' in p for p in plan)
+    propias = [p for p in plan if p.split(' ')[1:2] == [tabla]]
+    if not propias:
+        return None
+    con_limite = ' LIMIT ' in ' '.join(statement.split())
+    # (ANY(col) …) es un skip-scan: el índice no empieza por la columna filtrada
+    return all((p.startswith('SEARCH') and '(ANY(' not in p) or (con_limite and ' INDEX ' in p) for p in propias)
+
+
+CASOS = {
+    # Tienda
+    'consultar_pedido': (None, ['/api/pedido_estado?numero={numero}'], 'pedidocliente'),
+    # Agotar productos en una sucursal y recargar solo esa partición del catálogo
+    'particion_del_catalogo': ('ALL', ['POST /admin/api/disponibilidad', '/catalogo/disponibilidad'],
+                               'menuitem_sucursal'),
+    # Admin
+    'pedidos_de_sucursales': ([2, 9], ['/admin/pedidos_clientes'], 'pedidocliente'),
+    'pedidos_siguiente_pagina': ([2, 9], ['/admin/pedidos_clientes?antes={cursor}'], 'pedidocliente'),
+    'pedidos_del_dia': ('ALL', ['/admin/pedidos_clientes?desde={dia}&hasta={dia}'], 'pedidocliente'),
+    'pedidos_del_dia_por_sucursal': ('ALL', ['/admin/pedidos_clientes?sucursal_id=5&desde={dia}&hasta={dia}'],
+                                     'pedidocliente'),
+    'pedidos_por_estado': ([2, 9], ['/admin/pedidos_clientes?estado=Pendiente'], 'pedidocliente'),
+    'buscar_pedidos': ([2, 9], ['/admin/pedidos_clientes?q=55'], 'pedidocliente'),
+    'dashboard_pedidos': ('ALL', ['/admin/'], 'pedidocliente'),
+    'dashboard_ventas': ('ALL', ['/admin/'], 'venta_diaria'),
+    'reportes_de_sucursales': ([2, 9], ['/admin/reportes'], 'venta_producto'),
+    'opciones_de_producto': ('ALL', ['/admin/menu/editar/{producto}'], 'opcion_personalizada'),
+    'valores_de_opciones': ('ALL', ['/admin/menu/editar/{producto}'], 'valor_opcion'),
+    'horarios_de_sucursal': ('ALL', ['/admin/sucursales/4/horarios'], 'horario_sucursal'),
+    'sucursales_de_admin': ('ALL', ['/admin/administradores/editar/1'], 'administrador_sucursal'),
+}
+
+
+@pytest.mark.parametrize('nombre', sorted(CASOS))
+def test_consulta_usa_indice(base, nombre):
+    app, valores = base
+    alcance, rutas, tabla = CASOS[nombre]
+    client = app.test_client()
+    if alcance:
+        with client.session_transaction() as sesion:
+            sesion.update(admin_logged_in=True, admin_rol='super', admin_user='admin', admin_id=1,
+                          sucursales_permitidas=alcance)
+    with _capturar() as sentencias:
+        for ruta in rutas:
+            metodo, _, ruta = ruta.rpartition(' ')
+            if metodo == 'POST':
+                respuesta = client.post(ruta, json=valores['agotar'])
+            else:
+                respuesta = client.get(ruta.format(**valores))
+            assert respuesta.status_code == 200, ruta
+    leidas = 0
+    for sql, parametros in sentencias:
+        plan = _plan(sql, parametros)
+        por_indice = _usa_indice(sql, plan, tabla)
+        if por_indice is not None:
+            leidas += 1
+            assert por_indice, (' '.join(sql.split()), plan)
+    assert leidas, f'{nombre} no leyó {tabla}'
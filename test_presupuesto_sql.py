@@ -0,0 +1,89 @@
+"""Presupuesto de sentencias SQL por endpoint: las rutas principales no crecen con los datos (sin N+1)."""
+import logging
+
+import pytest
+
+import presupuesto_sql
+from bench import datos
+from models import OpcionPersonalizada, PedidoCliente, Sucursal
+
+
+@pytest.fixture
+def config_app():
+    return {'TESTING': True, 'SQL_PRESUPUESTO': 'error'}
+
+
+@pytest.fixture
+def app(app):
+    import catalogo
+    import horarios
+    from bench.checkout_sqlite import abrir_todo_el_dia
+    from extensions import db
+    # Varias sucursales y productos con opciones: un N+1 pasaría el límite aunque los datos sean pocos
+    datos.generar(app, sucursales=6, productos=40, n_pedidos=300, dias=10, salida=lambda _msg: None)
+    with app.app_context():
+        abrir_todo_el_dia(db.engine.url.database)  # el checkout solo acepta sucursales abiertas
+    catalogo.limpiar_cache()
+    horarios.invalidar()
+    return app
+
+
+def test_rutas_principales_dentro_del_presupuesto(app):
+    with app.app_context():
+        # Tres productos distintos: una sentencia por línea del carrito se pasaría del presupuesto
+        opciones = {op.menuitem_id: (op.id, op.valores[0].id)
+                    for op in OpcionPersonalizada.query.filter_by(tipo='radio').order_by(OpcionPersonalizada.id)}
+        carrito = list(opciones.items())[:3]
+        numero = PedidoCliente.query.first().numero_pedido
+    client = app.test_client()
+    # En modo error cada request que se pase lanza PresupuestoExcedido con las huellas
+    for ruta in ('/', '/catalogo', '/api/sucursales', f'/api/pedido_estado?numero={numero}'):
+        assert client.get(ruta).status_code == 200, ruta
+    for producto_id, (opcion_id, valor_id) in carrito:
+        client.post('/agregar_carrito', data={'producto_id': producto_id, 'cantidad': '1', f'opcion_{opcion_id}': valor_id})
+    assert client.get('/carrito').status_code == 200
+    assert client.get('/checkout').status_code == 200
+    assert len(carrito) == 3
+    # Confirmar el pedido con el carrito de la sesión: INSERT del pedido y de sus resúmenes
+    respuesta = client.post('/checkout', data={
+        'nombre': 'Ana', 'telefono': '5550000000', 'calle': 'Calle', 'numero': '1', 'colonia': 'Centro',
+        'entre_calles': 'A y B', 'referencia': '-', 'forma_pago': 'efectivo', 'sucursal_id': '1', 'total': '360'})
+    assert respuesta.status_code == 302 and respuesta.location.endswith('/confirmacion')
+    with client.session_transaction() as sesion:
+        sesion.update(admin_logged_in=True, admin_rol='super', admin_user='admin', admin_id=1)
+    for ruta in ('/admin/', '/admin/pedidos_clientes', '/admin/menu'):
+        assert client.get(ruta).status_code == 200, ruta
+    assert set(presupuesto_sql.PRESUPUESTOS) <= set(app.view_functions)
+
+
+@pytest.fixture
+def n_mas_1(app, monkeypatch):
+    def horarios_por_sucursal():
+        return str(sum(len(s.horarios) for s in Sucursal.query.all()))
+    app.add_url_rule('/prueba/n_mas_1', 'n_mas_1', horarios_por_sucursal)
+    monkeypatch.setitem(presupuesto_sql.PRESUPUESTOS, 'n_mas_1', 2)
+    monkeypatch.setattr(presupuesto_sql, '_ultimo_aviso', {})
+    return app.test_client()
+
+
+def test_n_mas_1_falla_en_pruebas(n_mas_1):
+    with pytest.raises(presupuesto_sql.PresupuestoExcedido, match='n_mas_1 hizo 7 sentencias SQL'):
+        n_mas_1.get('/prueba/n_mas_1')
+
+
+def test_n_mas_1_avisa_en_produccion_con_huellas(app, n_mas_1, caplog):
+    app.config['SQL_PRESUPUESTO'] = 'aviso'
+    with caplog.at_level(logging.WARNING, logger='presupuesto_sql'):
+        assert n_mas_1.get('/prueba/n_mas_1').status_code == 200
+        n_mas_1.get('/prueba/n_mas_1')
+    avisos = [r for r in caplog.records if r.name == 'presupuesto_sql']
+    assert len(avisos) == 1  # el segundo cae dentro de SQL_PRESUPUESTO_AVISO_SEG
+    peor = avisos[0].datos['huellas'][0]
+    assert peor['veces'] == 6 and peor['sql'] == 'SELECT … FROM horario_sucursal WHERE ? = horario_sucursal.sucursal_id'
+
+
+def test_huella_ignora_valores():
+    a = presupuesto_sql.huella("SELECT * FROM t WHERE id = 5 AND n = 'x' AND k IN (?, ?, ?)")
+    b = presupuesto_sql.huella("SELECT *\n  FROM t WHERE id = 12 AND n = 'o''tro' AND k IN (?, ?)")
+    assert a == b == 'SELECT … FROM t WHERE id = ? AND n = ? AND k IN (?…)'
+    assert presupuesto_sql.huella('SELECT t.a AS t_a, t.b AS t_b FROM t WHERE id = %(id_1)s') == 'SELECT … FROM t WHERE id = ?'
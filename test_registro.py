@@ -0,0 +1,54 @@
+"""Logging estructurado: request_id por request, volcados muestreados y datos personales enmascarados."""
+import io
+import json
+import logging
+
+import registro
+
+
+def test_request_id_en_respuesta_y_en_el_registro(app):
+    salida = io.StringIO()
+    manejador = logging.StreamHandler(salida)
+    manejador.setFormatter(registro.FormatoJSON())
+    manejador.addFilter(registro._FiltroContexto())
+    log = logging.getLogger('prueba_registro')
+    log.addHandler(manejador)
+
+    @app.get('/_prueba_log')
+    def _prueba_log():
+        log.warning('pedido %s listo', 'A1')
+        return 'ok'
+
+    try:
+        respuesta = app.test_client().get('/_prueba_log', headers={'X-Request-ID': 'abc-123'})
+    finally:
+        log.removeHandler(manejador)
+    assert respuesta.headers['X-Request-ID'] == 'abc-123'
+    linea = json.loads(salida.getvalue().splitlines()[-1])
+    assert linea['msg'] == 'pedido A1 listo' and linea['request_id'] == 'abc-123' and linea['nivel'] == 'WARNING'
+
+    # Un X-Request-ID inválido se reemplaza por uno generado
+    otra = app.test_client().get('/api/sucursales', headers={'X-Request-ID': 'no válido; otro'})
+    assert len(otra.headers['X-Request-ID']) == 32
+
+
+def test_volcado_no_evalua_con_debug_apagado():
+    log = logging.getLogger('prueba_volcado')
+    log.setLevel(logging.INFO)
+    llamadas = []
+
+    class Contado:
+        def __str__(self):
+            llamadas.append(2)
+            return 'x'
+    registro.volcado(log, 'x %s', lambda: llamadas.append(1), Contado(), muestreo=1.0)
+    assert llamadas == []
+
+
+def test_volcado_enmascara_datos_personales(caplog):
+    log = logging.getLogger('prueba_volcado_debug')
+    with caplog.at_level(logging.DEBUG, logger='prueba_volcado_debug'):
+        registro.volcado(log, 'carrito (%d items)', {'telefono': '5551234', 'items': [{'nombre': 'Ana', 'cantidad': 2}]}, 1,
+                         muestreo=1.0)
+    assert caplog.records[-1].getMessage() == 'carrito (1 items)'
+    assert caplog.records[-1].datos == {'telefono': '***', 'items': [{'nombre': '***', 'cantidad': 2}]}
@@ -0,0 +1,60 @@
+"""Ruteo a réplica: lecturas de tienda a la réplica, escrituras y lecturas posteriores al primario."""
+import pytest
+from sqlalchemy import create_engine
+
+import migraciones
+from extensions import db
+from models import PedidoCliente, Sucursal
+
+
+@pytest.fixture
+def cliente(tmp_path):
+    import app as modulo
+    primario, replica = f"sqlite:///{tmp_path / 'primario.db'}", f"sqlite:///{tmp_path / 'replica.db'}"
+    # Dos bases distintas a propósito: así se ve de cuál salió cada lectura
+    for uri, nombre in ((primario, 'Primario'), (replica, 'Réplica')):
+        engine = create_engine(uri)
+        migraciones.migrar(engine)
+        with engine.begin() as conexion:
+            conexion.execute(Sucursal.__table__.insert().values(id=1, nombre=nombre, activa=True))
+        engine.dispose()
+    app = modulo.create_app({'SQLALCHEMY_DATABASE_URI': primario, 'SQLALCHEMY_BINDS': {'replica_0': replica},
+                             'INICIAR_HILOS': False})
+    with app.app_context():
+        db.session.add(PedidoCliente(numero_pedido='RP000001', telefono='5500000000', sucursal_id=1,
+                                     total=100, estado='Pendiente'))
+        db.session.commit()
+        pedido_id = PedidoCliente.query.filter_by(numero_pedido='RP000001').one().id
+    client = app.test_client()
+    yield client, pedido_id
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _sucursal(client):
+    return client.get('/api/sucursales').get_json()['sucursales'][0]['nombre']
+
+
+def test_lecturas_de_tienda_van_a_la_replica(cliente):
+    client, _ = cliente
+    assert _sucursal(client) == 'Réplica'
+
+
+def test_estado_de_pedido_siempre_lee_del_primario(cliente):
+    client, _ = cliente
+    respuesta = client.get('/api/pedido_estado?numero=RP000001')
+    assert respuesta.status_code == 200 and respuesta.get_json()['estado'] == 'Pendiente'
+
+
+def test_tras_escribir_el_cliente_queda_en_el_primario(cliente):
+    client, pedido_id = cliente
+    with client.session_transaction() as s:
+        s['admin_logged_in'] = True
+        s['sucursales_permitidas'] = 'ALL'
+    assert _sucursal(client) == 'Réplica'
+    client.post(f'/admin/pedidos_clientes/actualizar/{pedido_id}', data={'estado': 'En camino'})
+    with client.session_transaction() as s:
+        assert '_primario_hasta' in s
+    assert _sucursal(client) == 'Primario'
+    assert client.get('/api/pedido_estado?numero=RP000001').get_json()['estado'] == 'En camino'
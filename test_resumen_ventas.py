@@ -0,0 +1,135 @@
+import json
+from datetime import date, datetime
+
+import pytest
+
+import resumen_ventas
+from app import app
+from extensions import db
+from models import PedidoCliente, VentaDiaria, VentaFormaPago, VentaHora, VentaProducto
+
+
+def _limpiar():
+    for modelo in (PedidoCliente, VentaDiaria, VentaHora, VentaProducto, VentaFormaPago):
+        modelo.query.delete()
+    db.session.commit()
+
+
+@pytest.fixture
+def ctx():
+    with app.app_context():
+        _limpiar()
+        yield
+        _limpiar()
+
+
+def _nuevo(numero, sucursal_id, fecha, total, productos):
+    pedido = PedidoCliente(numero_pedido=numero, sucursal_id=sucursal_id, fecha=fecha, total=total,
+                           estado='Pendiente', productos=json.dumps(productos))
+    db.session.add(pedido)
+    db.session.commit()
+    resumen_ventas.registrar_pedido(pedido)
+    db.session.commit()
+
+
+def _foto():
+    # Las filas que quedan en cero tras una cancelación equivalen a no tener fila
+    filas = lambda modelo, orden: [
+        {c.name: getattr(f, c.name) for c in modelo.__table__.columns}
+        for f in modelo.query.order_by(*orden).all()
+        if any(getattr(f, c) for c in ('pedidos', 'cantidad') if hasattr(f, c))]
+    return (filas(VentaDiaria, [VentaDiaria.dia, VentaDiaria.sucursal_id]),
+            filas(VentaHora, [VentaHora.dia, VentaHora.sucursal_id, VentaHora.hora]),
+            filas(VentaProducto, [VentaProducto.dia, VentaProducto.sucursal_id, VentaProducto.nombre]),
+            filas(VentaFormaPago, [VentaFormaPago.dia, VentaFormaPago.sucursal_id, VentaFormaPago.forma_pago]))
+
+
+def test_incremental_coincide_con_reconstruccion(ctx):
+    pozole = {'id': 1, 'nombre': 'Pozole', 'cantidad': 2, 'precio_total': 200.0}
+    tostada = {'id': 2, 'nombre': 'Tostada', 'cantidad': 1, 'precio_total': 30.0}
+    _nuevo('RV0001', 1, datetime(2024, 6, 1, 13, 5), 230.0, [pozole, tostada])
+    _nuevo('RV0002', 1, datetime(2024, 6, 1, 13, 40), 200.0, [pozole])
+    _nuevo('RV0003', 2, datetime(2024, 6, 1, 20, 0), 30.0, [tostada])
+    _nuevo('RV0004', 1, datetime(2024, 6, 2, 9, 0), 200.0, [pozole])
+
+    cambiar = lambda numero, estado: resumen_ventas.cambiar_estado_pedido(
+        PedidoCliente.numero_pedido == numero, estado)
+    assert cambiar('RV0001', 'Entregado') == 'Pendiente'
+    assert cambiar('RV0002', 'Cancelado') == 'Pendiente'
+    cambiar('RV0003', 'Entregado')
+    cambiar('RV0003', 'Cancelado')
+    cambiar('RV0004', 'En camino')
+    assert cambiar('NOEXISTE', 'Entregado') is None
+    db.session.commit()
+
+    dia1 = db.session.get(VentaDiaria, (date(2024, 6, 1), 1))
+    assert (dia1.pedidos, dia1.ingresos, dia1.pedidos_entregados, dia1.pedidos_cancelados) == (2, 230.0, 1, 1)
+    assert resumen_ventas.top_productos(date(2024, 6, 1), date(2024, 6, 1))[0] == ('Pozole', 2, 200.0)
+    assert resumen_ventas.totales(date(2024, 6, 1), date(2024, 6, 2), [2])['ingresos'] == 0.0
+
+    incremental = _foto()
+    resumen_ventas.reconstruir(date(2024, 6, 1), date(2024, 6, 2))
+    assert _foto() == incremental
+
+
+def test_pedido_sin_fecha_no_entra_en_resumenes(ctx):
+    pozole = {'id': 1, 'nombre': 'Pozole', 'cantidad': 1, 'precio_total': 100.0}
+    _nuevo('SF0001', 1, None, 100.0, [pozole])
+    resumen_ventas.cambiar_estado_pedido(PedidoCliente.numero_pedido == 'SF0001', 'Entregado')
+    resumen_ventas.cambiar_estado_pedido(PedidoCliente.numero_pedido == 'SF0001', 'Cancelado')
+    db.session.commit()
+    # Igual que reconstruir(), que filtra por fecha: no se cuenta el día en que cambió de estado
+    assert _foto() == ([], [], [], [])
+
+
+def test_reporte_analitica_vectorizado_y_cache(ctx):
+    import analitica
+    analitica.invalidar_cache()
+    pozole = {'id': 1, 'nombre': 'Pozole', 'cantidad': 1, 'precio_total': 100.0}
+    _nuevo('AN0001', 1, datetime(2024, 6, 3, 14, 0), 100.0, [pozole])  # lunes
+    _nuevo('AN0002', 1, datetime(2024, 6, 3, 14, 30), 300.0, [pozole])
+    _nuevo('AN0003', 2, datetime(2024, 6, 9, 20, 0), 50.0, [pozole])  # domingo
+    resumen_ventas.cambiar_estado_pedido(PedidoCliente.numero_pedido == 'AN0003', 'Cancelado')
+    db.session.commit()
+
+    datos = analitica.reporte(date(2024, 6, 1), date(2024, 6, 30))
+    assert datos['totales'] == {'pedidos': 3, 'cancelados': 1, 'ingresos': 400.0,
+                                'ticket_promedio': 200.0, 'tasa_cancelacion': 0.3333}
+    assert datos['mapa_calor']['ingresos'][0][14] == 400.0
+    assert datos['mapa_calor']['pedidos'][6][20] == 0
+    assert datos['top_productos'] == [{'nombre': 'Pozole', 'cantidad': 2, 'ingresos': 200.0}]
+    assert datos['formas_pago'][0]['porcentaje'] == 100.0
+    assert [s['sucursal_id'] for s in datos['por_sucursal']] == [1, 2]
+
+    # Mismo rango y sucursales: sale de caché aunque cambien los datos
+    _nuevo('AN0004', 1, datetime(2024, 6, 4, 10, 0), 10.0, [pozole])
+    assert analitica.reporte(date(2024, 6, 1), date(2024, 6, 30))['totales']['pedidos'] == 3
+    assert analitica.reporte(date(2024, 6, 1), date(2024, 6, 30), [1])['totales']['pedidos'] == 3
+
+
+@pytest.fixture
+def tienda(crear_app):
+    import horarios
+    from bench import datos
+    from bench.checkout_sqlite import abrir_todo_el_dia
+    tienda = crear_app()
+    datos.generar(tienda, sucursales=2, productos=5, n_pedidos=10, dias=3, salida=lambda _msg: None)
+    with tienda.app_context():
+        abrir_todo_el_dia(db.engine.url.database)
+    horarios.invalidar()
+    return tienda
+
+
+def test_pedido_y_resumen_en_la_misma_transaccion(tienda, monkeypatch):
+    def falla(_pedido):
+        raise RuntimeError('base ocupada')
+    monkeypatch.setattr(resumen_ventas, 'registrar_pedido', falla)
+    client = tienda.test_client()
+    respuesta = client.post('/checkout', data={
+        'nombre': 'Ana', 'telefono': '5550000000', 'calle': 'Calle', 'numero': '1', 'colonia': 'Centro',
+        'entre_calles': 'A y B', 'referencia': '-', 'forma_pago': 'efectivo', 'sucursal_id': '1', 'total': '120',
+        'carrito_data': json.dumps([{'id': 1, 'cantidad': 1}])})
+    assert respuesta.status_code == 500
+    with tienda.app_context():
+        # Si el resumen no se pudo escribir, el pedido tampoco queda: nada que reconstruir después
+        assert PedidoCliente.query.filter_by(nombre='Ana').count() == 0
@@ -0,0 +1,184 @@
+import pytest
+
+import telegram_bot
+from app import app
+from extensions import db
+from models import TelegramPolling
+
+
+class _RespuestaFalsa:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def ctx(monkeypatch):
+    monkeypatch.setattr(telegram_bot, 'TELEGRAM_TOKEN', 'token-prueba')
+    monkeypatch.setattr(telegram_bot, 'API_URL', 'http://telegram.invalid/bottoken-prueba')
+    with app.app_context():
+        TelegramPolling.query.delete()
+        db.session.commit()
+        yield
+
+
+def test_lease_solo_un_lider(ctx, monkeypatch):
+    monkeypatch.setattr(telegram_bot, '_proceso_id', lambda: 'host:1')
+    assert telegram_bot._adquirir_lease()
+    # Renovar el propio lease funciona
+    assert telegram_bot._adquirir_lease()
+    monkeypatch.setattr(telegram_bot, '_proceso_id', lambda: 'host:2')
+    assert not telegram_bot._adquirir_lease()
+
+
+def test_offset_en_db_y_sin_reprocesar(ctx, monkeypatch):
+    llamadas = []
+    procesados = []
+
+    def get_falso(url, params=None, timeout=None):
+        llamadas.append(params)
+        return _RespuestaFalsa({'ok': True, 'result': [{'update_id': 7}, {'update_id': 8}]})
+
+    monkeypatch.setattr(telegram_bot.requests, 'get', get_falso)
+    monkeypatch.setattr(telegram_bot, 'procesar_update', lambda upd: procesados.append(upd['update_id']))
+    monkeypatch.setattr(telegram_bot, '_proceso_id', lambda: 'host:1')
+    assert telegram_bot._adquirir_lease()
+
+    res = telegram_bot.poll_once(timeout=50, lider='host:1')
+    assert res == {'ok': True, 'nuevos': 2}
+    assert llamadas[0] == {'timeout': 50, 'offset': 1}
+    assert db.session.get(TelegramPolling, 1).ultimo_update_id == 8
+
+    # Telegram reenvía updates viejos: no se reprocesan y el offset avanza desde DB
+    telegram_bot.poll_once(timeout=50, lider='host:1')
+    assert llamadas[1]['offset'] == 9
+    assert procesados == [7, 8]
+
+
+def test_lider_que_perdio_lease_no_avanza_offset(ctx):
+    telegram_bot._fila_polling()
+    db.session.execute(db.update(TelegramPolling).values(lider='otro:99'))
+    db.session.commit()
+    assert not telegram_bot._guardar_offset(5, 'host:1')
+    assert db.session.get(TelegramPolling, 1).ultimo_update_id == 0
+
+
+def _crear_pedido(numero='TB000001', **extra):
+    from datetime import datetime
+    from models import PedidoCliente
+    datos = dict(numero_pedido=numero, nombre='Ana', telefono='555', calle='Uno', numero='1',
+                 colonia='Centro', entre_calles='A y B', referencia='Portón', sucursal_id=1,
+                 productos='[{"nombre": "Pozole", "cantidad": 2, "precio_total": 180}]',
+                 total=180.0, fecha=datetime(2025, 1, 1, 14, 0), estado='Pendiente',
+                 forma_pago='efectivo')
+    datos.update(extra)
+    pedido = PedidoCliente(**datos)
+    db.session.add(pedido)
+    db.session.commit()
+    return pedido
+
+
+@pytest.fixture
+def envios(ctx, monkeypatch):
+    from models import PedidoCliente
+    PedidoCliente.query.filter(PedidoCliente.numero_pedido.like('TB%')).delete()
+    db.session.commit()
+    telegram_bot._mensajes_cache.clear()
+    llamadas = []
+    monkeypatch.setattr(telegram_bot, '_send', lambda metodo, payload: llamadas.append((metodo, payload)) or {'ok': True})
+    return llamadas
+
+
+def test_cambio_estado_usa_cache_y_una_sola_edicion(envios, monkeypatch):
+    monkeypatch.setattr(telegram_bot, 'EDIT_DEBOUNCE_SEG', 0)
+    pedido = _crear_pedido()
+    telegram_bot.enviar_notificacion_pedido(pedido)
+    assert 'TB000001' in telegram_bot._mensajes_cache
+
+    # Con la plantilla en caché no se vuelve a parsear el pedido
+    monkeypatch.setattr(telegram_bot, 'build_pedido_message', lambda *a, **k: pytest.fail('no debe re-renderizar'))
+    telegram_bot.actualizar_estado_pedido_telegram('1', 'TB000001', 'En camino', message_id=10, edit_original=True)
+
+    assert [m for m, p in envios if m.startswith('edit')] == ['editMessageText']
+    ediciones = [p for m, p in envios if m == 'editMessageText']
+    assert 'En camino' in ediciones[0]['text']
+    assert ediciones[0]['reply_markup']['inline_keyboard'][0][2]['text'] == '✅ En camino'
+
+
+def test_ediciones_rapidas_se_agrupan(envios, monkeypatch):
+    import time
+    monkeypatch.setattr(telegram_bot, 'EDIT_DEBOUNCE_SEG', 0.05)
+    _crear_pedido()
+    for estado in ('En preparación', 'En camino', 'Entregado'):
+        telegram_bot.actualizar_estado_pedido_telegram('1', 'TB000001', estado, message_id=11, edit_original=True)
+    time.sleep(0.2)
+    ediciones = [p for m, p in envios if m == 'editMessageText']
+    assert len(ediciones) == 1
+    assert 'Entregado' in ediciones[0]['text']
+
+
+def test_cambio_del_pedido_invalida_cache(envios):
+    pedido = _crear_pedido()
+    telegram_bot.mensaje_pedido('TB000001', 'Pendiente', pedido=pedido)
+    pedido.estado = 'En camino'
+    db.session.commit()
+    assert 'TB000001' in telegram_bot._mensajes_cache
+    pedido.total = 200.0
+    db.session.commit()
+    assert 'TB000001' not in telegram_bot._mensajes_cache
+
+
+@pytest.fixture
+def rutas(envios, monkeypatch):
+    from models import Sucursal, SucursalTelegramChat
+    SucursalTelegramChat.query.delete()
+    for sid in (1, 2):
+        if not db.session.get(Sucursal, sid):
+            db.session.add(Sucursal(id=sid, nombre=f'Sucursal {sid}', activa=True))
+    db.session.add_all([
+        SucursalTelegramChat(sucursal_id=1, chat_id='100', rol='sucursal'),
+        SucursalTelegramChat(sucursal_id=2, chat_id='200', rol='sucursal'),
+        SucursalTelegramChat(sucursal_id=2, chat_id='900', rol='supervisor'),
+    ])
+    db.session.commit()
+    monkeypatch.setattr(telegram_bot, 'SUPERVISOR_CHATS', {'1'})
+    telegram_bot.invalidar_rutas_telegram()
+    yield
+    SucursalTelegramChat.query.delete()
+    db.session.commit()
+    telegram_bot.invalidar_rutas_telegram()
+
+
+def test_notificacion_solo_a_chats_de_la_sucursal(rutas, envios):
+    pedido = _crear_pedido(numero='TB000002', sucursal_id=2)
+    assert telegram_bot.enviar_notificacion_pedido(pedido)
+    destinos = sorted(p['chat_id'] for m, p in envios if m == 'sendMessage')
+    assert destinos == ['1', '200', '900']
+
+
+def test_callback_autoriza_por_sucursal(rutas, envios, monkeypatch):
+    monkeypatch.setattr(telegram_bot, 'EDIT_DEBOUNCE_SEG', 0)
+    _crear_pedido(numero='TB000003', sucursal_id=2)
+    # El chat de la sucursal 1 no puede tocar pedidos de la sucursal 2
+    telegram_bot.manejar_callback('100', 5, 'update_status|TB000003|en_camino', 'cb1')
+    assert db.session.execute(db.text("SELECT estado FROM pedidocliente WHERE numero_pedido='TB000003'")).scalar() == 'Pendiente'
+    telegram_bot.manejar_callback('200', 5, 'update_status|TB000003|en_camino', 'cb2')
+    assert db.session.execute(db.text("SELECT estado FROM pedidocliente WHERE numero_pedido='TB000003'")).scalar() == 'En camino'
+
+
+def test_api_falsa_responde_e_inyecta_429(monkeypatch):
+    from bench.fake_telegram import FakeTelegram
+    fake = FakeTelegram(prob_429=1.0)
+    base = fake.iniciar()
+    try:
+        monkeypatch.setattr(telegram_bot, 'TELEGRAM_TOKEN', 'x')
+        monkeypatch.setattr(telegram_bot, 'API_URL', f'{base}/botx')
+        resp = telegram_bot._send('sendMessage', {'chat_id': '1', 'text': 'hola'})
+        assert resp['error_code'] == 429 and resp['parameters']['retry_after'] == 1
+        fake.prob_429 = 0.0
+        assert telegram_bot._send('sendMessage', {'chat_id': '1', 'text': 'hola'})['result']['message_id'] == 1
+        assert fake.resumen()['sendMessage'] == {'total': 2, '429': 1, '5xx': 0}
+    finally:
+        fake.detener()